@@ -3,6 +3,9 @@ ASGI config for artgallery project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Requests for the registration queue stream are served by a lightweight
+Server-Sent Events handler; everything else goes to Django.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -13,4 +16,13 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'artgallery.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from core.realtime import STREAM_PATH, queue_stream  # noqa: E402  (needs apps loaded)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await queue_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
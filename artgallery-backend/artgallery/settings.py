@@ -10,8 +10,10 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -53,10 +55,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
 MIDDLEWARE = [
+    'core.middleware.RequestIdMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,6 +75,79 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Logging: JSON lines written from a background thread (core.logs). Set
+# LOG_FILE to write to a file instead of stderr. LOG_SAMPLE_RATES keeps only a
+# fraction of the DEBUG/INFO records of busy loggers (warnings always pass).
+LOG_SAMPLE_RATES = {
+    'core.registrations': float(os.environ.get('LOG_SAMPLE_REGISTRATIONS', '1.0')),
+}
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'queue': {
+            '()': 'core.logs.QueueingHandler',
+            'filename': os.environ.get('LOG_FILE') or None,
+            'sample_rates': LOG_SAMPLE_RATES,
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': 'WARNING'},
+    'loggers': {
+        'django': {'handlers': ['queue'], 'level': os.environ.get('DJANGO_LOG_LEVEL', 'ERROR'), 'propagate': False},
+        'core': {'level': os.environ.get('LOG_LEVEL', 'INFO')},
+    },
+}
+
+# Caching (file-based so every worker on the host shares it; point at a
+# network backend when running on more than one host)
+CACHES = {
+    'default': {
+        'BACKEND': 'core.filecache.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_EVERY': 500},
+    }
+}
+VISITOR_REGISTRATIONS_CACHE_TTL = 300
+ARTIST_PORTFOLIO_CACHE_TTL = 600
+EXHIBITION_DETAIL_CACHE_TTL = 120
+
+# Response cache (core.responsecache): in-process LRU size, how long entries
+# outlive their TTL to be served stale, and the single-flight lock/wait limits
+RESPONSE_CACHE_LOCAL_ENTRIES = 512
+RESPONSE_CACHE_STALE_SECONDS = 300
+RESPONSE_CACHE_LOCK_TIMEOUT = 30
+RESPONSE_CACHE_WAIT = 5
+
+# Uploaded art piece images and their thumbnails (core.images)
+MEDIA_ROOT = BASE_DIR / 'media'
+ART_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+ART_IMAGE_THUMBNAIL_SIZES = [200, 400, 800]
+ART_IMAGE_THUMBNAIL_WORKERS = 2
+
+# Prebuilt public catalog snapshots (core.snapshots)
+SNAPSHOT_ROOT = BASE_DIR / 'snapshots'
+SNAPSHOT_MAX_AGE = 30
+# build_snapshots --watch rebuilds once the catalog has been quiet this
+# long, and at the latest this long after the first change
+SNAPSHOT_REBUILD_DELAY = 2
+SNAPSHOT_REBUILD_MAX_DELAY = 30
+
+# On-demand request profiling for admins (core.profiling): the newest
+# PROFILE_KEEP profiles are kept in PROFILE_ROOT
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') != '0'
+PROFILE_ROOT = BASE_DIR / 'profiles'
+PROFILE_KEEP = 50
+PROFILE_MAX_QUERIES = 1000
+
+# Response compression (brotli when installed, else gzip)
+RESPONSE_COMPRESSION_MIN_BYTES = 1024
+RESPONSE_COMPRESSION_GZIP_LEVEL = 6
+RESPONSE_COMPRESSION_BROTLI_QUALITY = 5
+# Never compressed: these responses carry tokens (BREACH)
+RESPONSE_COMPRESSION_EXCLUDE_PATHS = [
+    '/api/auth/', '/api/token/', '/api/register/', '/api/registrations/stream/ticket/',
+]
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8080",
@@ -77,6 +159,16 @@ CORS_ALLOWED_ORIGINS = [
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Allow clients to send Idempotency-Key on retried POSTs
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+CORS_EXPOSE_HEADERS = ['Idempotent-Replayed']
+
+# How long a stored Idempotency-Key response can be replayed
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# How long a request may hold a key before a retry can take it over (its
+# worker is presumed dead); keep it above the slowest registration request
+IDEMPOTENCY_CLAIM_LEASE = timedelta(seconds=60)
+
 # JWT settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=30),
@@ -116,8 +208,61 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'OPTIONS': {
+            # Take the write lock when a transaction begins so concurrent
+            # registrations queue up instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+    # Append-only journal for buffered registration intake. A separate file
+    # has its own write lock, so accepting a request never waits on the main one.
+    'intake': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'intake.sqlite3',
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['core.routers.IntakeRouter']
+
+# 'direct' creates registrations inside the request. 'buffered' journals them
+# and returns 202; run `manage.py drain_registration_intake` to apply them.
+REGISTRATION_INTAKE_MODE = 'direct'
+
+# Mobile catalog delta sync (/api/sync/). Tokens older than the tombstone
+# retention get 410 and must do a full sync; prune with `prune_sync_tombstones`.
+SYNC_TOMBSTONE_RETENTION = timedelta(days=90)
+SYNC_SETTLE_WINDOW = timedelta(seconds=2)
+
+# Queue position push stream (artgallery/asgi.py). InProcessBroker only reaches
+# streams in the process that made the change; with several workers use e.g.
+# {'BACKEND': 'core.realtime.FileBroker', 'PATH': BASE_DIR / 'queue_events.log'}
+QUEUE_EVENTS_BROKER = {
+    'BACKEND': 'core.realtime.InProcessBroker',
 }
+# Browsers open the stream with a signed ticket in the query string; it
+# expires after this many seconds
+QUEUE_STREAM_TICKET_MAX_AGE = 60
+
+# Email
+# Locally, registration notifications are written to files instead of sent
+EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'Art Gallery <noreply@artgallery.local>'
+
+# Registration notification outbox (see `manage.py send_notifications`)
+NOTIFICATION_EMAIL_BACKEND = None  # None uses EMAIL_BACKEND
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 30
+NOTIFICATION_RETRY_MAX_SECONDS = 3600
+
+# Registrations of exhibitions that ended this many days ago move to the
+# archive table (see `manage.py archive_registrations`)
+REGISTRATION_ARCHIVE_AFTER_DAYS = 90
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -19,7 +19,17 @@ from core.views import (
     ExhibitionDetailView,
     ExhibitionRegistrationView,
     MyRegistrationsView,
+    VisitorRegistrationsView,
+    RegistrationIntakeStatusView,
+    QueueStreamTicketView,
     ArtistDetailView,
+    ValuationAnalyticsView,
+    CatalogSyncView,
+    ProfileListView,
+    ProfileDetailView,
+    ProfileDownloadView,
+    catalog_snapshot,
+    art_image_thumbnail,
     APIHealthCheckView
 )
 from core import views
@@ -62,12 +72,36 @@ urlpatterns = [
     path('api/exhibitions/<int:pk>/detail/', ExhibitionDetailView.as_view(), name='exhibition_detail'),
     path('api/exhibitions/<int:exhibition_id>/register/', ExhibitionRegistrationView.as_view(), name='exhibition_register'),
     
+    # Buffered registration intake status
+    path('api/registrations/intake/<uuid:tracking_id>/', RegistrationIntakeStatusView.as_view(), name='registration_intake_status'),
+    
+    # Ticket for the queue position stream (served from asgi.py)
+    path('api/registrations/stream/ticket/', QueueStreamTicketView.as_view(), name='queue_stream_ticket'),
+    
     # User-specific endpoints
     path('api/my/registrations/', MyRegistrationsView.as_view(), name='my_registrations'),
+    path('api/visitor/registrations/', VisitorRegistrationsView.as_view(), name='visitor_registrations'),
     
     # Artist specific endpoints
     path('api/artists/<int:pk>/detail/', ArtistDetailView.as_view(), name='artist_detail'),
     
+    # Collection analytics
+    path('api/analytics/valuation/', ValuationAnalyticsView.as_view(), name='valuation_analytics'),
+    
+    # Art piece thumbnails (content-addressed)
+    path('api/images/<slug:digest>/<int:size>.jpg', art_image_thumbnail, name='art_image_thumbnail'),
+    
+    # Prebuilt public catalog snapshots
+    path('api/catalog/<slug:name>/', catalog_snapshot, name='catalog_snapshot'),
+    
+    # Mobile catalog delta sync
+    path('api/sync/', CatalogSyncView.as_view(), name='catalog_sync'),
+    
+    # Request profiles (admin only)
+    path('api/profiles/', ProfileListView.as_view(), name='profile_list'),
+    path('api/profiles/<slug:profile_id>/', ProfileDetailView.as_view(), name='profile_detail'),
+    path('api/profiles/<slug:profile_id>/download/', ProfileDownloadView.as_view(), name='profile_download'),
+    
     # Legacy endpoints (keep for backward compatibility)
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh_legacy'),
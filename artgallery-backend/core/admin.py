@@ -1,4 +1,8 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
 
 # Register your models here.
 from .models import (
@@ -11,13 +15,135 @@ from .models import (
     Clerk,
     SetupStatus
 )
+from . import queue
+
+ESTIMATE_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Changelist paginator that never runs an unbounded ``COUNT(*)``.
+
+    Counts stop at ``ESTIMATE_THRESHOLD`` rows. Beyond that an unfiltered
+    list reports the database's row estimate (``pg_class.reltuples`` on
+    PostgreSQL, the highest id elsewhere). A filtered list reports the
+    threshold, so its deepest pages are reached by narrowing the filters.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        counted = queryset[:ESTIMATE_THRESHOLD + 1].count()
+        if counted <= ESTIMATE_THRESHOLD:
+            return counted
+        if queryset.query.where:
+            return ESTIMATE_THRESHOLD
+        return max(_estimated_rows(queryset), counted)
+
+
+def _estimated_rows(queryset):
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    return queryset.aggregate(highest=Max('pk'))['highest'] or 0
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow without bound"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+# ---------------------------
+# Catalog
+# ---------------------------
+
+@admin.register(Artist)
+class ArtistAdmin(admin.ModelAdmin):
+    list_display = ('name', 'nationality', 'email')
+    search_fields = ('name',)
+
+
+@admin.register(ArtPiece)
+class ArtPieceAdmin(LargeTableAdmin):
+    list_display = ('title', 'artist', 'status', 'estimated_value')
+    list_select_related = ('artist',)
+    list_filter = ('status',)
+    search_fields = ('title',)
+    autocomplete_fields = ('artist',)
+    readonly_fields = ('image',)  # Set through the upload endpoint
+
+
+@admin.register(Exhibition)
+class ExhibitionAdmin(admin.ModelAdmin):
+    list_display = ('title', 'start_date', 'end_date', 'status')
+    list_filter = ('status',)
+    search_fields = ('title',)
+    date_hierarchy = 'start_date'
+
+
+@admin.register(ExhibitionArtPiece)
+class ExhibitionArtPieceAdmin(LargeTableAdmin):
+    list_display = ('exhibition', 'art_piece', 'confirmed')
+    list_select_related = ('exhibition', 'art_piece')
+    autocomplete_fields = ('exhibition', 'art_piece')
+
+
+# ---------------------------
+# Visitors and registrations
+# ---------------------------
+
+@admin.register(Visitor)
+class VisitorAdmin(LargeTableAdmin):
+    list_display = ('name', 'email', 'phone')
+    search_fields = ('name', 'email')
+
+
+@admin.register(Registration)
+class RegistrationAdmin(LargeTableAdmin):
+    list_display = ('id', 'visitor', 'exhibition', 'status', 'queue_position', 'attendees_count', 'submitted_at')
+    list_select_related = ('visitor', 'exhibition')
+    list_filter = ('status',)
+    search_fields = ('=id', '=visitor__email')
+    date_hierarchy = 'submitted_at'
+    autocomplete_fields = ('visitor', 'exhibition', 'reviewed_by')
+    readonly_fields = ('queue_position', 'submitted_at', 'timestamp', 'reviewed_at')
+    actions = ('approve_selected', 'reject_selected', 'cancel_selected')
+
+    def _decide(self, request, queryset, status, verb):
+        count = queue.decide(queryset, status, reviewer=request.user)
+        self.message_user(request, f"{verb} {count} pending registration(s); others were left unchanged.",
+                          messages.SUCCESS if count else messages.WARNING)
+
+    @admin.action(description='Approve selected pending registrations')
+    def approve_selected(self, request, queryset):
+        self._decide(request, queryset, 'APPROVED', 'Approved')
+
+    @admin.action(description='Reject selected pending registrations')
+    def reject_selected(self, request, queryset):
+        self._decide(request, queryset, 'REJECTED', 'Rejected')
+
+    @admin.action(description='Cancel selected pending registrations')
+    def cancel_selected(self, request, queryset):
+        self._decide(request, queryset, 'CANCELLED', 'Cancelled')
+
+
+# ---------------------------
+# Staff
+# ---------------------------
 
-admin.site.register(Artist)
-admin.site.register(ArtPiece)
-admin.site.register(Exhibition)
-admin.site.register(ExhibitionArtPiece)
-admin.site.register(Visitor)
-admin.site.register(Registration)
 admin.site.register(Clerk)
-admin.site.register(SetupStatus)
 
+
+@admin.register(SetupStatus)
+class SetupStatusAdmin(admin.ModelAdmin):
+    list_display = ('exhibition', 'clerk', 'setup_confirmed', 'teardown_confirmed', 'timestamp')
+    list_select_related = ('exhibition', 'clerk')
+    autocomplete_fields = ('exhibition',)
+    raw_id_fields = ('clerk',)
@@ -4,3 +4,49 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from . import caching, valuation
+        from .models import Artist, ArtPiece, Exhibition, ExhibitionArtPiece, Registration
+        from .realtime import publish_queue_change, publish_registration_queued
+        from .signals import cache_namespaces_bumped, registration_queue_changed, registration_queued
+        from .snapshots import catalog_changed
+        from .sync import record_tombstone
+
+        registration_queue_changed.connect(publish_queue_change, dispatch_uid='core.realtime')
+        registration_queued.connect(publish_registration_queued, dispatch_uid='core.realtime.queued')
+
+        # Deleted catalog rows leave a tombstone for delta sync clients
+        for model in (Artist, ArtPiece, Exhibition, ExhibitionArtPiece):
+            post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'core.sync.{model.__name__}')
+
+        # Cached visitor registration pages and artist portfolios
+        registration_queue_changed.connect(caching.queue_shifted, dispatch_uid='core.caching.queue')
+        receivers = [
+            (caching.registration_changed, Registration),
+            (caching.exhibition_changed, Exhibition),
+            (caching.art_piece_changed, ArtPiece),
+            (caching.art_piece_changed, ExhibitionArtPiece),
+            (caching.artist_changed, Artist),
+        ]
+        for signal in (post_save, post_delete):
+            for receiver, model in receivers:
+                signal.connect(receiver, sender=model,
+                               dispatch_uid=f'core.caching.{model.__name__}.{signal is post_save}')
+
+        # Public catalog snapshots are rebuilt after the catalog namespaces change
+        cache_namespaces_bumped.connect(catalog_changed, dispatch_uid='core.snapshots')
+
+        # Valuation rollups
+        receivers = [
+            (valuation.art_piece_changed, ArtPiece, (post_save, post_delete)),
+            (valuation.exhibition_link_changed, ExhibitionArtPiece, (post_save, post_delete)),
+            (valuation.artist_changed, Artist, (post_save,)),
+            (valuation.exhibition_changed, Exhibition, (post_save,)),
+        ]
+        for receiver, model, signals in receivers:
+            for signal in signals:
+                signal.connect(receiver, sender=model,
+                               dispatch_uid=f'core.valuation.{model.__name__}.{signal is post_save}')
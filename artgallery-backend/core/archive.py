@@ -0,0 +1,90 @@
+"""
+Archive tier for registrations.
+
+Registrations for exhibitions that ended more than
+``REGISTRATION_ARCHIVE_AFTER_DAYS`` ago are moved into
+``ArchivedRegistration`` in batches. Each batch is copied and deleted in one
+short transaction. The live table keeps only the queue and recent history,
+so its indexes stay small.
+
+Reads that reach into history go through ``history`` (the visitor's
+registration listing) or ``find`` (lookups by id). These query both tables,
+so callers see the same rows before and after archiving.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .models import ArchivedRegistration, Registration
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 90
+DEFAULT_BATCH_SIZE = 1000
+
+COPIED_FIELDS = [field.attname for field in Registration._meta.concrete_fields]
+
+
+def archive_after_days():
+    return getattr(settings, 'REGISTRATION_ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+
+
+def archivable(days=None, today=None):
+    """Decided registrations whose exhibition ended more than ``days`` days ago"""
+    days = archive_after_days() if days is None else days
+    cutoff = (today or timezone.localdate()) - timedelta(days=days)
+    return Registration.objects.filter(exhibition__end_date__lt=cutoff).exclude(
+        # The queue stays live, however old: its reads skip the archive
+        status='PENDING',
+    ).exclude(
+        # Never archive a registration whose decision email is still on its way
+        notifications__status__in=['PENDING', 'SENDING'],
+    )
+
+
+def archive_batch(days=None, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """Move one batch into the archive; returns the number of registrations moved"""
+    with transaction.atomic():
+        rows = list(
+            archivable(days, today).order_by('id')
+            .values(*COPIED_FIELDS, 'visitor__email')[:batch_size]
+        )
+        if not rows:
+            return 0
+        ids = [row['id'] for row in rows]
+        now = timezone.now()
+        ArchivedRegistration.objects.bulk_create(
+            ArchivedRegistration(archived_at=now, **{name: row[name] for name in COPIED_FIELDS})
+            for row in rows
+        )
+        # Delivered notifications go with their registration (on_delete=CASCADE)
+        Registration.objects.filter(id__in=ids).delete()
+        caching.invalidate_visitors({row['visitor__email'] for row in rows})
+        caching.invalidate_exhibition_registrations({row['exhibition_id'] for row in rows})
+    return len(rows)
+
+
+def archive(days=None, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """Archive everything due, one batch per transaction; returns the total moved"""
+    total = 0
+    while True:
+        moved = archive_batch(days, batch_size, today)
+        total += moved
+        if moved < batch_size:
+            return total
+
+
+def history(live, archived, ordering):
+    """
+    ``live`` and ``archived`` (``values_list`` querysets over the same columns)
+    as a single ordered query
+    """
+    return live.order_by().union(archived.order_by(), all=True).order_by(*ordering)
+
+
+def find(pk, live=None, archived=None):
+    """The registration with ``pk`` from the live table, else from the archive, else None"""
+    live = Registration.objects.all() if live is None else live
+    archived = ArchivedRegistration.objects.all() if archived is None else archived
+    return live.filter(pk=pk).first() or archived.filter(pk=pk).first()
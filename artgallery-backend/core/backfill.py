@@ -0,0 +1,182 @@
+"""
+Chunked, resumable data backfills.
+
+A data fix that runs inside a migration is one transaction over the whole
+table. On SQLite that holds the write lock for as long as it takes. A
+``Backfill`` works through its rows in primary-key order instead, one short
+transaction per chunk, so other writers get in between chunks. Each chunk's
+transaction also records the last primary key done in
+``BackfillCheckpoint``, so an interrupted run carries on from there. An
+optional rows-per-second target spaces the chunks out.
+
+Backfills are registered by name and run with ``manage.py backfill <name>``.
+"""
+import time
+from dataclasses import dataclass
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import caching
+from .models import BackfillCheckpoint, Exhibition, Registration
+
+registry = {}
+
+
+def register(cls):
+    registry[cls.name] = cls
+    return cls
+
+
+class Backfill:
+    """
+    Subclasses set ``name`` and ``model`` and implement ``process(pks)``,
+    which fixes the rows with those primary keys and returns the number of
+    row updates it made. It runs inside the chunk's transaction.
+    """
+    name = None
+    model = None
+    chunk_size = 500
+    description = ''
+
+    def get_queryset(self):
+        return self.model._default_manager.all()
+
+    def process(self, pks):
+        raise NotImplementedError
+
+
+@dataclass
+class Progress:
+    checkpoint: BackfillCheckpoint
+    total: int          # Rows this run expects to process
+    done: int           # Rows processed in this run
+    changed: int        # Row updates made in this run
+    elapsed: float
+
+    @property
+    def rate(self):
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+
+def run(backfill, chunk_size=None, rows_per_second=None, restart=False, max_chunks=None, progress=None):
+    """
+    Run ``backfill`` from its checkpoint; returns the final ``Progress``.
+    ``progress`` is called after every chunk.
+    """
+    chunk_size = chunk_size or backfill.chunk_size
+    checkpoint, _ = BackfillCheckpoint.objects.get_or_create(name=backfill.name)
+    if restart:
+        checkpoint.last_pk = None
+        checkpoint.rows_processed = checkpoint.rows_changed = 0
+        checkpoint.started_at = timezone.now()
+        checkpoint.completed_at = None
+        checkpoint.save()
+
+    queryset = backfill.get_queryset().order_by('pk')
+    remaining = queryset if checkpoint.last_pk is None else queryset.filter(pk__gt=checkpoint.last_pk)
+    state = Progress(checkpoint, total=remaining.count(), done=0, changed=0, elapsed=0.0)
+    started = time.monotonic()
+    chunks = 0
+
+    while max_chunks is None or chunks < max_chunks:
+        chunk_started = time.monotonic()
+        with transaction.atomic():
+            pending = queryset if checkpoint.last_pk is None else queryset.filter(pk__gt=checkpoint.last_pk)
+            pks = list(pending.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                checkpoint.completed_at = timezone.now()
+                checkpoint.save(update_fields=['completed_at', 'updated_at'])
+                break
+            changed = backfill.process(pks)
+            checkpoint.last_pk = pks[-1]
+            checkpoint.rows_processed += len(pks)
+            checkpoint.rows_changed += changed
+            checkpoint.save(update_fields=['last_pk', 'rows_processed', 'rows_changed', 'updated_at'])
+        chunks += 1
+        state.done += len(pks)
+        state.changed += changed
+
+        if rows_per_second:
+            pause = len(pks) / rows_per_second - (time.monotonic() - chunk_started)
+            if pause > 0:
+                time.sleep(pause)
+        state.elapsed = time.monotonic() - started
+        if progress:
+            progress(state)
+
+    state.elapsed = time.monotonic() - started
+    return state
+
+
+# ---------------------------
+# Registered backfills
+# ---------------------------
+
+@register
+class RegistrationStatusBackfill(Backfill):
+    """
+    Reconciles the legacy ``confirmed`` flag with ``status`` and fills
+    ``submitted_at``. Rows older than migration 0003 got status PENDING by
+    default; a confirmed one among them was really approved.
+    """
+    name = 'registration-status'
+    model = Registration
+    description = 'Reconcile confirmed with status and fill submitted_at'
+
+    def process(self, pks):
+        rows = Registration.objects.filter(pk__in=pks)
+        changed = (
+            rows.filter(confirmed=True, status='PENDING', reviewed_at__isnull=True)
+            .update(status='APPROVED', queue_position=None)
+            + rows.filter(status='APPROVED', confirmed=False).update(confirmed=True)
+            + rows.filter(confirmed=True).exclude(status='APPROVED').update(confirmed=False)
+            + rows.filter(submitted_at__isnull=True).update(submitted_at=F('timestamp'))
+        )
+        if changed:
+            caching.invalidate_visitors(set(rows.values_list('visitor__email', flat=True)))
+            caching.invalidate_exhibition_registrations(set(rows.values_list('exhibition_id', flat=True)))
+        return changed
+
+
+@register
+class QueuePositionBackfill(Backfill):
+    """
+    Renumbers each exhibition's pending registrations 1..n and clears the
+    position of everything else. Existing order is kept, and rows without a
+    position join the back in submission order. Chunks are exhibitions, so a
+    queue is never split across transactions. Run ``registration-status``
+    first.
+    """
+    name = 'registration-queue-positions'
+    model = Exhibition
+    chunk_size = 50
+    description = 'Renumber pending queues 1..n per exhibition'
+
+    def process(self, pks):
+        stale = list(
+            Registration.objects.filter(exhibition_id__in=pks, queue_position__isnull=False)
+            .exclude(status='PENDING')
+            .values_list('id', flat=True)
+        )
+        Registration.objects.filter(id__in=stale).update(queue_position=None)
+        pending = (
+            Registration.objects.filter(exhibition_id__in=pks, status='PENDING')
+            .order_by('exhibition_id', F('queue_position').asc(nulls_last=True), 'submitted_at', 'id')
+            .values_list('id', 'exhibition_id', 'queue_position')
+        )
+        renumbered, exhibition, position = [], None, 0
+        for pk, exhibition_id, current in pending:
+            position = position + 1 if exhibition_id == exhibition else 1
+            exhibition = exhibition_id
+            if current != position:
+                renumbered.append(Registration(pk=pk, queue_position=position))
+        Registration.objects.bulk_update(renumbered, ['queue_position'], batch_size=500)
+
+        changed = stale + [registration.pk for registration in renumbered]
+        if changed:
+            caching.invalidate_visitors(set(
+                Registration.objects.filter(id__in=changed).values_list('visitor__email', flat=True)
+            ))
+        return len(changed)
@@ -0,0 +1,133 @@
+"""
+Bulk art piece bookings for one exhibition.
+
+Hanging a large show used to take one request per piece. Each function here
+handles a whole list of art piece ids in one transaction, using
+``bulk_create`` and set-based UPDATE statements. Those skip the model
+signals, so they do the signal-driven bookkeeping themselves once per batch:
+
+* cache invalidation (``caching.ART_PIECES``),
+* valuation rollups for the exhibition, and for statuses when pieces are
+  marked DISPLAYED.
+
+Removals go through ``delete()``, so ``post_delete`` records their sync
+tombstones.
+
+``updated_at`` is set explicitly wherever ``update()`` would skip
+``auto_now``.
+"""
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import caching, conflicts, valuation
+from .models import ArtPiece, ExhibitionArtPiece
+
+MAX_BATCH = 1000
+
+
+class BookingError(Exception):
+    def __init__(self, message, details=None):
+        super().__init__(message)
+        self.details = details or []
+
+
+def _unique_ids(art_piece_ids):
+    return list(dict.fromkeys(art_piece_ids))
+
+
+def _changed(exhibition, displayed=0):
+    caching.bump_on_commit(caching.ART_PIECES)
+    groups = [('exhibition', exhibition.pk)]
+    if displayed:
+        groups.append(('status', valuation.ALL))
+    valuation.mark_dirty(groups)
+
+
+def _display(art_piece_ids, now):
+    return (
+        ArtPiece.objects.filter(id__in=art_piece_ids)
+        .exclude(status='DISPLAYED')
+        .update(status='DISPLAYED', updated_at=now)
+    )
+
+
+def _insert(exhibition, art_piece_ids, confirmed):
+    """Book the pieces; returns the ids this call actually booked"""
+    while art_piece_ids:
+        try:
+            with transaction.atomic():
+                ExhibitionArtPiece.objects.bulk_create(
+                    ExhibitionArtPiece(exhibition=exhibition, art_piece_id=pk, confirmed=confirmed)
+                    for pk in art_piece_ids
+                )
+            return art_piece_ids
+        except IntegrityError:
+            # Some were booked concurrently on another connection: leave those out
+            taken = set(
+                ExhibitionArtPiece.objects.filter(exhibition=exhibition, art_piece_id__in=art_piece_ids)
+                .values_list('art_piece_id', flat=True)
+            )
+            art_piece_ids = [pk for pk in art_piece_ids if pk not in taken]
+    return art_piece_ids
+
+
+def add(exhibition, art_piece_ids, confirmed=False, display=False):
+    """Book the pieces into ``exhibition``; pieces already booked are left as they are"""
+    ids = _unique_ids(art_piece_ids)
+    with transaction.atomic():
+        found = set(ArtPiece.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = [pk for pk in ids if pk not in found]
+        if missing:
+            raise BookingError('Unknown art pieces', missing)
+
+        booked = set(
+            ExhibitionArtPiece.objects.filter(exhibition=exhibition, art_piece_id__in=ids)
+            .values_list('art_piece_id', flat=True)
+        )
+        new = [pk for pk in ids if pk not in booked]
+        found_conflicts = conflicts.check_assignments([(exhibition, pk) for pk in new])
+        if found_conflicts:
+            raise BookingError('Booking conflicts', [conflicts.describe(c) for c in found_conflicts])
+
+        new = _insert(exhibition, new, confirmed)
+        displayed = _display(new, timezone.now()) if display and new else 0
+        if new:
+            _changed(exhibition, displayed)
+    return {'requested': len(ids), 'added': len(new), 'already_booked': len(ids) - len(new), 'displayed': displayed}
+
+
+def remove(exhibition, art_piece_ids):
+    """Unbook the pieces from ``exhibition``"""
+    ids = _unique_ids(art_piece_ids)
+    with transaction.atomic():
+        bookings = ExhibitionArtPiece.objects.filter(exhibition=exhibition, art_piece_id__in=ids)
+        booking_ids = list(bookings.values_list('id', flat=True))
+        if booking_ids:
+            _, deleted = ExhibitionArtPiece.objects.filter(id__in=booking_ids).delete()
+            removed = deleted.get(ExhibitionArtPiece._meta.label, 0)
+            _changed(exhibition)
+        else:
+            removed = 0
+    return {'requested': len(ids), 'removed': removed, 'not_booked': len(ids) - removed}
+
+
+def confirm(exhibition, art_piece_ids=None, display=False):
+    """Confirm the bookings of these pieces (every booking when None)"""
+    ids = None if art_piece_ids is None else _unique_ids(art_piece_ids)
+    now = timezone.now()
+    with transaction.atomic():
+        bookings = ExhibitionArtPiece.objects.filter(exhibition=exhibition)
+        if ids is not None:
+            bookings = bookings.filter(art_piece_id__in=ids)
+        booked = list(bookings.values_list('art_piece_id', flat=True))
+        confirmed = bookings.filter(confirmed=False).update(confirmed=True, updated_at=now)
+        displayed = _display(booked, now) if display and booked else 0
+        if confirmed or displayed:
+            _changed(exhibition, displayed)
+    return {
+        'requested': len(booked) if ids is None else len(ids),
+        'confirmed': confirmed,
+        'already_confirmed': len(booked) - confirmed,
+        'not_booked': 0 if ids is None else len(ids) - len(booked),
+        'displayed': displayed,
+    }
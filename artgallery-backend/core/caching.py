@@ -0,0 +1,154 @@
+"""
+Versioned cache keys.
+
+Cached responses are keyed under one or more *namespace versions*. To drop
+everything under a namespace, bump its version: one counter update,
+whatever the number of entries. Entries under old versions are never read
+again and age out through their TTL. A version that gets evicted restarts
+from a fresh, time-based value, so stale entries can't be revived by
+reusing an old number.
+
+The receivers at the bottom bump the namespaces the cached API responses
+depend on, after the changing transaction commits.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .signals import cache_namespaces_bumped
+
+VERSION_TIMEOUT = None  # Versions never expire on their own
+
+
+def _version_key(namespace):
+    return 'v:' + digest(namespace)
+
+
+def digest(*parts):
+    """Stable hash of ``parts`` for use in cache keys"""
+    return hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _fresh_version():
+    return time.time_ns()
+
+
+def get_versions(*namespaces):
+    """Current version of each namespace, creating missing ones"""
+    keys = [_version_key(ns) for ns in namespaces]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            cache.add(key, _fresh_version(), VERSION_TIMEOUT)
+            version = cache.get(key)
+        versions.append(version)
+    return versions
+
+
+def bump(*namespaces):
+    """Invalidate every entry stored under these namespaces"""
+    for namespace in namespaces:
+        key = _version_key(namespace)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), VERSION_TIMEOUT)
+    cache_namespaces_bumped.send(sender=None, namespaces=namespaces)
+
+
+def bump_on_commit(*namespaces):
+    """``bump`` once the current transaction commits (immediately outside one)"""
+    if namespaces:
+        transaction.on_commit(lambda: bump(*namespaces))
+
+
+def ttl(setting, default):
+    """Cache timeout in seconds from ``setting``"""
+    return getattr(settings, setting, default)
+
+
+def versioned_key(prefix, namespaces, *parts):
+    """Cache key for ``parts`` that changes whenever any of ``namespaces`` is bumped"""
+    versions = get_versions(*namespaces)
+    return f"{prefix}:{digest(*versions, *parts)}"
+
+
+# ---------------------------
+# Namespaces
+# ---------------------------
+
+EXHIBITIONS = 'exhibitions'
+ART_PIECES = 'art-pieces'  # Art pieces and their exhibition links
+ARTISTS = 'artists'
+
+
+def visitor_registrations(email):
+    """Namespace for one visitor's registration listings"""
+    return f"visitor-registrations:{(email or '').lower()}"
+
+
+def artist_portfolio(artist_id):
+    return f"artist-portfolio:{artist_id}"
+
+
+def exhibition_registrations(exhibition_id):
+    """Namespace for one exhibition's registration counts"""
+    return f"exhibition-registrations:{exhibition_id}"
+
+
+# ---------------------------
+# Invalidation receivers
+# ---------------------------
+
+def invalidate_visitors(emails):
+    bump_on_commit(*{visitor_registrations(email) for email in emails})
+
+
+def invalidate_exhibition_registrations(exhibition_ids):
+    bump_on_commit(*{exhibition_registrations(pk) for pk in exhibition_ids})
+
+
+def registration_changed(sender, instance, **kwargs):
+    """``post_save``/``post_delete`` receiver for ``Registration``"""
+    from .models import Visitor
+
+    email = Visitor.objects.filter(pk=instance.visitor_id).values_list('email', flat=True).first()
+    if email is not None:
+        invalidate_visitors([email])
+    invalidate_exhibition_registrations([instance.exhibition_id])
+
+
+def queue_shifted(sender, exhibition_id, vacated_position, **kwargs):
+    """``registration_queue_changed`` receiver: everyone behind the slot moved up"""
+    from .models import Registration
+
+    if vacated_position:
+        bump(*{
+            visitor_registrations(email) for email in Registration.objects.filter(
+                exhibition_id=exhibition_id, status='PENDING', queue_position__gte=vacated_position
+            ).values_list('visitor__email', flat=True)
+        })
+
+
+def exhibition_changed(sender, **kwargs):
+    """``post_save``/``post_delete`` receiver for ``Exhibition`` (titles and dates are embedded)"""
+    bump_on_commit(EXHIBITIONS)
+
+
+def art_piece_changed(sender, **kwargs):
+    """
+    ``post_save``/``post_delete`` receiver for ``ArtPiece`` and
+    ``ExhibitionArtPiece``. A piece can move between artists, so every
+    portfolio is dropped rather than just the current artist's.
+    """
+    bump_on_commit(ART_PIECES)
+
+
+def artist_changed(sender, instance, **kwargs):
+    """``post_save``/``post_delete`` receiver for ``Artist``"""
+    bump_on_commit(artist_portfolio(instance.pk), ARTISTS)
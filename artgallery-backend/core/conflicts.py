@@ -0,0 +1,102 @@
+"""
+Booking conflicts: one physical art piece hung in two exhibitions whose
+dates overlap. Dates are inclusive, so a show ending on the day another
+starts still conflicts; the piece can't be in both rooms that day.
+
+Everything reduces to a sweep over bookings sorted by piece and start date.
+For each piece it keeps the bookings still running when the next one starts.
+A new booking conflicts with exactly those, which makes a report a single
+pass over one sorted join. Validating new assignments fetches only the
+existing bookings of those pieces that fall within the new date range,
+through the exhibition date index.
+"""
+from collections import namedtuple
+
+from .models import ExhibitionArtPiece
+
+Booking = namedtuple('Booking', 'art_piece_id exhibition_id exhibition_title start_date end_date')
+Conflict = namedtuple('Conflict', 'art_piece_id first second')
+
+BOOKING_COLUMNS = (
+    'art_piece_id', 'exhibition_id', 'exhibition__title', 'exhibition__start_date', 'exhibition__end_date'
+)
+
+
+def sweep(bookings):
+    """Yield a ``Conflict`` for each overlapping pair in ``bookings`` sorted by (piece, start date)"""
+    piece, running = None, []
+    for booking in bookings:
+        if booking.art_piece_id != piece:
+            piece, running = booking.art_piece_id, []
+        running = [other for other in running if other.end_date >= booking.start_date]
+        for other in running:
+            yield Conflict(piece, other, booking)
+        running.append(booking)
+
+
+def _sorted_bookings(queryset):
+    rows = (
+        queryset.order_by('art_piece_id', 'exhibition__start_date', 'exhibition_id')
+        .values_list(*BOOKING_COLUMNS)
+    )
+    return (Booking(*row) for row in rows.iterator(chunk_size=2000))
+
+
+def find_conflicts(queryset=None):
+    """Every conflict among ``queryset`` (all bookings by default), from one sorted join"""
+    if queryset is None:
+        queryset = ExhibitionArtPiece.objects.all()
+    return list(sweep(_sorted_bookings(queryset)))
+
+
+def check_assignments(assignments, replacing=()):
+    """
+    Conflicts that booking ``(exhibition, art_piece_id)`` pairs would cause,
+    with existing bookings or with each other. ``replacing`` holds the ids of
+    ``ExhibitionArtPiece`` rows the assignments replace, such as the row being
+    updated.
+    """
+    new = {(exhibition.pk, art_piece_id): Booking(art_piece_id, exhibition.pk, exhibition.title,
+                                                  exhibition.start_date, exhibition.end_date)
+           for exhibition, art_piece_id in assignments}
+    if not new:
+        return []
+
+    start = min(booking.start_date for booking in new.values())
+    end = max(booking.end_date for booking in new.values())
+    existing = [
+        booking for booking in _sorted_bookings(
+            ExhibitionArtPiece.objects
+            .filter(art_piece_id__in={booking.art_piece_id for booking in new.values()},
+                    exhibition__start_date__lte=end, exhibition__end_date__gte=start)
+            .exclude(id__in=replacing)
+        )
+        if (booking.exhibition_id, booking.art_piece_id) not in new
+    ]
+    bookings = sorted([*existing, *new.values()],
+                      key=lambda b: (b.art_piece_id, b.start_date, b.exhibition_id))
+    return [
+        conflict for conflict in sweep(bookings)
+        if new.get((conflict.first.exhibition_id, conflict.art_piece_id)) is conflict.first
+        or new.get((conflict.second.exhibition_id, conflict.art_piece_id)) is conflict.second
+    ]
+
+
+def describe(conflict):
+    first, second = conflict.first, conflict.second
+    return (f"Art piece {conflict.art_piece_id} is booked into '{first.exhibition_title}' "
+            f"({first.start_date} to {first.end_date}) and '{second.exhibition_title}' "
+            f"({second.start_date} to {second.end_date})")
+
+
+def as_dict(conflict):
+    def booking(b):
+        return {'exhibition_id': b.exhibition_id, 'exhibition_title': b.exhibition_title,
+                'start_date': b.start_date, 'end_date': b.end_date}
+
+    return {
+        'art_piece_id': conflict.art_piece_id,
+        'overlap_start': max(conflict.first.start_date, conflict.second.start_date),
+        'overlap_end': min(conflict.first.end_date, conflict.second.end_date),
+        'bookings': [booking(conflict.first), booking(conflict.second)],
+    }
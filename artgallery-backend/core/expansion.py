@@ -0,0 +1,154 @@
+"""
+Relation expansion (``?include=``) and query planning for the core viewsets.
+
+Serializers declare which relations can be embedded in ``expandable_fields``,
+which model lookups their computed fields read in ``field_dependencies``, and
+which relations those fields load in ``field_prefetches``. ``plan`` walks the
+fields a request will actually render, including any ``?include=`` paths, and
+produces the smallest ``select_related``/``Prefetch``/``only()`` set. A page
+of any shape then costs a fixed number of queries.
+"""
+from dataclasses import dataclass, field
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+class Expandable:
+    """A relation a serializer can embed when it is named in ``?include=``"""
+
+    def __init__(self, serializer_class, many=False, source=None):
+        self.serializer_class = serializer_class
+        self.many = many
+        self.source = source
+
+    def build(self, name, subtree):
+        kwargs = {'many': self.many, 'read_only': True}
+        if self.source and self.source != name:
+            kwargs['source'] = self.source
+        if hasattr(self.serializer_class, 'expandable_fields'):
+            kwargs['include'] = subtree
+        return self.serializer_class(**kwargs)
+
+
+def parse_include(value):
+    """``'art_pieces.artist,visitor'`` -> ``{'art_pieces': {'artist': {}}, 'visitor': {}}``"""
+    tree = {}
+    for path in (value or '').split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part:
+                node = node.setdefault(part, {})
+    return tree
+
+
+def requested_include(request):
+    """Include tree for a read request, or an empty tree"""
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return {}
+    params = getattr(request, 'query_params', request.GET)
+    return parse_include(params.get('include'))
+
+
+def validate_include(serializer_class, tree, prefix=''):
+    """Raise a 400-style ValidationError for paths that can't be expanded"""
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    for name, subtree in tree.items():
+        if name not in expandable:
+            raise serializers.ValidationError({'include': f"Unknown relation '{prefix}{name}'"})
+        validate_include(expandable[name].serializer_class, subtree, f"{prefix}{name}.")
+
+
+@dataclass
+class QueryPlan:
+    lookups: set = field(default_factory=set)   # None when only() can't be used
+    relations: set = field(default_factory=set)
+    prefetches: list = field(default_factory=list)
+
+    def apply(self, queryset, narrow=False):
+        if self.lookups is not None:
+            # Every join the output needs is known, so drop the view's defaults
+            queryset = queryset.select_related(None)
+        if self.relations:
+            queryset = queryset.select_related(*sorted(self.relations))
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*self.prefetches)
+        if narrow and self.lookups is not None:
+            queryset = queryset.only(queryset.model._meta.pk.name, *self.lookups)
+        return queryset
+
+
+def concrete_lookup(model, lookup):
+    """
+    Validate ``lookup`` as a chain of forward relations ending in a column.
+
+    Returns the relation path to ``select_related`` ('' for a local column),
+    or None if the lookup can't be used with ``only()``.
+    """
+    parts = lookup.split('__')
+    for index, part in enumerate(parts):
+        try:
+            model_field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not getattr(model_field, 'concrete', False) or model_field.many_to_many:
+            return None
+        if index < len(parts) - 1:
+            if not model_field.is_relation:
+                return None
+            model = model_field.related_model
+    return '__'.join(parts[:-1])
+
+
+def plan(serializer_class, model, keep=None, include=None):
+    """Plan the queryset for rendering ``keep`` (all if None) with ``include`` expanded"""
+    query_plan = QueryPlan()
+    _walk(query_plan, serializer_class, model, '', keep, include or {})
+    return query_plan
+
+
+def _walk(query_plan, serializer_class, model, prefix, keep, include):
+    fields = serializer_class().fields
+    names = fields.keys() if keep is None else keep
+    expandable = getattr(serializer_class, 'expandable_fields', {})
+    dependencies = getattr(serializer_class, 'field_dependencies', {})
+    prefetches = getattr(serializer_class, 'field_prefetches', {})
+
+    for name in names:
+        if name in include and name in expandable:
+            relation = expandable[name]
+            source = relation.source or name
+            related_model = model._meta.get_field(source).related_model
+            if relation.many:
+                nested = plan(relation.serializer_class, related_model, include=include[name])
+                queryset = nested.apply(related_model._default_manager.all())
+                query_plan.prefetches.append(Prefetch(prefix + source, queryset=queryset))
+            else:
+                query_plan.relations.add(prefix + source)
+                _walk(query_plan, relation.serializer_class, related_model,
+                      f"{prefix}{source}__", None, include[name])
+            continue
+
+        if name in prefetches:
+            query_plan.prefetches.append(prefix + prefetches[name])
+
+        lookups = dependencies.get(name)
+        if lookups is None:
+            serializer_field = fields[name]
+            source = serializer_field.source
+            if (not source or source == '*'
+                    or isinstance(serializer_field, serializers.SerializerMethodField)):
+                query_plan.lookups = None  # Unknown inputs; keep the view's joins
+                continue
+            lookups = [source.replace('.', '__')]
+
+        for lookup in lookups:
+            relation = concrete_lookup(model, lookup)
+            if relation is None:
+                query_plan.lookups = None
+                continue
+            if query_plan.lookups is not None:
+                query_plan.lookups.add(prefix + lookup)
+            if relation:
+                query_plan.relations.add(prefix + relation)
@@ -0,0 +1,179 @@
+"""
+Read-only fast path for list endpoints.
+
+``ValuesReader`` compiles a serializer's field list into a single
+``values_list()`` query and renders each row tuple straight into the
+serializer's JSON shape. No model instances or per-row field binding are
+involved. Formatting stays exactly the same: fields whose representation
+isn't the raw column value (decimals, dates, datetimes) go through the
+serializer's own field objects.
+
+The reader understands three kinds of fields:
+
+* model fields and primary key relations, read from their ``source``
+  (``ColumnField`` subclasses included);
+* method fields with a single ``field_dependencies`` lookup, which are
+  assumed to return that value unchanged;
+* ``field_prefetches`` entries that are also ``many`` expandable relations.
+  These are rendered with the nested serializer, from one extra query per
+  page.
+
+Any other field makes ``reader_for`` return None, and the view falls back to
+the regular serializer.
+"""
+from collections import defaultdict
+from functools import lru_cache
+
+from rest_framework import serializers
+
+from .expansion import concrete_lookup
+
+# Fields whose to_representation() returns the database value unchanged
+PASSTHROUGH_FIELDS = (
+    serializers.CharField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    serializers.PrimaryKeyRelatedField,
+)
+
+
+class ColumnField(serializers.Field):
+    """
+    Base for read-only fields rendered from their column's value alone; the
+    reader passes the raw value to ``to_representation``
+    """
+
+
+class Unsupported(Exception):
+    """The serializer has a field the values() path can't reproduce"""
+
+
+def _converter(serializer_field):
+    if isinstance(serializer_field, serializers.PrimaryKeyRelatedField):
+        if serializer_field.pk_field is not None:
+            raise Unsupported(serializer_field.field_name)
+        return None
+    if isinstance(serializer_field, PASSTHROUGH_FIELDS):
+        return None
+    if isinstance(serializer_field, (serializers.DecimalField, serializers.DateTimeField,
+                                     serializers.DateField, serializers.FloatField, ColumnField)):
+        return serializer_field.to_representation
+    raise Unsupported(serializer_field.field_name)
+
+
+class ValuesReader:
+    """Renders ``values_list()`` rows in the shape of ``serializer_class``"""
+
+    def __init__(self, serializer_class, keep=None):
+        self.model = serializer_class.Meta.model
+        fields = serializer_class().fields
+        dependencies = getattr(serializer_class, 'field_dependencies', {})
+        prefetches = getattr(serializer_class, 'field_prefetches', {})
+        expandable = getattr(serializer_class, 'expandable_fields', {})
+
+        self.names = []
+        self.lookups = []
+        self.converters = []
+        self.children = []
+
+        for name, serializer_field in fields.items():
+            if keep is not None and name not in keep:
+                continue
+            if name in prefetches:
+                relation = expandable.get(name)
+                if relation is None or not relation.many:
+                    raise Unsupported(name)
+                self.names.append(name)
+                self.children.append((name, _ChildReader(
+                    self.model, relation.source or name, relation.serializer_class
+                )))
+                continue
+
+            if isinstance(serializer_field, serializers.SerializerMethodField):
+                lookups = dependencies.get(name) or []
+                if len(lookups) != 1:
+                    raise Unsupported(name)
+                lookup, convert = lookups[0], None
+            else:
+                if not serializer_field.source or serializer_field.source == '*':
+                    raise Unsupported(name)
+                lookup = serializer_field.source.replace('.', '__')
+                convert = _converter(serializer_field)
+
+            if concrete_lookup(self.model, lookup) is None:
+                raise Unsupported(name)
+            self.converters.append((len(self.lookups), convert))
+            self.names.append(name)
+            self.lookups.append(lookup)
+
+        self.converters = [(index, convert) for index, convert in self.converters if convert]
+
+    def prepare(self, queryset, *extra):
+        """Turn a model queryset into the row query this reader renders"""
+        lookups = self.lookups + ['pk'] if self.children else self.lookups
+        return queryset.prefetch_related(None).values_list(*lookups, *extra)
+
+    def render(self, rows):
+        """Map row tuples from ``prepare()`` to dicts; trailing extra columns are ignored"""
+        rows = list(rows)
+        width = len(self.lookups)
+        nested = {}
+        if self.children and rows:
+            ids = [row[width] for row in rows]
+            nested = {name: child.load(ids) for name, child in self.children}
+
+        names = self.names
+        converters = self.converters
+        data = []
+        for row in rows:
+            values = list(row[:width])
+            for index, convert in converters:
+                if values[index] is not None:
+                    values[index] = convert(values[index])
+            if nested:
+                columns = iter(values)
+                item = {
+                    name: nested[name].get(row[width], []) if name in nested else next(columns)
+                    for name in names
+                }
+            else:
+                item = dict(zip(names, values))
+            data.append(item)
+        return data
+
+
+class _ChildReader:
+    """Loads a to-many relation for a page of parents in one query"""
+
+    def __init__(self, model, source, serializer_class):
+        relation = model._meta.get_field(source)
+        if relation.many_to_many and not relation.auto_created:
+            self.parent_lookup = relation.related_query_name()
+        elif relation.one_to_many:
+            self.parent_lookup = relation.field.name
+        else:
+            raise Unsupported(source)
+        self.reader = ValuesReader(serializer_class)
+
+    def load(self, parent_ids):
+        """``{parent id: [rendered child, ...]}`` in the related model's default order"""
+        queryset = self.reader.model._default_manager.filter(**{f"{self.parent_lookup}__in": parent_ids})
+        rows = list(self.reader.prepare(queryset, self.parent_lookup))
+        grouped = defaultdict(list)
+        for row, item in zip(rows, self.reader.render(rows)):
+            grouped[row[-1]].append(item)
+        return grouped
+
+
+@lru_cache(maxsize=256)
+def _compile(serializer_class, keep):
+    try:
+        return ValuesReader(serializer_class, keep)
+    except Unsupported:
+        return None
+
+
+def reader_for(serializer_class, keep=None):
+    """Cached reader for ``serializer_class`` limited to ``keep``, or None if unsupported"""
+    return _compile(serializer_class, frozenset(keep) if keep is not None else None)
@@ -0,0 +1,25 @@
+"""
+File-based cache backend with amortised culling.
+
+Django's ``FileBasedCache`` lists the whole cache directory on every write
+to decide whether to cull, so a write costs O(entries). With a few thousand
+visitor and response keys that is milliseconds per ``set``, paid on every
+cache bump. This backend checks only on every ``CULL_EVERY``-th write of
+the process (an ``OPTIONS`` key, default 500). The directory may therefore
+overshoot ``MAX_ENTRIES`` by that many files per process before it is culled.
+"""
+import itertools
+
+from django.core.cache.backends import filebased
+
+
+class FileBasedCache(filebased.FileBasedCache):
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_every = max(int(params.get('OPTIONS', {}).get('CULL_EVERY', 500)), 1)
+        self._writes = itertools.count(1)
+
+    def _cull(self):
+        if next(self._writes) % self._cull_every == 0:
+            super()._cull()
@@ -0,0 +1,158 @@
+"""
+Idempotency-Key support for endpoints that create registrations.
+
+A client that retries a POST with the same ``Idempotency-Key`` header gets
+the original response back straight from the key store. The view body (and
+every validation query in it) only runs for the first request.
+
+A request holds its key for ``IDEMPOTENCY_CLAIM_LEASE`` while it runs. If its
+worker dies, a retry of the same request takes the key over once the lease
+has run out, instead of getting 409 until the key expires.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def get_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', timedelta(hours=24))
+
+
+def get_lease():
+    return getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', timedelta(seconds=60))
+
+
+def _request_hash(request):
+    try:
+        body = json.dumps(request.data, sort_keys=True, default=str)
+    except (TypeError, ValueError):
+        body = str(request.data)
+    payload = f"{request.method}:{request.path}:{body}"
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _replay(record, request_hash):
+    """Build the response for a key that has already been seen"""
+    if record['request_hash'] != request_hash:
+        return Response(
+            {'error': 'Idempotency-Key was already used for a different request'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record['response_status'] is None:
+        return Response(
+            {'error': 'A request with this Idempotency-Key is still being processed'},
+            status=status.HTTP_409_CONFLICT
+        )
+    response = Response(record['response_body'], status=record['response_status'])
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _lease_expired(record, now):
+    return record['response_status'] is None and record['claimed_at'] <= now - get_lease()
+
+
+def _claim(user, key, request, request_hash):
+    """
+    Reserve the key for this request. Returns ``(claimed_at, None)`` once it
+    holds the key, or ``(None, record)`` with the stored record if it's taken.
+    """
+    now = timezone.now()
+    try:
+        # Savepoint, so a lost race doesn't break a surrounding transaction
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user=user,
+                key=key,
+                request_path=request.path[:255],
+                request_hash=request_hash,
+                expires_at=now + get_ttl(),
+                claimed_at=now,
+            )
+        return now, None
+    except IntegrityError:
+        pass
+
+    # Someone holds the key; an expired holder can be replaced once
+    deleted, _ = IdempotencyKey.objects.filter(user=user, key=key, expires_at__lte=now).delete()
+    if deleted:
+        return _claim(user, key, request, request_hash)
+
+    # An unfinished claim whose lease ran out can be taken over by the same request
+    taken = IdempotencyKey.objects.filter(
+        user=user, key=key, request_hash=request_hash,
+        response_status__isnull=True, claimed_at__lte=now - get_lease(),
+    ).update(claimed_at=now)
+    if taken:
+        return now, None
+    return None, (
+        IdempotencyKey.objects.filter(user=user, key=key)
+        .values('request_hash', 'response_status', 'response_body')
+        .first()
+    )
+
+
+def idempotent(view_method):
+    """
+    Decorator for APIView handlers and viewset actions.
+
+    Requests without an ``Idempotency-Key`` header, or from anonymous users,
+    are passed straight through. Responses below 500 are stored for the key's
+    TTL; server errors release the key so the client can retry. A request
+    that lost its claim to a retry leaves the key to the retry.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.META.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f'Idempotency-Key must be at most {MAX_KEY_LENGTH} characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        request_hash = _request_hash(request)
+
+        # Fast path: a replay costs a single indexed lookup
+        now = timezone.now()
+        record = (
+            IdempotencyKey.objects.filter(user=request.user, key=key, expires_at__gt=now)
+            .values('request_hash', 'response_status', 'response_body', 'claimed_at')
+            .first()
+        )
+        if record is not None and not _lease_expired(record, now):
+            return _replay(record, request_hash)
+
+        claimed_at, record = _claim(request.user, key, request, request_hash)
+        if record is not None:
+            return _replay(record, request_hash)
+
+        keys = IdempotencyKey.objects.filter(user=request.user, key=key, claimed_at=claimed_at)
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            keys.delete()
+            raise
+
+        if response.status_code >= 500 or not isinstance(response, Response):
+            keys.delete()
+        else:
+            keys.update(response_status=response.status_code, response_body=response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,313 @@
+"""
+Art piece images and their thumbnails.
+
+An upload is streamed to disk chunk by chunk and hashed on the way in. It is
+stored once per content as ``MEDIA_ROOT/images/<ab>/<sha256>.<ext>``, and
+``ArtPiece.image`` holds ``<sha256>.<ext>``. Thumbnails for
+``ART_IMAGE_THUMBNAIL_SIZES`` (longest edge, JPEG) are keyed by the same
+digest. Identical uploads share them, and a thumbnail that exists is never
+rendered again.
+
+After an upload commits, thumbnails are rendered in a process pool so
+resizing never holds up a request or the GIL. A size that isn't ready yet is
+rendered on first request. Pillow is optional; without it the thumbnail URLs
+serve the original.
+
+``serve_file`` answers ``If-None-Match`` and single ``Range`` requests. It
+hands the open file to the server, so WSGI servers with ``sendfile()``
+support skip copying through Python.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pragma: no cover - optional dependency
+    Image = ImageOps = None
+
+from .fastpath import ColumnField
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Leading bytes -> (extension, content type)
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', 'image/png'),
+    (b'GIF87a', 'gif', 'image/gif'),
+    (b'GIF89a', 'gif', 'image/gif'),
+]
+CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+
+class ImageError(Exception):
+    """An upload that can't be stored as an art piece image"""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def thumbnail_sizes():
+    return list(_setting('ART_IMAGE_THUMBNAIL_SIZES', [200, 400, 800]))
+
+
+def original_path(name):
+    return os.path.join(settings.MEDIA_ROOT, 'images', name[:2], name)
+
+
+def thumbnail_path(digest, size):
+    return os.path.join(settings.MEDIA_ROOT, 'thumbnails', digest[:2], digest, f"{size}.jpg")
+
+
+def is_digest(value):
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+
+def sniff(head):
+    """Extension for the image format ``head`` starts with, or None"""
+    for signature, extension, _ in SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def find(digest):
+    """Stored name of the original with this digest, or None"""
+    for extension in CONTENT_TYPES:
+        name = f"{digest}.{extension}"
+        if os.path.exists(original_path(name)):
+            return name
+    return None
+
+
+# ---------------------------
+# Uploads
+# ---------------------------
+
+def store(upload):
+    """Stream ``upload`` (an ``UploadedFile``) to its content-addressed file; returns the stored name"""
+    limit = _setting('ART_IMAGE_MAX_BYTES', 20 * 1024 * 1024)
+    if upload.size > limit:
+        raise ImageError(f"Images may be at most {limit // (1024 * 1024)} MB")
+
+    directory = os.path.join(settings.MEDIA_ROOT, 'images')
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+    digest = hashlib.sha256()
+    extension = None
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            for chunk in upload.chunks(CHUNK_SIZE):
+                if extension is None:
+                    extension = sniff(chunk)
+                    if extension is None:
+                        raise ImageError('Expected a JPEG, PNG, GIF or WebP image')
+                digest.update(chunk)
+                f.write(chunk)
+        if extension is None:
+            raise ImageError('The uploaded file is empty')
+
+        name = f"{digest.hexdigest()}.{extension}"
+        path = original_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temporary, path)  # Same content under the same name, so replacing is harmless
+        return name
+    except BaseException:
+        if os.path.exists(temporary):
+            os.unlink(temporary)
+        raise
+
+
+# ---------------------------
+# Thumbnails
+# ---------------------------
+
+def render_thumbnails(source, targets):
+    """
+    Render ``(size, path)`` thumbnails of ``source``, skipping existing ones.
+    Runs in pool workers, so it takes plain paths and never touches Django.
+    """
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        for size, target in sorted(targets, reverse=True):
+            if os.path.exists(target):
+                continue
+            # Largest first, so each smaller size resizes the previous result
+            image.thumbnail((size, size))
+            flat = image
+            if flat.mode not in ('RGB', 'L'):
+                rgba = flat.convert('RGBA')
+                flat = Image.new('RGB', rgba.size, 'white')
+                flat.paste(rgba, mask=rgba.getchannel('A'))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.{os.getpid()}.tmp"
+            flat.save(temporary, 'JPEG', quality=85, optimize=True, progressive=True)
+            os.replace(temporary, target)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=_setting('ART_IMAGE_THUMBNAIL_WORKERS', 2))
+        return _pool
+
+
+def _log_failure(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Thumbnail rendering failed: %s', error)
+
+
+def schedule_thumbnails(name):
+    """Render the missing thumbnails of stored image ``name`` in the pool; returns the future or None"""
+    if Image is None:
+        return None
+    digest = name.partition('.')[0]
+    targets = [(size, thumbnail_path(digest, size)) for size in thumbnail_sizes()]
+    targets = [(size, path) for size, path in targets if not os.path.exists(path)]
+    if not targets:
+        return None
+    future = _executor().submit(render_thumbnails, original_path(name), targets)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def thumbnail_file(digest, size):
+    """
+    ``(path, content type, etag, cache control)`` to serve for a thumbnail,
+    or None if there's no such image or size
+    """
+    if size not in thumbnail_sizes():
+        return None
+    target = thumbnail_path(digest, size)
+    if not os.path.exists(target):
+        name = find(digest)
+        if name is None:
+            return None
+        if Image is None:
+            # Not immutable: this URL serves a real thumbnail once Pillow is installed
+            return original_path(name), CONTENT_TYPES[name.partition('.')[2]], f'"{digest}"', 'public, max-age=3600'
+        render_thumbnails(original_path(name), [(size, target)])
+    return target, 'image/jpeg', f'"{digest}-{size}"', IMMUTABLE
+
+
+def thumbnail_urls(name):
+    """``{size: url}`` for stored image ``name``"""
+    digest = name.partition('.')[0]
+    return {str(size): f"/api/images/{digest}/{size}.jpg" for size in thumbnail_sizes()}
+
+
+class ThumbnailURLsField(ColumnField):
+    """Renders ``ArtPiece.image`` as its thumbnail URLs (None without an image)"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return thumbnail_urls(str(value)) if value else None
+
+
+# ---------------------------
+# Serving
+# ---------------------------
+
+def parse_range(header, size):
+    """
+    ``(first, last)`` byte positions for a single ``bytes=`` range; None to
+    send the whole file (no, malformed or multi-part range); False if the
+    range can't be satisfied
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    first, _, last = header[len('bytes='):].strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start > end and last:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+class FileSlice:
+    """
+    ``length`` bytes of ``file`` from its current position. ``fileno`` is
+    exposed so servers can still ``sendfile()`` it; they bound the copy by
+    Content-Length.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.file.read(self.remaining if size is None or size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def _with_headers(response, headers):
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def serve_file(request, path, content_type, etag, cache_control=IMMUTABLE):
+    """Response for ``path`` honouring ``If-None-Match``, ``Range`` and ``If-Range``"""
+    headers = {'ETag': etag, 'Cache-Control': cache_control, 'Accept-Ranges': 'bytes'}
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        return _with_headers(HttpResponseNotModified(), headers)
+
+    size = os.path.getsize(path)
+    byte_range = None
+    if request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+    if byte_range is False:
+        return _with_headers(HttpResponse(status=416), {**headers, 'Content-Range': f"bytes */{size}"})
+
+    file = open(path, 'rb')
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+        del response['Content-Disposition']
+    else:
+        first, last = byte_range
+        file.seek(first)
+        response = FileResponse(FileSlice(file, last - first + 1), content_type=content_type, status=206)
+        response.headers['Content-Length'] = str(last - first + 1)
+        response.headers['Content-Range'] = f"bytes {first}-{last}/{size}"
+    return _with_headers(response, headers)
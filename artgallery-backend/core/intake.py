@@ -0,0 +1,251 @@
+"""
+Buffered (write-behind) registration intake.
+
+In buffered mode a registration request is checked for shape, appended to the
+``RegistrationIntake`` journal and answered with ``202 Accepted`` and a
+tracking id. ``drain`` later applies queued entries to ``Registration`` in
+submission order, a batch per transaction, using ``bulk_create``.
+
+The journal lives in another database, so it's updated after the batch
+commits. Each registration records the tracking id of its entry. If a drain
+dies in between, the next one finds those registrations and marks their
+entries applied rather than rejecting them as duplicates.
+"""
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Exhibition, Registration, RegistrationIntake, Visitor
+from .routers import intake_database
+
+OPEN_EXHIBITION_STATUSES = ('UPCOMING', 'ONGOING')
+MAX_ATTENDEES = 10
+
+
+class IntakeRejected(Exception):
+    """A submission that fails the checks done before journaling"""
+
+    def __init__(self, message, field=None, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.field = field
+        self.status_code = status_code
+
+    def as_response_data(self):
+        data = {'error': self.message}
+        if self.field:
+            data['field'] = self.field
+        return data
+
+
+@dataclass
+class DrainResult:
+    applied: int = 0
+    rejected: int = 0
+
+    @property
+    def processed(self):
+        return self.applied + self.rejected
+
+
+def is_buffered():
+    return getattr(settings, 'REGISTRATION_INTAKE_MODE', 'direct') == 'buffered'
+
+
+def _visitor_name(user):
+    name = f"{getattr(user, 'first_name', '')} {getattr(user, 'last_name', '')}".strip()
+    return name or getattr(user, 'username', '') or user.email
+
+
+def validate_submission(data, exhibition_id=None):
+    """
+    Return ``(exhibition_id, attendees_count)`` for a registration payload.
+
+    Mirrors the checks ``RegistrationViewSet.create`` does before it touches
+    the database, plus a read-only lookup of the exhibition's status.
+    """
+    if exhibition_id is None:
+        exhibition_id = data.get('exhibition') or data.get('exhibition_id')
+    if not exhibition_id:
+        raise IntakeRejected('Exhibition ID is required', field='exhibition')
+    try:
+        exhibition_id = int(exhibition_id)
+    except (ValueError, TypeError):
+        raise IntakeRejected('Exhibition ID must be a valid number', field='exhibition')
+
+    try:
+        attendees_count = int(data.get('attendees_count', 1))
+    except (ValueError, TypeError):
+        raise IntakeRejected('Attendees count must be a valid number', field='attendees_count')
+    if attendees_count < 1:
+        raise IntakeRejected('Attendees count must be at least 1', field='attendees_count')
+    if attendees_count > MAX_ATTENDEES:
+        raise IntakeRejected(
+            f'Maximum {MAX_ATTENDEES} attendees allowed per registration', field='attendees_count'
+        )
+
+    exhibition_status = (
+        Exhibition.objects.filter(id=exhibition_id).values_list('status', flat=True).first()
+    )
+    if exhibition_status is None:
+        raise IntakeRejected('Exhibition not found', field='exhibition', status_code=404)
+    if exhibition_status not in OPEN_EXHIBITION_STATUSES:
+        raise IntakeRejected(
+            f'Registration is not available for exhibitions with status: {exhibition_status}'
+        )
+    return exhibition_id, attendees_count
+
+
+def enqueue(user, exhibition_id, attendees_count):
+    """Append a validated submission to the journal"""
+    return RegistrationIntake.objects.create(
+        user_id=user.pk,
+        user_email=user.email,
+        visitor_name=_visitor_name(user),
+        visitor_phone=getattr(user, 'phone', '') or '',
+        exhibition_id=exhibition_id,
+        attendees_count=attendees_count,
+    )
+
+
+def queued_ahead(entry):
+    """Number of journal entries that will be applied before this one"""
+    if entry.status != 'QUEUED':
+        return 0
+    return RegistrationIntake.objects.filter(status='QUEUED', id__lt=entry.id).count()
+
+
+def drain(batch_size=500):
+    """Apply one batch of queued journal entries; returns a ``DrainResult``"""
+    entries = list(RegistrationIntake.objects.filter(status='QUEUED').order_by('id')[:batch_size])
+    if not entries:
+        return DrainResult()
+
+    now = timezone.now()
+    applied, recovered, rejected = [], [], {}
+
+    with transaction.atomic():
+        exhibitions = Exhibition.objects.in_bulk({e.exhibition_id for e in entries})
+
+        # Resolve (or create) every visitor in the batch with two queries
+        emails = {e.user_email for e in entries}
+        visitors = {}
+        for visitor in Visitor.objects.filter(email__in=emails).order_by('id'):
+            visitors.setdefault(visitor.email, visitor)
+        new_visitors = {}
+        for entry in entries:
+            if entry.user_email not in visitors and entry.user_email not in new_visitors:
+                new_visitors[entry.user_email] = Visitor(
+                    email=entry.user_email,
+                    name=entry.visitor_name,
+                    phone=entry.visitor_phone,
+                )
+        if new_visitors:
+            Visitor.objects.bulk_create(new_visitors.values())
+            visitors.update(new_visitors)
+
+        # (visitor, exhibition) -> (registration id, queue position, intake tracking id)
+        existing = {
+            (visitor_id, exhibition_id): rest
+            for visitor_id, exhibition_id, *rest in Registration.objects.filter(
+                exhibition_id__in=exhibitions.keys(),
+                visitor_id__in=[v.id for v in visitors.values()],
+            ).values_list('visitor_id', 'exhibition_id', 'id', 'queue_position', 'intake_tracking_id')
+        }
+        tail_positions = dict(
+            Registration.objects.filter(exhibition_id__in=exhibitions.keys(), status='PENDING')
+            .values('exhibition_id')
+            .annotate(tail=models.Max('queue_position'))
+            .values_list('exhibition_id', 'tail')
+        )
+
+        to_create = []
+        for entry in entries:
+            exhibition = exhibitions.get(entry.exhibition_id)
+            if exhibition is None:
+                rejected.setdefault('Exhibition not found', []).append(entry)
+                continue
+            if exhibition.status not in OPEN_EXHIBITION_STATUSES:
+                reason = f'Registration is not available for exhibitions with status: {exhibition.status}'
+                rejected.setdefault(reason, []).append(entry)
+                continue
+
+            visitor = visitors[entry.user_email]
+            pair = (visitor.id, exhibition.id)
+            if pair in existing:
+                registration_id, queue_position, tracking_id = existing[pair]
+                if tracking_id == entry.tracking_id:
+                    # Applied by an earlier drain that stopped before updating the journal
+                    entry.registration_id = registration_id
+                    entry.queue_position = queue_position
+                    recovered.append(entry)
+                    continue
+                entry.registration_id = registration_id
+                rejected.setdefault('You have already registered for this exhibition', []).append(entry)
+                continue
+
+            # Positions follow journal order, continuing after the live tail
+            position = (tail_positions.get(exhibition.id) or 0) + 1
+            tail_positions[exhibition.id] = position
+            registration = Registration(
+                visitor=visitor,
+                exhibition=exhibition,
+                attendees_count=entry.attendees_count,
+                status='PENDING',
+                confirmed=False,
+                queue_position=position,
+                intake_tracking_id=entry.tracking_id,
+            )
+            existing[pair] = (None, None, entry.tracking_id)
+            to_create.append(registration)
+            applied.append((entry, registration))
+
+        Registration.objects.bulk_create(to_create)
+        for registration in to_create:
+            registration.announce_queued()
+
+    for entry, registration in applied:
+        entry.registration_id = registration.id
+        entry.queue_position = registration.queue_position
+    applied = [entry for entry, _ in applied] + recovered
+
+    # bulk_create skips post_save, so drop the visitors' cached pages here
+    caching.invalidate_visitors({entry.user_email for entry in applied})
+    caching.invalidate_exhibition_registrations({entry.exhibition_id for entry in applied})
+
+    # Record outcomes in the journal only once the registrations are committed
+    for entry in applied:
+        entry.status = 'APPLIED'
+        entry.processed_at = now
+    with transaction.atomic(using=intake_database()):
+        if applied:
+            RegistrationIntake.objects.bulk_update(
+                applied, ['status', 'registration_id', 'queue_position', 'processed_at'],
+            )
+        for reason, group in rejected.items():
+            for entry in group:
+                entry.status = 'REJECTED'
+                entry.error = reason
+                entry.processed_at = now
+            RegistrationIntake.objects.bulk_update(
+                group, ['status', 'error', 'registration_id', 'processed_at']
+            )
+
+    return DrainResult(
+        applied=len(applied),
+        rejected=sum(len(group) for group in rejected.values()),
+    )
+
+
+def drain_all(batch_size=500):
+    """Drain until the journal has no queued entries left"""
+    total = DrainResult()
+    while True:
+        result = drain(batch_size)
+        if not result.processed:
+            return total
+        total.applied += result.applied
+        total.rejected += result.rejected
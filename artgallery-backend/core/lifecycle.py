@@ -0,0 +1,41 @@
+"""
+Date-driven exhibition status.
+
+An exhibition is UPCOMING before ``start_date``, ONGOING from ``start_date``
+through ``end_date`` and COMPLETED afterwards. ``advance_exhibition_statuses``
+applies that rule with one UPDATE per target status. Each UPDATE only
+matches rows whose status is wrong, found through the ``(status, start_date)``
+and ``(status, end_date)`` indexes. When nothing is due, which is almost
+every run, the cost is three index probes. That is cheap enough to run every
+minute:
+
+    * * * * *  python manage.py advance_exhibition_statuses
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import caching
+from .models import Exhibition
+
+
+def transitions(today):
+    """``(target status, filter kwargs)`` for rows that should move to that status on ``today``"""
+    return [
+        ('COMPLETED', {'status__in': ['UPCOMING', 'ONGOING'], 'end_date__lt': today}),
+        ('ONGOING', {'status__in': ['UPCOMING', 'COMPLETED'], 'start_date__lte': today, 'end_date__gte': today}),
+        ('UPCOMING', {'status__in': ['ONGOING', 'COMPLETED'], 'start_date__gt': today}),
+    ]
+
+
+def advance_exhibition_statuses(today=None):
+    """Bring every exhibition's status in line with its dates; returns ``{status: rows moved}``"""
+    today = today or timezone.localdate()
+    now = timezone.now()
+    moved = {}
+    with transaction.atomic():
+        for target, lookups in transitions(today):
+            # update() skips auto_now, and sync clients page on updated_at
+            moved[target] = Exhibition.objects.filter(**lookups).update(status=target, updated_at=now)
+        if any(moved.values()):
+            caching.bump_on_commit(caching.EXHIBITIONS)
+    return moved
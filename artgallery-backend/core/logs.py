@@ -0,0 +1,132 @@
+"""
+Structured, non-blocking logging.
+
+``QueueingHandler`` is the only handler loggers write to. A request thread
+only copies the record onto a bounded in-memory queue. A ``QueueListener``
+thread formats it as one JSON object per line and does the I/O. When the
+queue is full, records are dropped and counted rather than blocking the
+request.
+
+Every record carries the id of the request it was logged for.
+``RequestIdMiddleware`` takes it from ``X-Request-ID`` or generates one.
+``LOG_SAMPLE_RATES`` keeps only a fraction of the DEBUG/INFO records of
+high-volume loggers. The decision is made per request id, so a sampled
+request keeps all its lines. Warnings and errors are never sampled.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import zlib
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message, request id and ``extra`` fields"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items()
+            if key not in STANDARD_ATTRIBUTES and not key.startswith('_')
+        )
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps ``rates[logger]`` of the DEBUG/INFO records of the listed loggers (and their children)"""
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+
+    def _rate(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+        rate = self._rate(record.name)
+        if rate >= 1.0:
+            return True
+        rid = getattr(record, 'request_id', None)
+        point = zlib.crc32(rid.encode()) / 0xFFFFFFFF if rid else random.random()
+        return point < rate
+
+
+class QueueingHandler(QueueHandler):
+    """
+    ``QueueHandler`` with its own listener writing JSON lines to stderr, or
+    to ``filename`` (reopened after rotation). Configured from ``LOGGING``.
+    """
+
+    def __init__(self, filename=None, queue_size=10000, sample_rates=None):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target = WatchedFileHandler(filename) if filename else logging.StreamHandler(sys.stderr)
+        self.target.setFormatter(JSONFormatter())
+        self.addFilter(SamplingFilter(sample_rates))
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def _ensure_listener(self):
+        # Started lazily, and again in a forked worker: threads don't survive fork()
+        if self._listener_pid != os.getpid():
+            with self._start_lock:
+                if self._listener_pid != os.getpid():
+                    self._listener = QueueListener(self.queue, self.target)
+                    self._listener.start()
+                    self._listener_pid = os.getpid()
+
+    def stop(self):
+        """Flush what's queued and stop the listener"""
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+    def filter(self, record):
+        # django.request logs 4xx/5xx responses after the middleware has returned
+        record.request_id = request_id.get() or getattr(getattr(record, 'request', None), 'request_id', None)
+        return super().filter(record)
+
+    def prepare(self, record):
+        # Merge the arguments now (they may change after this returns), but
+        # keep the traceback as its own field rather than in the message
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
@@ -0,0 +1,42 @@
+"""
+Move exhibitions between UPCOMING, ONGOING and COMPLETED from their dates.
+
+    python manage.py advance_exhibition_statuses               # once, e.g. from cron
+    python manage.py advance_exhibition_statuses --every 60    # keep running
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.lifecycle import advance_exhibition_statuses
+
+
+class Command(BaseCommand):
+    help = 'Update exhibition statuses from their start and end dates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, default=None,
+                            help='Repeat every this many seconds instead of running once')
+
+    def handle(self, *args, **options):
+        every = options['every']
+        if every is not None and every <= 0:
+            raise CommandError('--every must be positive')
+
+        if every is None:
+            self._report(advance_exhibition_statuses(), quiet=False)
+            return
+
+        self.stdout.write(f"Advancing exhibition statuses every {every:g}s (Ctrl+C to stop)")
+        try:
+            while True:
+                self._report(advance_exhibition_statuses(), quiet=True)
+                time.sleep(every)
+        except KeyboardInterrupt:
+            pass
+
+    def _report(self, moved, quiet):
+        if any(moved.values()):
+            self.stdout.write(', '.join(f"{count} -> {status}" for status, count in moved.items() if count))
+        elif not quiet:
+            self.stdout.write('All exhibition statuses are current')
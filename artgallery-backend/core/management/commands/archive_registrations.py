@@ -0,0 +1,26 @@
+"""
+Move registrations of long-finished exhibitions into the archive table.
+
+    python manage.py archive_registrations                  # REGISTRATION_ARCHIVE_AFTER_DAYS
+    python manage.py archive_registrations --days 30 --batch-size 500
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive
+
+
+class Command(BaseCommand):
+    help = 'Archive registrations for exhibitions that ended more than N days ago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Days after an exhibition ends before its registrations are archived')
+        parser.add_argument('--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE,
+                            help='Registrations moved per transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or (options['days'] is not None and options['days'] < 0):
+            raise CommandError('--batch-size must be positive and --days not negative')
+
+        moved = archive.archive(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} registration(s)"))
@@ -0,0 +1,74 @@
+"""
+Run a registered data backfill in short, resumable chunks (see core.backfill).
+
+    python manage.py backfill --list
+    python manage.py backfill registration-status --rate 2000
+    python manage.py backfill registration-queue-positions --restart
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import backfill
+from core.models import BackfillCheckpoint
+
+REPORT_INTERVAL = 2.0
+
+
+class Command(BaseCommand):
+    help = 'Run a data backfill in primary-key ordered chunks, resuming from its checkpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help='Backfill to run')
+        parser.add_argument('--list', action='store_true', help='List backfills and their checkpoints')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows per transaction (default: the backfill\'s own)')
+        parser.add_argument('--rate', type=float, default=None,
+                            help='Target rows per second; chunks are spaced out to stay under it')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start over')
+        parser.add_argument('--max-chunks', type=int, default=None, help='Stop after this many chunks')
+
+    def handle(self, *args, **options):
+        if options['list']:
+            checkpoints = {c.name: c for c in BackfillCheckpoint.objects.filter(name__in=backfill.registry)}
+            for name, cls in backfill.registry.items():
+                checkpoint = checkpoints.get(name)
+                state = str(checkpoint) if checkpoint else 'not started'
+                self.stdout.write(f"{name:<32} {cls.description}  [{state}]")
+            return
+
+        cls = backfill.registry.get(options['name'])
+        if cls is None:
+            raise CommandError(f"Unknown backfill {options['name']!r}; see --list")
+        for option in ('chunk_size', 'rate', 'max_chunks'):
+            if options[option] is not None and options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+
+        self._last_report = 0.0
+        state = backfill.run(
+            cls(),
+            chunk_size=options['chunk_size'],
+            rows_per_second=options['rate'],
+            restart=options['restart'],
+            max_chunks=options['max_chunks'],
+            progress=self._report,
+        )
+        checkpoint = state.checkpoint
+        if checkpoint.completed_at:
+            self.stdout.write(self.style.SUCCESS(
+                f"{checkpoint.name} complete: {checkpoint.rows_processed:,} rows, "
+                f"{checkpoint.rows_changed:,} updates"
+            ))
+        else:
+            self.stdout.write(f"{checkpoint.name} stopped at pk {checkpoint.last_pk}; run again to resume")
+
+    def _report(self, state):
+        # At most one progress line every REPORT_INTERVAL seconds
+        if time.monotonic() - self._last_report < REPORT_INTERVAL and state.done < state.total:
+            return
+        self._last_report = time.monotonic()
+        percent = 100 * state.done / state.total if state.total else 100
+        self.stdout.write(
+            f"  {state.done:,}/{state.total:,} rows ({percent:.0f}%), {state.changed:,} updates, "
+            f"{state.rate:,.0f} rows/s, last pk {state.checkpoint.last_pk}"
+        )
@@ -0,0 +1,119 @@
+"""
+Compare the serializer and values() list paths on the four fast-path endpoints.
+
+Each round renders one page both ways, including the queries, and reports
+the median time per page and the query count.
+
+    python manage.py benchmark_list_serialization --page-size 100 --rounds 20
+
+``--seed N`` first adds N throwaway art pieces and registrations (removed
+afterwards) so the numbers mean something on a small database.
+"""
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import expansion, fastpath
+from core.models import Artist, ArtPiece, Exhibition, ExhibitionArtPiece, Registration, Visitor
+from core.serializers import (
+    ArtistSerializer, ArtPieceSerializer, ExhibitionSerializer, RegistrationSerializer
+)
+
+TARGETS = [
+    ('artists', ArtistSerializer, lambda: Artist.objects.order_by('name')),
+    ('artpieces', ArtPieceSerializer, lambda: ArtPiece.objects.order_by('title')),
+    ('exhibitions', ExhibitionSerializer, lambda: Exhibition.objects.order_by('-start_date')),
+    ('registrations', RegistrationSerializer, lambda: Registration.objects.order_by('-timestamp')),
+]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ModelSerializer against the values() fast path for list pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Create this many temporary art pieces and registrations first')
+
+    def handle(self, *args, **options):
+        if options['page_size'] < 1 or options['rounds'] < 1:
+            raise CommandError('--page-size and --rounds must be at least 1')
+
+        seeded = self._seed(options['seed']) if options['seed'] else None
+        try:
+            self.stdout.write(f"{'endpoint':<14} {'rows':>5} {'serializer ms':>14} "
+                              f"{'values ms':>10} {'speedup':>8} {'queries':>8}")
+            for name, serializer_class, queryset in TARGETS:
+                self._compare(name, serializer_class, queryset, options['page_size'], options['rounds'])
+        finally:
+            if seeded:
+                self._unseed(*seeded)
+
+    def _compare(self, name, serializer_class, queryset, page_size, rounds):
+        plan = expansion.plan(serializer_class, queryset().model)
+        reader = fastpath.reader_for(serializer_class)
+
+        def slow():
+            return serializer_class(plan.apply(queryset())[:page_size], many=True).data
+
+        def fast():
+            return reader.render(reader.prepare(queryset())[:page_size])
+
+        slow_ms, slow_queries, rows = _time(slow, rounds)
+        fast_ms, fast_queries, _ = _time(fast, rounds)
+        self.stdout.write(
+            f"{name:<14} {rows:>5} {slow_ms:>14.2f} {fast_ms:>10.2f} "
+            f"{slow_ms / fast_ms if fast_ms else 0:>7.1f}x {slow_queries:>3} / {fast_queries}"
+        )
+
+    def _seed(self, count):
+        tag = uuid.uuid4().hex[:8]
+        today = timezone.now().date()
+        artist = Artist.objects.create(name=f"Benchmark {tag}")
+        exhibition = Exhibition.objects.create(
+            title=f"Benchmark {tag}", start_date=today, end_date=today + timedelta(days=30)
+        )
+        ArtPiece.objects.bulk_create(
+            ArtPiece(title=f"Benchmark {tag} {i}", artist=artist, estimated_value=Decimal(i) / 4)
+            for i in range(count)
+        )
+        pieces = ArtPiece.objects.filter(artist=artist)
+        ExhibitionArtPiece.objects.bulk_create(
+            ExhibitionArtPiece(exhibition=exhibition, art_piece=piece) for piece in pieces[:50]
+        )
+        Visitor.objects.bulk_create(
+            Visitor(name=f"Benchmark {tag} {i}", email=f"bench-{tag}-{i}@example.invalid")
+            for i in range(count)
+        )
+        visitors = Visitor.objects.filter(email__startswith=f"bench-{tag}-")
+        # bulk_create skips Registration.save(), so positions are assigned here
+        Registration.objects.bulk_create(
+            Registration(visitor=visitor, exhibition=exhibition, queue_position=i + 1)
+            for i, visitor in enumerate(visitors)
+        )
+        self.stdout.write(f"Seeded {count} art pieces and registrations ({tag})")
+        return artist, exhibition, tag
+
+    def _unseed(self, artist, exhibition, tag):
+        exhibition.delete()
+        artist.delete()
+        Visitor.objects.filter(email__startswith=f"bench-{tag}-").delete()
+
+
+def _time(render, rounds):
+    """Median milliseconds per call, queries per call and rows rendered"""
+    timings = []
+    for _ in range(rounds):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            data = render()
+            timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), len(queries.captured_queries), len(data)
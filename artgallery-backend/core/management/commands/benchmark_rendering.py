@@ -0,0 +1,79 @@
+"""
+Measure JSON encoding time and response size for large catalog payloads.
+
+Compares DRF's stock ``JSONRenderer`` with ``FastJSONRenderer`` on the
+exhibition list (nested art pieces, Decimal strings) and on the sync payload
+(raw datetimes and Decimals), then shows what gzip and brotli save on the
+wire. Compression is measured on a single copy of the data, since
+repeated rows would compress unrealistically well.
+
+    python manage.py benchmark_rendering --copies 50 --rounds 20
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from core import middleware, renderers, sync
+from core.models import Exhibition
+from core.serializers import ExhibitionSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JSON rendering and response compression'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--copies', type=int, default=50,
+                            help='Repeat the payload rows this many times to simulate a large page')
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['copies'] < 1 or options['rounds'] < 1:
+            raise CommandError('--copies and --rounds must be at least 1')
+
+        exhibitions = ExhibitionSerializer(
+            Exhibition.objects.prefetch_related('art_pieces'), many=True
+        ).data
+        changes = sync.changes_since(None, limit=sync.MAX_LIMIT)
+        payloads = {'exhibitions': list(exhibitions), 'sync': changes}
+        if renderers.orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; both renderers use json'))
+
+        for name, payload in payloads.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            body = JSONRenderer().render(payload)
+            payload = _scale(payload, options['copies'])
+            stock_ms, stock_body = _median_ms(lambda: JSONRenderer().render(payload), options['rounds'])
+            fast_ms, fast_body = _median_ms(lambda: renderers.FastJSONRenderer().render(payload),
+                                            options['rounds'])
+            if fast_body != stock_body:
+                raise CommandError(f"{name}: renderers produced different output")
+            self.stdout.write(f"  encode   stock {stock_ms:8.2f} ms   fast {fast_ms:8.2f} ms   "
+                              f"({stock_ms / fast_ms if fast_ms else 0:.1f}x, {len(stock_body):,} B)")
+
+            self.stdout.write(f"  size     identity {len(body):>10,} B")
+            codings = ['gzip', 'br'] if middleware.brotli is not None else ['gzip']
+            for coding in codings:
+                ms, compressed = _median_ms(lambda: middleware.compress(body, coding), options['rounds'])
+                saved = 100 * (1 - len(compressed) / len(body))
+                self.stdout.write(f"           {coding:<8} {len(compressed):>10,} B   "
+                                  f"-{saved:.1f}%   {ms:.2f} ms")
+            if middleware.brotli is None:
+                self.stdout.write('           br       (brotli is not installed)')
+
+
+def _scale(payload, copies):
+    if isinstance(payload, list):
+        return payload * copies
+    return {key: _scale(value, copies) if isinstance(value, list) else value
+            for key, value in payload.items()}
+
+
+def _median_ms(func, rounds):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
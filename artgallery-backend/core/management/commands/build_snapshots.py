@@ -0,0 +1,51 @@
+"""
+Rebuild the public catalog snapshots whose data changed.
+
+    python manage.py build_snapshots            # once, e.g. after a deploy
+    python manage.py build_snapshots --watch    # keep running; rebuild shortly after catalog changes
+    python manage.py build_snapshots --force    # rebuild everything
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the prebuilt catalog JSON served to anonymous clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watch', action='store_true',
+                            help='Keep running and rebuild once catalog changes settle')
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help='Seconds between checks for catalog changes with --watch')
+        parser.add_argument('--force', action='store_true',
+                            help='Rebuild every snapshot, changed or not')
+
+    def handle(self, *args, **options):
+        if options['poll'] <= 0:
+            raise CommandError('--poll must be positive')
+
+        if options['force']:
+            for name in snapshots.SNAPSHOTS:
+                snapshots.build(name)
+            self._report(list(snapshots.SNAPSHOTS), quiet=False)
+        else:
+            self._report(snapshots.rebuild_stale(), quiet=False)
+        if not options['watch']:
+            return
+
+        self.stdout.write('Watching for catalog changes (Ctrl+C to stop)')
+        try:
+            while True:
+                time.sleep(options['poll'])
+                self._report(snapshots.rebuild_due(), quiet=True)
+        except KeyboardInterrupt:
+            pass
+
+    def _report(self, built, quiet):
+        if built:
+            self.stdout.write(f"Rebuilt {', '.join(built)}")
+        elif not quiet:
+            self.stdout.write('All catalog snapshots are current')
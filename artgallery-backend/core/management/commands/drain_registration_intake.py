@@ -0,0 +1,46 @@
+"""
+Apply buffered registrations from the intake journal.
+
+The journal lives in the ``intake`` database, which needs its own migrate:
+
+    python manage.py migrate --database=intake
+    python manage.py drain_registration_intake            # run forever
+    python manage.py drain_registration_intake --once     # drain and exit
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import intake
+
+
+class Command(BaseCommand):
+    help = 'Apply queued registrations from the buffered intake journal'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Journal entries applied per transaction')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds to sleep when the journal is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain everything queued right now, then exit')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            result = intake.drain_all(options['batch_size'])
+            self._report(result)
+            return
+
+        self.stdout.write('Draining registration intake (Ctrl+C to stop)')
+        try:
+            while True:
+                result = intake.drain(options['batch_size'])
+                if result.processed:
+                    self._report(result)
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+    def _report(self, result):
+        self.stdout.write(f"Applied {result.applied}, rejected {result.rejected}")
@@ -0,0 +1,301 @@
+"""
+Ticket-drop load scenario for registration intake.
+
+Drives ``RegistrationViewSet.create`` and ``ExhibitionRegistrationView.post``
+from many threads against a single exhibition, then checks the queue
+invariants. Every row it creates is tagged with a run id and removed at the
+end unless ``--keep`` is given.
+
+    python manage.py loadtest_registrations --visitors 500 --workers 32
+
+``--intake buffered`` drives the write-behind path instead: requests are
+journaled and answered with 202, then the journal is drained before the
+invariants are checked.
+"""
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import intake
+from core.models import Exhibition, Registration, RegistrationIntake, Visitor
+from core.views import ExhibitionRegistrationView, RegistrationViewSet
+
+User = get_user_model()
+
+ENDPOINTS = ('viewset', 'exhibition', 'mixed')
+
+
+class Command(BaseCommand):
+    help = 'Run a concurrent registration load scenario against one exhibition'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--visitors', type=int, default=200,
+                            help='Number of distinct visitors registering')
+        parser.add_argument('--workers', type=int, default=16,
+                            help='Number of concurrent client threads')
+        parser.add_argument('--endpoint', choices=ENDPOINTS, default='mixed',
+                            help='Which registration entry point to drive')
+        parser.add_argument('--retries', type=float, default=0.1,
+                            help='Fraction of visitors that submit a second, duplicate request')
+        parser.add_argument('--intake', choices=('direct', 'buffered'), default='direct',
+                            help='Registration intake mode to exercise')
+        parser.add_argument('--keep', action='store_true',
+                            help='Keep the generated exhibition, users and registrations')
+
+    def handle(self, *args, **options):
+        if options['visitors'] < 1 or options['workers'] < 1:
+            raise CommandError('--visitors and --workers must be at least 1')
+
+        run_id = uuid.uuid4().hex[:8]
+        exhibition, users = self._setup(run_id, options['visitors'])
+        self.stdout.write(
+            f"Run {run_id}: {len(users)} visitors, {options['workers']} workers, "
+            f"endpoint={options['endpoint']}, intake={options['intake']}, exhibition={exhibition.id}"
+        )
+
+        previous_mode = getattr(settings, 'REGISTRATION_INTAKE_MODE', 'direct')
+        settings.REGISTRATION_INTAKE_MODE = options['intake']
+        try:
+            jobs = self._build_jobs(users, options['endpoint'], options['retries'])
+            results, elapsed = self._drive(exhibition, jobs, options['workers'])
+            if options['intake'] == 'buffered':
+                results = self._drain(results, users)
+            self._report(results, elapsed)
+            violations = self._check_invariants(exhibition, results)
+        finally:
+            settings.REGISTRATION_INTAKE_MODE = previous_mode
+            if not options['keep']:
+                self._teardown(exhibition, users)
+
+        if violations:
+            for violation in violations:
+                self.stderr.write(self.style.ERROR(f"  - {violation}"))
+            raise CommandError(f"{len(violations)} invariant violation(s)")
+        self.stdout.write(self.style.SUCCESS('All invariants hold'))
+
+    # ---------------------------
+    # Scenario setup
+    # ---------------------------
+
+    def _setup(self, run_id, visitor_count):
+        today = timezone.now().date()
+        exhibition = Exhibition.objects.create(
+            title=f"Load test {run_id}",
+            start_date=today + timedelta(days=7),
+            end_date=today + timedelta(days=37),
+            status='UPCOMING',
+        )
+        users = []
+        for i in range(visitor_count):
+            user = User(
+                username=f"loadtest-{run_id}-{i}",
+                email=f"loadtest-{run_id}-{i}@example.invalid",
+                first_name='Load',
+                last_name=f"Visitor {i}",
+                role='visitor',
+            )
+            user.set_unusable_password()
+            users.append(user)
+        User.objects.bulk_create(users)
+        users = list(User.objects.filter(username__startswith=f"loadtest-{run_id}-"))
+        return exhibition, users
+
+    def _build_jobs(self, users, endpoint, retry_fraction):
+        jobs = []
+        for i, user in enumerate(users):
+            if endpoint == 'mixed':
+                target = ENDPOINTS[i % 2]
+            else:
+                target = endpoint
+            jobs.append((user, target))
+
+        # Duplicate submissions model clients retrying on a flaky connection
+        retry_every = int(1 / retry_fraction) if retry_fraction > 0 else 0
+        if retry_every:
+            jobs.extend(jobs[::retry_every])
+        return jobs
+
+    def _teardown(self, exhibition, users):
+        emails = [user.email for user in users]
+        exhibition.delete()
+        Visitor.objects.filter(email__in=emails).delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        RegistrationIntake.objects.filter(user_email__in=emails).delete()
+
+    # ---------------------------
+    # Load generation
+    # ---------------------------
+
+    def _drive(self, exhibition, jobs, workers):
+        factory = APIRequestFactory()
+        viewset_create = RegistrationViewSet.as_view({'post': 'create'})
+        exhibition_register = ExhibitionRegistrationView.as_view()
+        start_gate = threading.Barrier(min(workers, len(jobs)))
+
+        def submit(job):
+            user, target = job
+            if target == 'viewset':
+                request = factory.post(
+                    '/api/registrations/',
+                    {'exhibition': exhibition.id, 'attendees_count': 1},
+                    format='json',
+                )
+                force_authenticate(request, user=user)
+                call = lambda: viewset_create(request)
+            else:
+                request = factory.post(
+                    f"/api/exhibitions/{exhibition.id}/register/",
+                    {'attendees_count': 1},
+                    format='json',
+                )
+                force_authenticate(request, user=user)
+                call = lambda: exhibition_register(request, exhibition_id=exhibition.id)
+
+            started = time.perf_counter()
+            try:
+                response = call()
+                outcome = _classify_response(response)
+            except OperationalError as e:
+                outcome = 'lock_error' if 'locked' in str(e).lower() else 'error'
+            except Exception:
+                outcome = 'error'
+            latency = time.perf_counter() - started
+            return user.email, target, outcome, latency
+
+        def worker(chunk):
+            # Line every thread up so the first requests really do collide
+            try:
+                start_gate.wait(timeout=30)
+            except threading.BrokenBarrierError:
+                pass
+            try:
+                return [submit(job) for job in chunk]
+            finally:
+                connections.close_all()
+
+        chunks = [jobs[i::workers] for i in range(workers)]
+        chunks = [chunk for chunk in chunks if chunk]
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            results = [result for chunk in pool.map(worker, chunks) for result in chunk]
+        elapsed = time.perf_counter() - started
+        return results, elapsed
+
+    def _drain(self, results, users):
+        """Apply the journal, then resolve each 202 into its final outcome"""
+        started = time.perf_counter()
+        drained = intake.drain_all()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"Drained:     {drained.applied} applied, {drained.rejected} rejected "
+                          f"in {elapsed:.2f}s")
+
+        applied = Counter(
+            RegistrationIntake.objects.filter(
+                user_email__in=[user.email for user in users], status='APPLIED'
+            ).values_list('user_email', flat=True)
+        )
+        resolved = []
+        for email, target, outcome, latency in results:
+            if outcome == 'queued':
+                outcome = 'created' if applied[email] else 'duplicate'
+                applied[email] = 0
+            resolved.append((email, target, outcome, latency))
+        return resolved
+
+    # ---------------------------
+    # Reporting
+    # ---------------------------
+
+    def _report(self, results, elapsed):
+        outcomes = Counter(outcome for _, _, outcome, _ in results)
+        latencies = sorted(latency for _, _, _, latency in results)
+
+        self.stdout.write(f"Requests:    {len(results)} in {elapsed:.2f}s "
+                          f"({len(results) / elapsed:.1f} req/s)")
+        self.stdout.write(f"Created:     {outcomes['created']}")
+        self.stdout.write(f"Duplicates:  {outcomes['duplicate']}")
+        self.stdout.write(f"Lock errors: {outcomes['lock_error']}")
+        self.stdout.write(f"Other errors: {outcomes['error']}")
+        self.stdout.write(
+            "Latency ms:  "
+            f"p50={_percentile(latencies, 50) * 1000:.1f} "
+            f"p95={_percentile(latencies, 95) * 1000:.1f} "
+            f"p99={_percentile(latencies, 99) * 1000:.1f} "
+            f"max={latencies[-1] * 1000:.1f} "
+            f"mean={statistics.mean(latencies) * 1000:.1f}"
+        )
+
+    def _check_invariants(self, exhibition, results):
+        violations = []
+        registrations = Registration.objects.filter(exhibition=exhibition)
+
+        duplicates = (
+            registrations.values('visitor')
+            .annotate(rows=Count('id'))
+            .filter(rows__gt=1)
+        )
+        for row in duplicates:
+            violations.append(f"visitor {row['visitor']} has {row['rows']} registrations")
+
+        positions = sorted(
+            registrations.filter(status='PENDING').values_list('queue_position', flat=True),
+            key=lambda p: (p is None, p),
+        )
+        if positions != list(range(1, len(positions) + 1)):
+            violations.append(
+                f"pending queue positions are not contiguous 1..{len(positions)}: "
+                f"{_summarize_positions(positions)}"
+            )
+
+        created_emails = {email for email, _, outcome, _ in results if outcome == 'created'}
+        created_count = sum(1 for _, _, outcome, _ in results if outcome == 'created')
+        if created_count != len(created_emails):
+            violations.append(f"{created_count} successful creates for {len(created_emails)} visitors")
+
+        stored_emails = set(registrations.values_list('visitor__email', flat=True))
+        if stored_emails != created_emails:
+            violations.append(
+                f"{len(stored_emails)} registrations stored but {len(created_emails)} "
+                f"creates reported success"
+            )
+        return violations
+
+
+def _classify_response(response):
+    if response.status_code == 201:
+        return 'created'
+    if response.status_code == 202:
+        return 'queued'
+    if response.status_code == 400:
+        return 'duplicate'
+    body = getattr(response, 'data', None) or {}
+    message = f"{body.get('error', '')} {body.get('type', '')}".lower()
+    if 'locked' in message or 'operationalerror' in message:
+        return 'lock_error'
+    return 'error'
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def _summarize_positions(positions):
+    if len(positions) <= 20:
+        return positions
+    return f"{positions[:10]} ... {positions[-10:]}"
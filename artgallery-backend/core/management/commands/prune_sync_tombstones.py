@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Delete catalog tombstones older than SYNC_TOMBSTONE_RETENTION'
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstone(s)"))
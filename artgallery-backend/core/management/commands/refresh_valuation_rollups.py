@@ -0,0 +1,42 @@
+"""
+Refresh the collection valuation rollups.
+
+    python manage.py refresh_valuation_rollups              # pending groups, once
+    python manage.py refresh_valuation_rollups --every 30   # pending groups, every 30 seconds
+    python manage.py refresh_valuation_rollups --full       # rebuild everything
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import valuation
+
+
+class Command(BaseCommand):
+    help = 'Refresh collection valuation rollups (pending changes only unless --full)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Rebuild every rollup from scratch')
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help='Keep running, refreshing pending groups every SECONDS')
+
+    def handle(self, *args, **options):
+        if options['full']:
+            written = valuation.refresh_all()
+            summary = ', '.join(f"{dimension}: {count}" for dimension, count in written.items())
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups ({summary})"))
+            return
+
+        if options['every'] is None:
+            refreshed = valuation.refresh_dirty()
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {refreshed} pending group(s)"))
+            return
+
+        try:
+            while True:
+                refreshed = valuation.refresh_dirty()
+                if refreshed:
+                    self.stdout.write(f"Refreshed {refreshed} pending group(s)")
+                time.sleep(options['every'])
+        except KeyboardInterrupt:
+            pass
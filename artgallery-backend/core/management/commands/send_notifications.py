@@ -0,0 +1,40 @@
+"""
+Deliver queued registration decision emails from the notification outbox.
+
+    python manage.py send_notifications            # run forever
+    python manage.py send_notifications --once     # one pass over due rows
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import notifications
+
+
+class Command(BaseCommand):
+    help = 'Send pending registration notifications in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Notifications claimed and sent per connection')
+        parser.add_argument('--max-attempts', type=int, default=None,
+                            help='Give up on a notification after this many failed sends')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when nothing is due')
+        parser.add_argument('--once', action='store_true',
+                            help='Send everything currently due, then exit')
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                result = notifications.deliver_batch(options['batch_size'], options['max_attempts'])
+                if result.processed:
+                    self.stdout.write(
+                        f"Sent {result.sent}, retrying {result.retrying}, failed {result.failed}"
+                    )
+                    continue
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
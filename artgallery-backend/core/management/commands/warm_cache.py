@@ -0,0 +1,42 @@
+"""
+Fill the response cache after a deploy, so the first visitors don't all miss.
+
+    python manage.py warm_cache                      # upcoming/ongoing exhibitions and their artists
+    python manage.py warm_cache --all --host gallery.example.org
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core import responsecache
+from core.models import Artist, Exhibition
+
+
+class Command(BaseCommand):
+    help = 'Warm the cached exhibition and artist detail responses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Warm every exhibition and artist, not only current ones')
+        parser.add_argument('--host', default=None,
+                            help='Host the responses are built for (links embed it); defaults to ALLOWED_HOSTS[0]')
+
+    def handle(self, *args, **options):
+        host = options['host'] or next((h for h in settings.ALLOWED_HOSTS if h != '*'), None)
+        if not host:
+            raise CommandError('Pass --host: ALLOWED_HOSTS names no concrete host')
+
+        exhibitions = Exhibition.objects.all()
+        artists = Artist.objects.all()
+        if not options['all']:
+            exhibitions = exhibitions.filter(status__in=['UPCOMING', 'ONGOING'])
+            artists = artists.filter(artpiece__exhibitionartpiece__exhibition__in=exhibitions).distinct()
+
+        paths = [reverse('exhibition_detail', args=[pk]) for pk in exhibitions.values_list('pk', flat=True)]
+        paths += [reverse('artist_detail', args=[pk]) for pk in artists.values_list('pk', flat=True)]
+        results = responsecache.warm(paths, host)
+
+        failed = {path: code for path, code in results.items() if code != 200}
+        for path, code in failed.items():
+            self.stderr.write(f"{path}: HTTP {code}")
+        self.stdout.write(self.style.SUCCESS(f"Warmed {len(results) - len(failed)} of {len(results)} response(s)"))
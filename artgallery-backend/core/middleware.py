@@ -0,0 +1,159 @@
+"""
+Request middleware.
+
+``RequestIdMiddleware`` tags each request, its log records (see
+``core.logs``) and its response with a request id.
+
+``ProfilingMiddleware`` runs the requests an admin opts in to profiling under
+a profiler (see ``core.profiling``).
+
+``CompressionMiddleware`` negotiates response compression from
+``Accept-Encoding``. Brotli is preferred when the ``brotli`` package is
+installed and the client accepts it, then gzip. Responses below
+``RESPONSE_COMPRESSION_MIN_BYTES``, already encoded, streaming (the SSE
+channel lives outside Django anyway) or of a type that doesn't compress well
+are passed through untouched. So are responses under
+``RESPONSE_COMPRESSION_EXCLUDE_PATHS``: those carry tokens, and compressing
+secrets next to attacker-influenced content would open them to BREACH.
+"""
+import gzip
+import re
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+
+from . import logs, profiling
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+# Ids accepted from X-Request-ID (e.g. set by a proxy); anything else is replaced
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+# Endpoints whose responses carry credentials (JWTs, stream tickets)
+DEFAULT_EXCLUDE_PATHS = ('/api/auth/', '/api/token/', '/api/register/', '/api/registrations/stream/ticket/')
+
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+    'text/',
+)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def accepted_encodings(header):
+    """``{coding: q}`` from an Accept-Encoding header; ``*`` stands for anything unlisted"""
+    accepted = {}
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """Best supported coding the client accepts, or None"""
+    accepted = accepted_encodings(header or '')
+    available = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(content, coding):
+    if coding == 'br':
+        return brotli.compress(content, quality=_setting('RESPONSE_COMPRESSION_BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=_setting('RESPONSE_COMPRESSION_GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if request.path.startswith(tuple(_setting('RESPONSE_COMPRESSION_EXCLUDE_PATHS', DEFAULT_EXCLUDE_PATHS))):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        # The body varies with Accept-Encoding from here on, even when sent as is
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < _setting('RESPONSE_COMPRESSION_MIN_BYTES', 1024):
+            return response
+
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'))
+        if coding is None:
+            return response
+        compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        response.headers['Content-Encoding'] = coding
+        # A strong ETag no longer matches the bytes on the wire
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+
+class RequestIdMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rid = request.headers.get('X-Request-ID', '')
+        if not REQUEST_ID_PATTERN.fullmatch(rid):
+            rid = uuid.uuid4().hex
+        request.request_id = rid
+        token = logs.request_id.set(rid)
+        try:
+            response = self.get_response(request)
+        finally:
+            logs.request_id.reset(token)
+        response.headers['X-Request-ID'] = rid
+        return response
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not _setting('PROFILING_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = profiling.requested_options(request)
+        if options is None:
+            return self.get_response(request)
+        user = profiling.authenticated_admin(request)
+        if user is None:
+            return self.get_response(request)
+        return profiling.run(request, self.get_response, options, user)
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:44
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationIntake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tracking_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('user_id', models.BigIntegerField()),
+                ('user_email', models.EmailField(max_length=254)),
+                ('visitor_name', models.CharField(max_length=255)),
+                ('visitor_phone', models.CharField(blank=True, max_length=30, null=True)),
+                ('exhibition_id', models.BigIntegerField()),
+                ('attendees_count', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('QUEUED', 'Queued'), ('APPLIED', 'Applied'), ('REJECTED', 'Rejected')], default='QUEUED', max_length=20)),
+                ('registration_id', models.BigIntegerField(blank=True, null=True)),
+                ('queue_position', models.PositiveIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('submitted_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='intake_status_id_idx')],
+            },
+        ),
+    ]
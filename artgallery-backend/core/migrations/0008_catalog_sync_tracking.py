@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(choices=[('artist', 'Artist'), ('artpiece', 'Art piece'), ('exhibition', 'Exhibition'), ('exhibitionartpiece', 'Exhibition art piece')], max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['deleted_at', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='artist',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='artpiece',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='exhibition',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='exhibitionartpiece',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='artist',
+            index=models.Index(fields=['updated_at', 'id'], name='artist_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='artpiece',
+            index=models.Index(fields=['updated_at', 'id'], name='artpiece_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exhibition',
+            index=models.Index(fields=['updated_at', 'id'], name='exhibition_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exhibitionartpiece',
+            index=models.Index(fields=['updated_at', 'id'], name='exhibitionart_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='catalogtombstone',
+            index=models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ),
+    ]
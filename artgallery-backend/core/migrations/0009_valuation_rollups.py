@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_catalog_sync_tracking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ValuationDirtyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('artist', 'Artist'), ('nationality', 'Nationality'), ('status', 'Status'), ('exhibition', 'Exhibition')], max_length=20)),
+                ('key', models.CharField(max_length=255)),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['id'],
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ValuationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('artist', 'Artist'), ('nationality', 'Nationality'), ('status', 'Status'), ('exhibition', 'Exhibition')], max_length=20)),
+                ('key', models.CharField(max_length=255)),
+                ('label', models.CharField(blank=True, max_length=255)),
+                ('piece_count', models.PositiveIntegerField(default=0)),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('min_value', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('max_value', models.DecimalField(decimal_places=2, max_digits=12, null=True)),
+                ('refreshed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['dimension', '-total_value', 'key'],
+                'unique_together': {('dimension', 'key')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_valuation_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exhibition',
+            index=models.Index(fields=['status', 'start_date'], name='exhibition_status_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exhibition',
+            index=models.Index(fields=['status', 'end_date'], name='exhibition_status_end_idx'),
+        ),
+    ]
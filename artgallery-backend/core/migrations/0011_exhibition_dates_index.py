@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_exhibition_status_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exhibition',
+            index=models.Index(fields=['start_date', 'end_date'], name='exhibition_dates_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_exhibition_dates_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='artpiece',
+            index=models.Index(fields=['status', 'artist'], name='artpiece_status_artist_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exhibitionartpiece',
+            index=models.Index(fields=['art_piece', 'exhibition'], name='booking_piece_exhibition_idx'),
+        ),
+    ]
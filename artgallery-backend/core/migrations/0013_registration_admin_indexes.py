@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_availability_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['exhibition', 'status', 'queue_position'], name='registration_queue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registration',
+            index=models.Index(fields=['status', 'submitted_at'], name='registration_status_sub_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_registration_admin_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedRegistration',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('attendees_count', models.PositiveIntegerField(default=1)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending Approval'), ('APPROVED', 'Approved by Clerk'), ('REJECTED', 'Rejected'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('confirmed', models.BooleanField(default=False)),
+                ('queue_position', models.PositiveIntegerField(blank=True, null=True)),
+                ('submitted_at', models.DateTimeField(null=True)),
+                ('timestamp', models.DateTimeField()),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('rejection_reason', models.TextField(blank=True)),
+                ('visitor_notified', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('exhibition', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_registrations', to='core.exhibition')),
+                ('reviewed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviewed_archived_registrations', to=settings.AUTH_USER_MODEL)),
+                ('visitor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_registrations', to='core.visitor')),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_backfill_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='artpiece',
+            name='image',
+            field=models.CharField(blank=True, default='', max_length=80),
+        ),
+    ]
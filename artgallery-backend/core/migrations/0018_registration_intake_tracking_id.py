@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_idempotencykey_claimed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedregistration',
+            name='intake_tracking_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='registration',
+            name='intake_tracking_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
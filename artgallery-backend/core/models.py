@@ -1,23 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+import uuid
+
+from .signals import registration_queue_changed, registration_queued
 
 User = get_user_model()
 
+class LoadedValuesMixin:
+    """
+    Remembers the values a row was loaded with, so valuation rollups can also
+    refresh the groups a change moves it out of (see ``core.valuation``)
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+
 class Artist(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(blank=True, null=True)
     phone = models.CharField(max_length=30, blank=True, null=True)
     nationality = models.CharField(max_length=100, blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
  
     def __str__(self):
         return self.name
         
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='artist_updated_idx'),
+        ]
 
-class ArtPiece(models.Model):
+class ArtPiece(LoadedValuesMixin, models.Model):
     STATUS_CHOICES = [
         ('AVAILABLE', 'Available'),
         ('DISPLAYED', 'Displayed'),
@@ -28,12 +48,20 @@ class ArtPiece(models.Model):
     artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
     estimated_value = models.DecimalField(max_digits=12, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='AVAILABLE')
+    # Content-addressed file name ("<sha256>.<ext>"); see core.images
+    image = models.CharField(max_length=80, blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
         
     def __str__(self):
         return self.title
         
     class Meta:
         ordering = ['title', 'artist__name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='artpiece_updated_idx'),
+            # Availability search (ArtPieceViewSet.available)
+            models.Index(fields=['status', 'artist'], name='artpiece_status_artist_idx'),
+        ]
 
 class Exhibition(models.Model):
     STATUS_CHOICES = [
@@ -46,21 +74,58 @@ class Exhibition(models.Model):
     end_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='UPCOMING')
     art_pieces = models.ManyToManyField(ArtPiece, through='ExhibitionArtPiece')
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return self.title
         
     class Meta:
         ordering = ['-start_date', 'title']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='exhibition_updated_idx'),
+            # Date-driven status transitions (core.lifecycle)
+            models.Index(fields=['status', 'start_date'], name='exhibition_status_start_idx'),
+            models.Index(fields=['status', 'end_date'], name='exhibition_status_end_idx'),
+            # Overlap checks for art piece bookings (core.conflicts)
+            models.Index(fields=['start_date', 'end_date'], name='exhibition_dates_idx'),
+        ]
 
-class ExhibitionArtPiece(models.Model):
+class ExhibitionArtPiece(LoadedValuesMixin, models.Model):
     exhibition = models.ForeignKey(Exhibition, on_delete=models.CASCADE)
     art_piece = models.ForeignKey(ArtPiece, on_delete=models.CASCADE)
     confirmed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('exhibition', 'art_piece')
         ordering = ['exhibition', 'art_piece']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='exhibitionart_updated_idx'),
+            # Per-piece booking probes without touching the table (availability, conflicts)
+            models.Index(fields=['art_piece', 'exhibition'], name='booking_piece_exhibition_idx'),
+        ]
+
+class CatalogTombstone(models.Model):
+    """Record of a deleted catalog row, so delta sync can report the deletion"""
+    MODEL_CHOICES = [
+        ('artist', 'Artist'),
+        ('artpiece', 'Art piece'),
+        ('exhibition', 'Exhibition'),
+        ('exhibitionartpiece', 'Exhibition art piece'),
+    ]
+    
+    model = models.CharField(max_length=30, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.model} #{self.object_id} deleted {self.deleted_at}"
 
 class Visitor(models.Model):
     name = models.CharField(max_length=255)
@@ -116,9 +181,18 @@ class Registration(models.Model):
     # Notification flags
     visitor_notified = models.BooleanField(default=False)
     
+    # The buffered intake entry this was applied from, so a replayed drain recognises it
+    intake_tracking_id = models.UUIDField(null=True, blank=True, editable=False)
+    
     class Meta:
         unique_together = ['visitor', 'exhibition']
         ordering = ['queue_position', 'submitted_at']
+        indexes = [
+            # Queue shifts and position lookups within an exhibition
+            models.Index(fields=['exhibition', 'status', 'queue_position'], name='registration_queue_idx'),
+            # Admin status filter and date hierarchy
+            models.Index(fields=['status', 'submitted_at'], name='registration_status_sub_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         # Sync old confirmed field with new status field
@@ -127,16 +201,22 @@ class Registration(models.Model):
         else:
             self.confirmed = False
             
-        # Auto-assign queue position for new registrations
+        # Auto-assign queue position for new registrations. The lookup and the
+        # insert share one transaction so concurrent submissions can't both
+        # read the same tail position.
         if not self.pk and self.status == 'PENDING':
-            last_position = Registration.objects.filter(
-                exhibition=self.exhibition,
-                status='PENDING'
-            ).aggregate(
-                max_position=models.Max('queue_position')
-            )['max_position']
-            
-            self.queue_position = (last_position or 0) + 1
+            with transaction.atomic():
+                last_position = Registration.objects.filter(
+                    exhibition=self.exhibition,
+                    status='PENDING'
+                ).aggregate(
+                    max_position=models.Max('queue_position')
+                )['max_position']
+                
+                self.queue_position = (last_position or 0) + 1
+                super().save(*args, **kwargs)
+                self.announce_queued()
+            return
             
         super().save(*args, **kwargs)
     
@@ -147,8 +227,10 @@ class Registration(models.Model):
         self.reviewed_by = clerk_user
         self.reviewed_at = timezone.now()
         self.visitor_notified = False  # Reset to send approval notification
-        self.save()
-        self._adjust_queue_positions()
+        with transaction.atomic():
+            self.save()
+            self._adjust_queue_positions()
+            self._queue_notification('APPROVED')
     
     def reject(self, clerk_user, reason=""):
         """Reject the registration"""
@@ -158,18 +240,22 @@ class Registration(models.Model):
         self.reviewed_at = timezone.now()
         self.rejection_reason = reason
         self.visitor_notified = False  # Reset to send rejection notification
-        self.save()
-        self._adjust_queue_positions()
+        with transaction.atomic():
+            self.save()
+            self._adjust_queue_positions()
+            self._queue_notification('REJECTED')
     
     def cancel(self):
         """Cancel the registration"""
         self.status = 'CANCELLED'
         self.confirmed = False
-        self.save()
-        self._adjust_queue_positions()
+        with transaction.atomic():
+            self.save()
+            self._adjust_queue_positions()
     
     def _adjust_queue_positions(self):
         """Adjust queue positions after approval/rejection"""
+        vacated_position = self.queue_position
         if self.queue_position:
             # Move all pending registrations up in the queue
             Registration.objects.filter(
@@ -180,6 +266,36 @@ class Registration(models.Model):
             
             self.queue_position = None
             self.save(update_fields=['queue_position'])
+        
+        # Tell listeners (e.g. the queue push stream) once the change is committed
+        transaction.on_commit(lambda: registration_queue_changed.send(
+            sender=Registration,
+            registration_id=self.pk,
+            visitor_id=self.visitor_id,
+            exhibition_id=self.exhibition_id,
+            status=self.status,
+            vacated_position=vacated_position,
+        ))
+    
+    def announce_queued(self):
+        """Send ``registration_queued`` for this new pending registration once it commits"""
+        transaction.on_commit(lambda: registration_queued.send(
+            sender=Registration,
+            registration_id=self.pk,
+            visitor_id=self.visitor_id,
+            visitor_email=self.visitor.email,
+            exhibition_id=self.exhibition_id,
+            exhibition_title=self.exhibition.title,
+            queue_position=self.queue_position,
+        ))
+    
+    def _queue_notification(self, kind):
+        """Add the decision to the outbox; `send_notifications` delivers it"""
+        NotificationOutbox.objects.create(
+            registration=self,
+            kind=kind,
+            recipient=self.visitor.email,
+        )
     
     @property
     def is_approved(self):
@@ -198,6 +314,77 @@ class Registration(models.Model):
     def __str__(self):
         return f"{self.visitor.name} - {self.exhibition.title} ({self.status})"
 
+class NotificationOutbox(models.Model):
+    """Pending visitor notification for a registration decision"""
+    KIND_CHOICES = [
+        ('APPROVED', 'Registration approved'),
+        ('REJECTED', 'Registration rejected'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    registration = models.ForeignKey(Registration, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    
+    # Delivery bookkeeping
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.UUIDField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+            models.Index(fields=['claim_token'], name='outbox_claim_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} notification to {self.recipient} ({self.status})"
+
+class ArchivedRegistration(models.Model):
+    """
+    A registration for an exhibition that closed long ago, moved out of the
+    live ``Registration`` table by ``archive_registrations``. It keeps the
+    original id and field names, so the same serializers and lookups apply.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    visitor = models.ForeignKey('Visitor', on_delete=models.CASCADE, related_name='archived_registrations')
+    exhibition = models.ForeignKey('Exhibition', on_delete=models.CASCADE, related_name='archived_registrations')
+    attendees_count = models.PositiveIntegerField(default=1)
+    status = models.CharField(max_length=20, choices=Registration.REGISTRATION_STATUS_CHOICES)
+    confirmed = models.BooleanField(default=False)
+    queue_position = models.PositiveIntegerField(null=True, blank=True)
+    submitted_at = models.DateTimeField(null=True)
+    timestamp = models.DateTimeField()
+    reviewed_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='reviewed_archived_registrations'
+    )
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+    rejection_reason = models.TextField(blank=True)
+    visitor_notified = models.BooleanField(default=False)
+    intake_tracking_id = models.UUIDField(null=True, blank=True, editable=False)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-timestamp']
+    
+    def __str__(self):
+        return f"Archived registration {self.pk} ({self.status})"
+
 class Clerk(models.Model):
     name = models.CharField(max_length=255)
     email = models.EmailField(blank=True, null=True)
@@ -216,4 +403,120 @@ class SetupStatus(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        ordering = ['-timestamp']
\ No newline at end of file
+        ordering = ['-timestamp']
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a request sent with an ``Idempotency-Key`` header"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    request_path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    
+    # Null while the original request is still being processed
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # When the request processing it took the key; identifies the current holder
+    claimed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ['user', 'key']
+    
+    @property
+    def is_complete(self):
+        return self.response_status is not None
+    
+    def __str__(self):
+        return f"{self.key} ({self.request_path})"
+
+class RegistrationIntake(models.Model):
+    """
+    Journal entry for a registration accepted in buffered intake mode.
+    
+    Lives in the separate ``intake`` database (see ``core.routers``) so that
+    accepting a request never waits on the main database's write lock. The
+    drainer applies entries to ``Registration`` in id (submission) order.
+    """
+    STATUS_CHOICES = [
+        ('QUEUED', 'Queued'),
+        ('APPLIED', 'Applied'),
+        ('REJECTED', 'Rejected'),
+    ]
+    
+    tracking_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    
+    # Plain ids rather than foreign keys: the referenced rows live in another database
+    user_id = models.BigIntegerField()
+    user_email = models.EmailField()
+    visitor_name = models.CharField(max_length=255)
+    visitor_phone = models.CharField(max_length=30, blank=True, null=True)
+    exhibition_id = models.BigIntegerField()
+    attendees_count = models.PositiveIntegerField(default=1)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='QUEUED')
+    registration_id = models.BigIntegerField(null=True, blank=True)
+    queue_position = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    submitted_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id'], name='intake_status_id_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tracking_id} ({self.status})"
+
+class ValuationRollup(models.Model):
+    """Precomputed collection value for one group (an artist, a nationality, ...)"""
+    DIMENSION_CHOICES = [
+        ('artist', 'Artist'),
+        ('nationality', 'Nationality'),
+        ('status', 'Status'),
+        ('exhibition', 'Exhibition'),
+    ]
+    
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key = models.CharField(max_length=255)
+    label = models.CharField(max_length=255, blank=True)
+    piece_count = models.PositiveIntegerField(default=0)
+    total_value = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    min_value = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    max_value = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    refreshed_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('dimension', 'key')
+        ordering = ['dimension', '-total_value', 'key']
+    
+    def __str__(self):
+        return f"{self.dimension} {self.label or self.key}: {self.total_value}"
+
+class ValuationDirtyKey(models.Model):
+    """A rollup group changed in a committed transaction and awaits a refresh"""
+    dimension = models.CharField(max_length=20, choices=ValuationRollup.DIMENSION_CHOICES)
+    key = models.CharField(max_length=255)  # '*' refreshes the whole dimension
+    marked_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        unique_together = ('dimension', 'key')
+        ordering = ['id']
+
+class BackfillCheckpoint(models.Model):
+    """Progress of a resumable backfill (see ``core.backfill``)"""
+    name = models.CharField(max_length=100, unique=True)
+    last_pk = models.BigIntegerField(null=True, blank=True)
+    rows_processed = models.BigIntegerField(default=0)
+    rows_changed = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        state = 'done' if self.completed_at else f"at pk {self.last_pk}"
+        return f"{self.name} ({state})"
@@ -0,0 +1,181 @@
+"""
+Delivery side of the registration notification outbox.
+
+``Registration.approve``/``reject`` add a ``NotificationOutbox`` row in the
+same transaction as the decision. ``deliver_batch`` claims due rows, renders
+them and sends the whole batch over a single email connection, then records
+the outcome with set-based updates. Failed sends are retried with
+exponential backoff until ``max_attempts`` is reached.
+
+Outcomes are only recorded on rows that still carry the batch's claim token.
+A worker that outlived its lease can't overwrite a newer claim on the same
+row.
+"""
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import caching
+from .models import NotificationOutbox, Registration
+
+TEMPLATES = {
+    'APPROVED': (
+        'Your registration for {exhibition} is confirmed',
+        'Hello {visitor},\n\n'
+        'Your registration for "{exhibition}" ({start_date} to {end_date}) '
+        'for {attendees} attendee(s) has been approved.\n\n'
+        'We look forward to seeing you at the gallery.\n',
+    ),
+    'REJECTED': (
+        'Your registration for {exhibition} was not approved',
+        'Hello {visitor},\n\n'
+        'Unfortunately your registration for "{exhibition}" could not be approved.\n'
+        '{reason}\n',
+    ),
+}
+
+
+@dataclass
+class DeliveryResult:
+    sent: int = 0
+    retrying: int = 0
+    failed: int = 0
+
+    @property
+    def processed(self):
+        return self.sent + self.retrying + self.failed
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def backoff(attempts):
+    """Delay before the next try after ``attempts`` failed sends"""
+    base = _setting('NOTIFICATION_RETRY_BASE_SECONDS', 30)
+    cap = _setting('NOTIFICATION_RETRY_MAX_SECONDS', 3600)
+    return timedelta(seconds=min(cap, base * 2 ** (attempts - 1)))
+
+
+def claim_batch(batch_size=100, lease=timedelta(minutes=5)):
+    """
+    Mark up to ``batch_size`` due notifications as ours and return them.
+
+    Rows stuck in SENDING longer than ``lease`` (a crashed worker) are due
+    again. The select and the claim share one write transaction, so two
+    workers never claim the same row.
+    """
+    now = timezone.now()
+    token = uuid.uuid4()
+    due = (
+        Q(status='PENDING', next_attempt_at__lte=now)
+        | Q(status='SENDING', claimed_at__lt=now - lease)
+    )
+    with transaction.atomic():
+        ids = list(
+            NotificationOutbox.objects.filter(due)
+            .order_by('next_attempt_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        NotificationOutbox.objects.filter(id__in=ids).update(
+            status='SENDING', claim_token=token, claimed_at=now
+        )
+    return list(
+        NotificationOutbox.objects.filter(claim_token=token)
+        .select_related('registration__visitor', 'registration__exhibition')
+    )
+
+
+def render(notification):
+    registration = notification.registration
+    exhibition = registration.exhibition
+    subject, body = TEMPLATES[notification.kind]
+    reason = registration.rejection_reason
+    context = {
+        'visitor': registration.visitor.name,
+        'exhibition': exhibition.title,
+        'start_date': exhibition.start_date,
+        'end_date': exhibition.end_date,
+        'attendees': registration.attendees_count,
+        'reason': f"Reason: {reason}\n" if reason else '',
+    }
+    return EmailMessage(
+        subject=subject.format(**context),
+        body=body.format(**context),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[notification.recipient],
+    )
+
+
+def deliver_batch(batch_size=100, max_attempts=None):
+    """Claim, send and record one batch; returns a ``DeliveryResult``"""
+    if max_attempts is None:
+        max_attempts = _setting('NOTIFICATION_MAX_ATTEMPTS', 5)
+    notifications = claim_batch(batch_size)
+    if not notifications:
+        return DeliveryResult()
+
+    sent, failures = [], []
+    connection = None
+    try:
+        connection = get_connection(backend=_setting('NOTIFICATION_EMAIL_BACKEND', None))
+        connection.open()
+        for notification in notifications:
+            try:
+                message = render(notification)
+                if connection.send_messages([message]):
+                    sent.append(notification)
+                else:
+                    failures.append((notification, 'Backend reported the message as not sent'))
+            except Exception as e:
+                failures.append((notification, f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        # Could not even get a connection: the whole batch retries
+        failures = [(n, f"{type(e).__name__}: {e}") for n in notifications if n not in sent]
+    finally:
+        if connection is not None:
+            connection.close()
+
+    return _record(notifications[0].claim_token, sent, failures, max_attempts)
+
+
+def _record(token, sent, failures, max_attempts):
+    now = timezone.now()
+    result = DeliveryResult()
+    claimed = NotificationOutbox.objects.filter(claim_token=token)
+
+    with transaction.atomic():
+        if sent:
+            result.sent = claimed.filter(id__in=[n.id for n in sent]).update(
+                status='SENT', sent_at=now, attempts=F('attempts') + 1,
+                claim_token=None, last_error=''
+            )
+            Registration.objects.filter(
+                id__in={n.registration_id for n in sent}
+            ).update(visitor_notified=True)
+            caching.invalidate_visitors({n.recipient for n in sent})
+
+        # Group failures by attempt count and error so each group is one UPDATE
+        groups = defaultdict(list)
+        for notification, error in failures:
+            groups[(notification.attempts + 1, error[:1000])].append(notification.id)
+        for (attempts, error), ids in groups.items():
+            if attempts >= max_attempts:
+                result.failed += claimed.filter(id__in=ids).update(
+                    status='FAILED', attempts=attempts, claim_token=None, last_error=error
+                )
+            else:
+                result.retrying += claimed.filter(id__in=ids).update(
+                    status='PENDING', attempts=attempts, claim_token=None,
+                    next_attempt_at=now + backoff(attempts), last_error=error
+                )
+    return result
@@ -0,0 +1,272 @@
+"""
+On-demand profiling of single requests, for admins.
+
+An admin opts one request in with an ``X-Profile`` header or a ``_profile``
+query parameter. The value is a comma separated list of options:
+
+- ``cprofile``: the deterministic profiler. This is the default.
+- ``sample``: the pyinstrument sampling profiler, when it is installed.
+- ``memory``: also track allocations with ``tracemalloc``.
+
+The result is written to ``PROFILE_ROOT``. It holds the call statistics, the
+SQL the request ran and the largest allocations, and the raw profile
+(``.prof`` for pstats/snakeviz, ``.html`` for pyinstrument) can be
+downloaded. Only the newest ``PROFILE_KEEP`` profiles are kept.
+``/api/profiles/`` lists them.
+
+A request that doesn't opt in pays one header lookup and a substring check of
+its query string. A non-admin's flag is ignored. One request per process is
+profiled at a time: ``tracemalloc`` traces every thread, and a profiler slows
+down everything it runs next to.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+try:
+    from pyinstrument import Profiler as SamplingProfiler
+except ImportError:  # pragma: no cover - optional dependency
+    SamplingProfiler = None
+
+from . import logs
+
+QUERY_FLAG = '_profile'
+PROFILE_ID_PATTERN = re.compile(r'\d{13}-[0-9a-f]{8}')
+# Fields of a stored profile shown in the list
+SUMMARY_FIELDS = ('id', 'created_at', 'request_id', 'user_id', 'method', 'path', 'status',
+                  'duration_ms', 'mode', 'query_count', 'query_ms')
+
+_profiling = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def root():
+    return str(_setting('PROFILE_ROOT', settings.BASE_DIR / 'profiles'))
+
+
+def requested_options(request):
+    """The options the request asks to be profiled with, or None if it doesn't"""
+    value = request.META.get('HTTP_X_PROFILE')
+    if value is None:
+        if QUERY_FLAG not in request.META.get('QUERY_STRING', ''):
+            return None
+        value = request.GET.get(QUERY_FLAG)
+        if value is None:
+            return None
+    return {option.strip().lower() for option in value.split(',') if option.strip()}
+
+
+def authenticated_admin(request):
+    """The requesting user if they have the admin role, else None"""
+    # The view authenticates again; this only runs for requests that opt in
+    drf_request = Request(request, authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    return user if user.is_authenticated and getattr(user, 'role', None) == 'admin' else None
+
+
+class QueryLog:
+    """``execute_wrapper`` recording each query's SQL and time (parameters are left out)"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.queries = []
+        self.count = 0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.total += elapsed
+            if len(self.queries) < self.limit:
+                self.queries.append({
+                    'database': context['connection'].alias,
+                    'sql': sql,
+                    'many': many,
+                    'ms': round(elapsed * 1000, 3),
+                })
+
+
+# ---------------------------
+# Profiling
+# ---------------------------
+
+def run(request, get_response, options, user):
+    """``get_response(request)`` under the profiler; stores the profile and tags the response with its id"""
+    if not _profiling.acquire(blocking=False):
+        response = get_response(request)
+        response.headers['X-Profile'] = 'busy'
+        return response
+    try:
+        return _run(request, get_response, options, user)
+    finally:
+        _profiling.release()
+
+
+def _run(request, get_response, options, user):
+    mode = 'sample' if 'sample' in options and SamplingProfiler is not None else 'cprofile'
+    memory = 'memory' in options
+    queries = QueryLog(_setting('PROFILE_MAX_QUERIES', 1000))
+
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(_setting('PROFILE_TRACEMALLOC_FRAMES', 10))
+    if memory:
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+    if mode == 'sample':
+        profiler = SamplingProfiler(interval=_setting('PROFILE_SAMPLE_INTERVAL', 0.001))
+        start_profiler, stop_profiler = profiler.start, profiler.stop
+    else:
+        profiler = cProfile.Profile()
+        start_profiler, stop_profiler = profiler.enable, profiler.disable
+
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(queries))
+        began = time.perf_counter()
+        start_profiler()
+        try:
+            response = get_response(request)
+        finally:
+            stop_profiler()
+            duration = time.perf_counter() - began
+
+    allocations = None
+    if memory:
+        after = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        allocations = {
+            'peak_bytes': peak,
+            'top': [
+                {'where': str(stat.traceback[0]), 'size_diff': stat.size_diff, 'count_diff': stat.count_diff}
+                for stat in after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')[:30]
+            ],
+        }
+
+    profile_id = f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+    save(profile_id, profiler, mode, {
+        'id': profile_id,
+        'created_at': timezone.now().isoformat(),
+        'request_id': logs.request_id.get(),
+        'user_id': user.pk,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'mode': mode,
+        'query_count': queries.count,
+        'query_ms': round(queries.total * 1000, 3),
+        'queries': queries.queries,
+        'memory': allocations,
+    })
+    response.headers['X-Profile-ID'] = profile_id
+    return response
+
+
+# ---------------------------
+# Storage
+# ---------------------------
+
+def _path(profile_id, extension):
+    return os.path.join(root(), f"{profile_id}.{extension}")
+
+
+def save(profile_id, profiler, mode, entry):
+    """Write the profile and its summary, then drop all but the newest ``PROFILE_KEEP``"""
+    os.makedirs(root(), exist_ok=True)
+    if mode == 'cprofile':
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats('cumulative').print_stats(60)
+        entry['stats'] = stats.getvalue()
+        profiler.dump_stats(_path(profile_id, 'prof'))
+    else:
+        entry['stats'] = profiler.output_text()
+        with open(_path(profile_id, 'html'), 'w') as f:
+            f.write(profiler.output_html())
+    # The summary goes last: a profile is listed only once it is complete
+    temporary = f"{_path(profile_id, 'json')}.tmp"
+    with open(temporary, 'w') as f:
+        json.dump(entry, f, default=str)
+    os.replace(temporary, _path(profile_id, 'json'))
+    prune()
+
+
+def _ids():
+    try:
+        names = os.listdir(root())
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-len('.json')] for name in names if name.endswith('.json'))
+
+
+def prune():
+    """Delete the oldest profiles beyond ``PROFILE_KEEP``"""
+    ids = _ids()
+    for profile_id in ids[:max(len(ids) - _setting('PROFILE_KEEP', 50), 0)]:
+        for extension in ('json', 'prof', 'html'):
+            try:
+                os.unlink(_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def load(profile_id):
+    """The stored profile ``profile_id``, or None"""
+    if not PROFILE_ID_PATTERN.fullmatch(profile_id):
+        return None
+    try:
+        with open(_path(profile_id, 'json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first"""
+    summaries = []
+    for profile_id in reversed(_ids()):
+        entry = load(profile_id)
+        if entry is not None:
+            summaries.append({field: entry.get(field) for field in SUMMARY_FIELDS})
+    return summaries
+
+
+def raw_file(profile_id):
+    """``(path, content type)`` of the downloadable profile, or None"""
+    entry = load(profile_id)
+    if entry is None:
+        return None
+    if entry['mode'] == 'cprofile':
+        path, content_type = _path(profile_id, 'prof'), 'application/octet-stream'
+    else:
+        path, content_type = _path(profile_id, 'html'), 'text/html'
+    return (path, content_type) if os.path.exists(path) else None
@@ -0,0 +1,89 @@
+"""
+Set-based decisions on many pending registrations at once.
+
+``Registration.approve()``/``reject()``/``cancel()`` handle one row and shift
+the rest of the queue with one UPDATE each time. ``decide`` handles a whole
+selection in a fixed number of statements instead. Every pending
+registration left behind moves up by the number of selected registrations
+ahead of it, in one correlated UPDATE. The same side effects as the
+per-row methods follow:
+
+* notification outbox rows,
+* visitor cache invalidation,
+* one ``registration_queue_changed`` event per registration after commit,
+  sent per exhibition from the back of the queue so that subscribers
+  applying them one at a time end up with the same positions.
+"""
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import caching
+from .models import NotificationOutbox, Registration
+from .signals import registration_queue_changed
+
+DECISIONS = ('APPROVED', 'REJECTED', 'CANCELLED')
+
+
+def decide(registrations, status, reviewer=None, reason=''):
+    """Move the PENDING registrations in ``registrations`` to ``status``; returns how many moved"""
+    if status not in DECISIONS:
+        raise ValueError(f"Unknown decision: {status}")
+
+    with transaction.atomic():
+        leaving = list(
+            registrations.filter(status='PENDING')
+            .order_by('exhibition_id', F('queue_position').desc(nulls_last=True))
+            .values('id', 'visitor_id', 'visitor__email', 'exhibition_id', 'queue_position')
+        )
+        if not leaving:
+            return 0
+        ids = [row['id'] for row in leaving]
+
+        staying = Registration.objects.filter(
+            exhibition_id__in={row['exhibition_id'] for row in leaving}, status='PENDING'
+        ).exclude(id__in=ids)
+        emails = {row['visitor__email'] for row in leaving}
+        emails.update(staying.values_list('visitor__email', flat=True))
+        ahead = (
+            Registration.objects.filter(
+                id__in=ids,
+                exhibition_id=OuterRef('exhibition_id'),
+                queue_position__lt=OuterRef('queue_position'),
+            )
+            .order_by()
+            .values('exhibition_id')
+            .annotate(leaving=Count('id'))
+            .values('leaving')
+        )
+        staying.update(queue_position=F('queue_position') - Coalesce(Subquery(ahead), 0))
+
+        changes = {'status': status, 'confirmed': status == 'APPROVED', 'queue_position': None}
+        if status != 'CANCELLED':
+            changes.update(reviewed_by=reviewer, reviewed_at=timezone.now(), visitor_notified=False)
+            NotificationOutbox.objects.bulk_create(
+                NotificationOutbox(registration_id=row['id'], kind=status, recipient=row['visitor__email'])
+                for row in leaving
+            )
+        if status == 'REJECTED':
+            changes['rejection_reason'] = reason
+        Registration.objects.filter(id__in=ids).update(**changes)
+
+        # update() skips the post_save receivers that would drop these caches
+        caching.invalidate_visitors(emails)
+        caching.invalidate_exhibition_registrations({row['exhibition_id'] for row in leaving})
+        transaction.on_commit(lambda: _announce(leaving, status))
+    return len(leaving)
+
+
+def _announce(leaving, status):
+    for row in leaving:
+        registration_queue_changed.send(
+            sender=Registration,
+            registration_id=row['id'],
+            visitor_id=row['visitor_id'],
+            exhibition_id=row['exhibition_id'],
+            status=status,
+            vacated_position=row['queue_position'],
+        )
@@ -0,0 +1,524 @@
+"""
+Push channel for registration queue updates, served as Server-Sent Events.
+
+A visitor opens one stream at ``/api/registrations/stream/`` (routed in
+``artgallery/asgi.py``). The first event is a snapshot of their pending
+registrations. After that nothing is queried again: whenever ``approve``,
+``reject`` or ``cancel`` takes a registration out of the queue, a single
+change event goes through the broker. The hub then works out locally which
+subscribers moved up and pushes their new position. Registrations the
+visitor makes while the stream is open arrive as events too, and are
+tracked from then on.
+
+Positions are only ever adjusted relative to the snapshot, so no change may
+fall between the two. A stream therefore starts buffering events before it
+queries the snapshot. The query also reads the registrations the buffered
+events are about: a change whose registration is still PENDING in the
+snapshot happened after it and is replayed, the others are already part of
+it. Events that arrive during the query make it run again.
+
+EventSource can't send an Authorization header. Browsers therefore open
+the stream with ``?ticket=`` from ``POST /api/registrations/stream/ticket/``.
+A ticket is signed, only opens this stream, and expires after
+``QUEUE_STREAM_TICKET_MAX_AGE`` seconds (60 by default). What ends up in
+access logs is thus useless within a minute. Access tokens are only
+accepted in the header.
+
+Brokers:
+
+* ``InProcessBroker`` (default) only reaches streams served by the same
+  process that made the change.
+* ``FileBroker`` is a local stand-in for a shared broker. Every worker
+  appends events to one file and tails it, so changes made by any WSGI or
+  ASGI worker reach every stream.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/registrations/stream/'
+HEARTBEAT_SECONDS = 15
+# Snapshot queries before settling for events that arrived during the last one
+SNAPSHOT_ATTEMPTS = 5
+TICKET_SALT = 'core.realtime.stream'
+
+
+# ---------------------------
+# Brokers
+# ---------------------------
+
+class InProcessBroker:
+    """Fan events out to listeners registered in this process"""
+
+    def __init__(self, **options):
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def publish(self, event):
+        self._dispatch(event)
+
+    def _dispatch(self, event):
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Queue event listener failed")
+
+
+class FileBroker(InProcessBroker):
+    """Cross-process broker backed by an append-only file that every worker tails"""
+
+    def __init__(self, path, poll_interval=0.2, max_bytes=10 * 1024 * 1024, **options):
+        super().__init__(**options)
+        self.path = str(path)
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+        self._tailer = None
+
+    def subscribe(self, listener):
+        super().subscribe(listener)
+        with self._lock:
+            if self._tailer is None:
+                self._tailer = threading.Thread(target=self._tail, name='queue-event-tailer', daemon=True)
+                self._tailer.start()
+
+    def publish(self, event):
+        line = (json.dumps(event) + '\n').encode()
+        with open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Start over once the file is large; tailers notice it shrank
+                if os.fstat(f.fileno()).st_size > self.max_bytes:
+                    f.truncate(0)
+                f.write(line)
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _tail(self):
+        try:
+            offset = os.stat(self.path).st_size
+        except FileNotFoundError:
+            offset = 0
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                size = os.stat(self.path).st_size
+            except FileNotFoundError:
+                offset = 0
+                continue
+            if size < offset:
+                offset = 0
+            if size == offset:
+                continue
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            # Only consume complete lines; a partial write is picked up next time
+            end = data.rfind(b'\n') + 1
+            offset += end
+            for line in data[:end].splitlines():
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                self._dispatch(event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            config = dict(getattr(settings, 'QUEUE_EVENTS_BROKER', {}))
+            backend = import_string(config.pop('BACKEND', 'core.realtime.InProcessBroker'))
+            _broker = backend(**{key.lower(): value for key, value in config.items()})
+        return _broker
+
+
+def publish_queue_change(sender, registration_id, visitor_id, exhibition_id,
+                         status, vacated_position, **kwargs):
+    """``registration_queue_changed`` receiver: forward the change to the broker"""
+    get_broker().publish({
+        'registration_id': registration_id,
+        'visitor_id': visitor_id,
+        'exhibition_id': exhibition_id,
+        'status': status,
+        'vacated_position': vacated_position,
+    })
+
+
+def publish_registration_queued(sender, registration_id, visitor_id, visitor_email, exhibition_id,
+                                exhibition_title, queue_position, **kwargs):
+    """``registration_queued`` receiver: forward the new registration to the broker"""
+    get_broker().publish({
+        'type': 'queued',
+        'registration_id': registration_id,
+        'visitor_id': visitor_id,
+        'visitor_email': visitor_email,
+        'exhibition_id': exhibition_id,
+        'exhibition_title': exhibition_title,
+        'queue_position': queue_position,
+    })
+
+
+# ---------------------------
+# Subscriber hub
+# ---------------------------
+
+class Subscription:
+    """One open stream: the visitor's pending registrations and an outbound queue"""
+
+    def __init__(self, email, visitor_ids, registrations, loop):
+        self.email = email
+        self.visitor_ids = set(visitor_ids)
+        self.registrations = {entry['registration_id']: entry for entry in registrations}
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        # Events received before the snapshot, while listening (None once started)
+        self.buffer = None
+
+    def exhibitions(self):
+        return {
+            entry['exhibition_id'] for entry in self.registrations.values()
+            if entry['status'] == 'PENDING'
+        }
+
+    def push(self, entry):
+        payload = dict(entry, type='queue_update')
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, payload)
+
+
+class QueueHub:
+    """Applies change events to the subscriptions held by this process"""
+
+    def __init__(self, broker):
+        self._buffering = set()
+        self._by_email = defaultdict(set)
+        self._by_visitor = defaultdict(set)
+        self._by_exhibition = defaultdict(set)
+        self._lock = threading.Lock()
+        broker.subscribe(self.dispatch)
+
+    def add(self, subscription):
+        """Deliver changes to ``subscription`` from now on"""
+        with self._lock:
+            self._index(subscription)
+
+    def _index(self, subscription):
+        self._by_email[subscription.email].add(subscription)
+        for visitor_id in subscription.visitor_ids:
+            self._by_visitor[visitor_id].add(subscription)
+        for exhibition_id in subscription.exhibitions():
+            self._by_exhibition[exhibition_id].add(subscription)
+
+    def listen(self, subscription):
+        """Buffer every event for ``subscription`` until ``start``"""
+        with self._lock:
+            subscription.buffer = []
+            self._buffering.add(subscription)
+
+    def buffered(self, subscription):
+        with self._lock:
+            return list(subscription.buffer)
+
+    def start(self, subscription, rows, seen, final=False):
+        """
+        Start a listening subscription on snapshot ``rows`` (``Registration``
+        values), queried after the first ``seen`` buffered events. Returns the
+        snapshot entries, or None if more events arrived meanwhile (unless
+        ``final``).
+        """
+        with self._lock:
+            if len(subscription.buffer) > seen and not final:
+                return None
+            buffered, subscription.buffer = subscription.buffer, None
+            self._buffering.discard(subscription)
+
+            queued = {
+                event['registration_id'] for event in buffered
+                if event.get('type') == 'queued' and event['visitor_email'] == subscription.email
+            }
+            for row in rows:
+                if row['status'] == 'PENDING' and (row['visitor_id'] in subscription.visitor_ids
+                                                   or row['id'] in queued):
+                    subscription.visitor_ids.add(row['visitor_id'])
+                    subscription.registrations[row['id']] = {
+                        'registration_id': row['id'],
+                        'exhibition_id': row['exhibition_id'],
+                        'exhibition_title': row['exhibition__title'],
+                        'status': row['status'],
+                        'queue_position': row['queue_position'],
+                    }
+            snapshot = [dict(entry) for entry in subscription.registrations.values()]
+            self._index(subscription)
+
+            # Changes to registrations the snapshot still has pending came after it
+            statuses = {row['id']: row['status'] for row in rows}
+            for event in buffered:
+                if event.get('type') != 'queued' and statuses.get(event['registration_id']) == 'PENDING':
+                    self._apply(event)
+            return snapshot
+
+    def remove(self, subscription):
+        with self._lock:
+            self._buffering.discard(subscription)
+            for index in (self._by_email, self._by_visitor, self._by_exhibition):
+                for key in [k for k, subs in index.items() if subscription in subs]:
+                    index[key].discard(subscription)
+                    if not index[key]:
+                        del index[key]
+
+    def dispatch(self, event):
+        with self._lock:
+            for subscription in self._buffering:
+                subscription.buffer.append(event)
+            if event.get('type') == 'queued':
+                self._track(event)
+            else:
+                self._apply(event)
+
+    def _apply(self, event):
+        exhibition_id = event['exhibition_id']
+        vacated = event['vacated_position']
+        # The visitor whose registration changed sees its new status
+        for subscription in self._by_visitor.get(event['visitor_id'], ()):
+            entry = subscription.registrations.get(event['registration_id'])
+            if entry is None:
+                continue
+            entry.update(status=event['status'], queue_position=None)
+            subscription.push(entry)
+            if exhibition_id not in subscription.exhibitions():
+                self._by_exhibition[exhibition_id].discard(subscription)
+
+        # Everyone queued behind the vacated slot moves up one place
+        if vacated:
+            for subscription in self._by_exhibition.get(exhibition_id, ()):
+                for entry in subscription.registrations.values():
+                    if (entry['exhibition_id'] == exhibition_id
+                            and entry['status'] == 'PENDING'
+                            and entry['queue_position']
+                            and entry['queue_position'] > vacated):
+                        entry['queue_position'] -= 1
+                        subscription.push(entry)
+
+    def _track(self, event):
+        """A visitor with an open stream joined a queue: follow that registration too"""
+        exhibition_id = event['exhibition_id']
+        # By email: the visitor row may be newer than the stream
+        for subscription in self._by_email.get(event['visitor_email'], ()):
+            entry = {
+                'registration_id': event['registration_id'],
+                'exhibition_id': exhibition_id,
+                'exhibition_title': event['exhibition_title'],
+                'status': 'PENDING',
+                'queue_position': event['queue_position'],
+            }
+            subscription.registrations[entry['registration_id']] = entry
+            subscription.visitor_ids.add(event['visitor_id'])
+            self._by_visitor[event['visitor_id']].add(subscription)
+            self._by_exhibition[exhibition_id].add(subscription)
+            subscription.push(entry)
+
+
+_hub = None
+
+
+def get_hub():
+    global _hub
+    with _broker_lock:
+        hub = _hub
+    if hub is None:
+        broker = get_broker()
+        with _broker_lock:
+            if _hub is None:
+                _hub = QueueHub(broker)
+            hub = _hub
+    return hub
+
+
+# ---------------------------
+# ASGI endpoint
+# ---------------------------
+
+def issue_ticket(user):
+    """Signed, short-lived credential that only opens the queue stream"""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def ticket_max_age():
+    return getattr(settings, 'QUEUE_STREAM_TICKET_MAX_AGE', 60)
+
+
+def _authenticate(kind, credential):
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+    if kind == 'ticket':
+        try:
+            user_id = signing.loads(credential, salt=TICKET_SALT, max_age=ticket_max_age())
+        except signing.BadSignature:
+            return None
+        return get_user_model().objects.filter(pk=user_id, is_active=True).first()
+
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(credential))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _load_subscriber(kind, credential):
+    """Resolve a credential to (email, visitor ids) or None"""
+    from .models import Visitor
+
+    close_old_connections()
+    try:
+        user = _authenticate(kind, credential)
+        if user is None:
+            return None
+        return user.email, list(Visitor.objects.filter(email=user.email).values_list('id', flat=True))
+    finally:
+        close_old_connections()
+
+
+def _snapshot(hub, subscription):
+    """Query the visitor's pending registrations and start the listening ``subscription`` on them"""
+    from .models import Registration
+
+    close_old_connections()
+    try:
+        for attempt in range(SNAPSHOT_ATTEMPTS):
+            buffered = hub.buffered(subscription)
+            rows = list(
+                Registration.objects.filter(
+                    Q(visitor_id__in=subscription.visitor_ids, status='PENDING')
+                    | Q(id__in={event['registration_id'] for event in buffered})
+                ).values('id', 'visitor_id', 'exhibition_id', 'exhibition__title', 'status', 'queue_position')
+            )
+            snapshot = hub.start(subscription, rows, len(buffered), final=attempt == SNAPSHOT_ATTEMPTS - 1)
+            if snapshot is not None:
+                return snapshot
+    finally:
+        close_old_connections()
+
+
+def _credentials(scope):
+    """``('jwt', access token)`` from the header, ``('ticket', ticket)`` from the query, or None"""
+    for name, value in scope.get('headers', []):
+        if name == b'authorization':
+            parts = value.decode('latin-1').split()
+            if len(parts) == 2 and parts[0] in settings.SIMPLE_JWT.get('AUTH_HEADER_TYPES', ('Bearer',)):
+                return 'jwt', parts[1]
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    ticket = (query.get('ticket') or [None])[0]
+    return ('ticket', ticket) if ticket else None
+
+
+def _cors_headers(scope):
+    origin = dict(scope.get('headers', [])).get(b'origin')
+    if origin and origin.decode('latin-1') in getattr(settings, 'CORS_ALLOWED_ORIGINS', []):
+        return [
+            (b'access-control-allow-origin', origin),
+            (b'access-control-allow-credentials', b'true'),
+        ]
+    return []
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+async def _reject(send, status, message):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json')],
+    })
+    await send({'type': 'http.response.body', 'body': json.dumps({'error': message}).encode()})
+
+
+async def queue_stream(scope, receive, send):
+    """ASGI app streaming queue position and status changes to one visitor"""
+    if scope['method'] != 'GET':
+        await _reject(send, 405, 'Method not allowed')
+        return
+
+    credentials = _credentials(scope)
+    subscriber = await sync_to_async(_load_subscriber)(*credentials) if credentials else None
+    if subscriber is None:
+        await _reject(send, 401, 'Authentication credentials were not provided or are invalid')
+        return
+
+    email, visitor_ids = subscriber
+    subscription = Subscription(email, visitor_ids, [], asyncio.get_running_loop())
+    hub = get_hub()
+    hub.listen(subscription)
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    update = None
+    try:
+        registrations = await sync_to_async(_snapshot)(hub, subscription)
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                *_cors_headers(scope),
+            ],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': _sse('snapshot', {'pending_registrations': registrations}),
+            'more_body': True,
+        })
+
+        while not disconnected.done():
+            update = asyncio.ensure_future(subscription.queue.get())
+            done, _ = await asyncio.wait(
+                {update, disconnected},
+                timeout=HEARTBEAT_SECONDS,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if update in done:
+                body = _sse('queue_update', update.result())
+            else:
+                update.cancel()
+                body = b': keep-alive\n\n'
+            if not disconnected.done():
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    finally:
+        hub.remove(subscription)
+        disconnected.cancel()
+        if update is not None:
+            update.cancel()
@@ -0,0 +1,39 @@
+"""
+JSON renderer backed by orjson when it is installed.
+
+The output matches DRF's ``JSONRenderer`` byte for byte: compact, UTF-8 and
+with U+2028/U+2029 escaped. orjson only handles the basic types itself;
+datetimes, ``Decimal`` and anything else go through DRF's own encoder, so
+values that didn't pass through a serializer (e.g. the sync payload) are
+formatted exactly as before. Without orjson, or when a client asks for
+indented output, this is the stock renderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder.default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder can handle
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
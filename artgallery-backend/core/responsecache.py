@@ -0,0 +1,183 @@
+"""
+Tiered response cache for read-heavy views.
+
+Entries live in a small in-process LRU (``RESPONSE_CACHE_LOCAL_ENTRIES``) in
+front of the shared ``default`` cache, which is file-based so every worker
+on the host sees the same entries. A view opts in with ``@cache_response``.
+Its key covers the path, the query parameters and the caller's role.
+
+The namespace versions a response depends on (see ``core.caching``) are
+stored inside the entry rather than in the key. An invalidated entry
+therefore stays around as a stale copy. An entry is fresh while its versions
+are current and its TTL hasn't run out. Otherwise exactly one request per
+key recomputes it; the single flight is a lock entry in the shared cache.
+Concurrent requests meanwhile get the stale copy (stale-while-revalidate).
+If there is no stale copy, they wait up to ``RESPONSE_CACHE_WAIT`` seconds
+for the winner before computing it themselves.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpRequest
+from django.urls import resolve
+from rest_framework.response import Response
+
+from . import caching
+
+POLL_INTERVAL = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class LocalLRU:
+    """Thread-safe, size-bounded dict; the least recently used entry goes first"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local = LocalLRU(_setting('RESPONSE_CACHE_LOCAL_ENTRIES', 512))
+
+
+def _lookup(key):
+    entry = local.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None:
+            local.set(key, entry)
+    return entry
+
+
+def _store(key, entry, ttl):
+    local.set(key, entry)
+    # Kept past its TTL so it can still be served stale during a recompute
+    cache.set(key, entry, ttl + _setting('RESPONSE_CACHE_STALE_SECONDS', 300))
+
+
+def _is_fresh(entry, versions):
+    return entry is not None and entry['versions'] == versions and time.time() < entry['expires']
+
+
+def get_or_compute(key, namespaces, ttl, compute):
+    """
+    ``(entry, state)`` for ``key``, where ``state`` is HIT, STALE or MISS.
+    ``compute()`` returns a Response; only 200s are cached (entry is None otherwise).
+    """
+    versions = caching.get_versions(*namespaces)
+    entry = _lookup(key)
+    if _is_fresh(entry, versions):
+        return entry, 'HIT'
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, _setting('RESPONSE_CACHE_LOCK_TIMEOUT', 30)):
+        try:
+            return _compute(key, versions, ttl, compute)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    if entry is not None:
+        return entry, 'STALE'
+
+    # Someone else is computing it and there's nothing to fall back on
+    deadline = time.monotonic() + _setting('RESPONSE_CACHE_WAIT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            local.set(key, entry)
+            return entry, 'HIT'
+    return _compute(key, versions, ttl, compute)
+
+
+def _compute(key, versions, ttl, compute):
+    response = compute()
+    if response.status_code != 200:
+        return {'response': response}, 'MISS'
+    entry = {'data': response.data, 'versions': versions, 'expires': time.time() + ttl}
+    _store(key, entry, ttl)
+    return entry, 'MISS'
+
+
+def response_key(prefix, request, per_user=False):
+    user = request.user
+    role = getattr(user, 'role', 'visitor') if user.is_authenticated else 'anonymous'
+    params = sorted((name, values) for name, values in request.query_params.lists())
+    return 'response:' + prefix + ':' + caching.digest(
+        request.get_host(), request.path, role, user.pk if per_user else '', params
+    )
+
+
+def cache_response(prefix, namespaces=(), ttl_setting=None, default_ttl=60, per_user=False):
+    """
+    Cache a DRF view method's 200 responses. ``namespaces`` is a list, or a
+    callable taking the URL kwargs, naming what the response depends on.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            ttl = getattr(settings, ttl_setting, default_ttl) if ttl_setting else default_ttl
+            depends_on = namespaces(**kwargs) if callable(namespaces) else namespaces
+            entry, state = get_or_compute(
+                response_key(prefix, request, per_user), depends_on, ttl,
+                lambda: method(view, request, *args, **kwargs),
+            )
+            response = entry.get('response') or Response(entry['data'])
+            response['X-Cache'] = state
+            return response
+        return wrapper
+    return decorator
+
+
+def warm(paths, host):
+    """GET each path as an anonymous client; returns ``{path: status code}``"""
+    results = {}
+    for path in paths:
+        match = resolve(path)
+        response = match.func(_get_request(path, host), *match.args, **match.kwargs)
+        results[path] = response.status_code
+    return results
+
+
+def _get_request(path, host):
+    """A bare anonymous GET; the views are called directly, without middleware"""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'HTTP_HOST': host,
+        'SERVER_NAME': host,
+        'SERVER_PORT': '80',
+    })
+    return request
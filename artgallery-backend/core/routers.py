@@ -0,0 +1,38 @@
+from django.conf import settings
+
+INTAKE_DATABASE = 'intake'
+
+# Models that live in the intake journal database rather than the main one
+INTAKE_MODELS = {'registrationintake'}
+
+
+def intake_database():
+    """Alias holding the intake journal, falling back to the main database"""
+    return INTAKE_DATABASE if INTAKE_DATABASE in settings.DATABASES else 'default'
+
+
+class IntakeRouter:
+    """Route the buffered registration journal to its own SQLite file"""
+
+    def _is_intake_model(self, model):
+        return model._meta.app_label == 'core' and model._meta.model_name in INTAKE_MODELS
+
+    def db_for_read(self, model, **hints):
+        if self._is_intake_model(model):
+            return intake_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        if self._is_intake_model(model):
+            return intake_database()
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'core' and model_name in INTAKE_MODELS:
+            return db == intake_database()
+        if db == INTAKE_DATABASE:
+            return False
+        return None
@@ -2,40 +2,143 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from .models import *
+from .expansion import Expandable, requested_include
+from . import conflicts
+from .images import ThumbnailURLsField
 
 # Add this line to define User
 User = get_user_model()
 
-class ArtistSerializer(serializers.ModelSerializer):
+
+def _parse_field_list(value):
+    return {name.strip() for name in value.split(',') if name.strip()} if value else set()
+
+
+class SparseFieldsetMixin:
+    """
+    Lets read requests trim the response with ``?fields=a,b`` or ``?exclude=c``.
+    
+    Dropped fields are removed before serialization, so their getters never
+    run. ``field_dependencies`` maps computed fields to the model lookups they
+    read; views use it to narrow their querysets (see ``QueryPlanningMixin``).
+    """
+    field_dependencies = {}
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = self.sparse_field_names(self.context.get('request'), self.fields.keys())
+        if keep is not None:
+            for name in list(self.fields):
+                if name not in keep:
+                    self.fields.pop(name)
+    
+    @staticmethod
+    def sparse_field_names(request, available):
+        """Names of the fields to keep, or None when the request asks for all of them"""
+        if request is None or request.method not in ('GET', 'HEAD'):
+            return None
+        params = getattr(request, 'query_params', request.GET)
+        fields = _parse_field_list(params.get('fields'))
+        exclude = _parse_field_list(params.get('exclude'))
+        if not fields and not exclude:
+            return None
+        keep = set(available) & fields if fields else set(available)
+        return keep - exclude
+
+
+class ExpandableFieldsMixin:
+    """
+    Embeds related objects named in ``?include=`` (dotted for nesting, e.g.
+    ``art_pieces.artist``) in place of their primary keys.
+    
+    ``expandable_fields`` maps field names to ``Expandable`` relations. Nested
+    serializers receive their part of the include tree through ``include``.
+    """
+    expandable_fields = {}
+    
+    def __init__(self, *args, include=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if include is None:
+            include = requested_include(self.context.get('request'))
+        for name, subtree in include.items():
+            if name in self.fields and name in self.expandable_fields:
+                self.fields[name] = self.expandable_fields[name].build(name, subtree)
+
+
+class ArtistSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Artist
         fields = '__all__'
 
-class ArtPieceSerializer(serializers.ModelSerializer):
+class ArtPieceSerializer(ExpandableFieldsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    # Thumbnail URLs only; the original is at /api/artpieces/<id>/image/
+    thumbnails = ThumbnailURLsField(source='image')
+    
+    expandable_fields = {'artist': Expandable(ArtistSerializer)}
+    
     class Meta:
         model = ArtPiece
-        fields = '__all__'
+        exclude = ['image']
 
-class ExhibitionSerializer(serializers.ModelSerializer):
+class ExhibitionSerializer(ExpandableFieldsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     art_pieces = serializers.SerializerMethodField()
     
+    # Loaded by a prefetch, not from the exhibition row
+    field_dependencies = {'art_pieces': []}
+    field_prefetches = {'art_pieces': 'art_pieces'}
+    expandable_fields = {'art_pieces': Expandable(ArtPieceSerializer, many=True)}
+    
     class Meta:
         model = Exhibition
         fields = ['id', 'title', 'start_date', 'end_date', 'status', 'art_pieces']
     
     def get_art_pieces(self, obj):
         """Get all art pieces associated with this exhibition through ExhibitionArtPiece"""
-        art_pieces = ArtPiece.objects.filter(
-            exhibitionartpiece__exhibition=obj
-        ).select_related('artist')
+        if 'art_pieces' in getattr(obj, '_prefetched_objects_cache', {}):
+            art_pieces = obj.art_pieces.all()
+        else:
+            art_pieces = ArtPiece.objects.filter(
+                exhibitionartpiece__exhibition=obj
+            ).select_related('artist')
         return ArtPieceSerializer(art_pieces, many=True).data
 
-class ExhibitionArtPieceSerializer(serializers.ModelSerializer):
+class ExhibitionArtPieceListSerializer(serializers.ListSerializer):
+    """Bulk assignment: the whole batch is checked for date conflicts at once"""
+    
+    def validate(self, attrs):
+        pairs = [(item['exhibition'], item['art_piece'].pk) for item in attrs]
+        if len(set((exhibition.pk, piece) for exhibition, piece in pairs)) != len(pairs):
+            raise serializers.ValidationError("The same art piece is listed twice for an exhibition")
+        found = conflicts.check_assignments(pairs)
+        if found:
+            raise serializers.ValidationError([conflicts.describe(conflict) for conflict in found])
+        return attrs
+
+class ExhibitionArtPieceSerializer(ExpandableFieldsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'exhibition': Expandable(ExhibitionSerializer),
+        'art_piece': Expandable(ArtPieceSerializer),
+    }
+    
     class Meta:
         model = ExhibitionArtPiece
         fields = '__all__'
+        list_serializer_class = ExhibitionArtPieceListSerializer
+    
+    def validate(self, attrs):
+        # A piece can't hang in two exhibitions whose dates overlap
+        if isinstance(self.parent, ExhibitionArtPieceListSerializer):
+            return attrs
+        exhibition = attrs.get('exhibition', getattr(self.instance, 'exhibition', None))
+        art_piece = attrs.get('art_piece', getattr(self.instance, 'art_piece', None))
+        found = conflicts.check_assignments(
+            [(exhibition, art_piece.pk)], replacing=[self.instance.pk] if self.instance else []
+        )
+        if found:
+            raise serializers.ValidationError({'art_piece': [conflicts.describe(c) for c in found]})
+        return attrs
 
-class VisitorSerializer(serializers.ModelSerializer):
+class VisitorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Visitor
         fields = '__all__'
@@ -46,17 +149,22 @@ class RegistrationBasicSerializer(serializers.ModelSerializer):
         model = Registration
         fields = '__all__'
 
-class ClerkSerializer(serializers.ModelSerializer):
+class ClerkSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Clerk
         fields = '__all__'
 
-class SetupStatusSerializer(serializers.ModelSerializer):
+class SetupStatusSerializer(ExpandableFieldsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
+    expandable_fields = {
+        'exhibition': Expandable(ExhibitionSerializer),
+        'clerk': Expandable(ClerkSerializer),
+    }
+    
     class Meta:
         model = SetupStatus
         fields = '__all__'
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'role', 'first_name', 'last_name']
@@ -110,12 +218,23 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class RegistrationSerializer(serializers.ModelSerializer):
+class RegistrationSerializer(ExpandableFieldsMixin, SparseFieldsetMixin, serializers.ModelSerializer):
     visitor_name = serializers.SerializerMethodField()
     visitor_email = serializers.SerializerMethodField()
     exhibition_title = serializers.SerializerMethodField()
     exhibition_status = serializers.SerializerMethodField()
     
+    field_dependencies = {
+        'visitor_name': ['visitor__name'],
+        'visitor_email': ['visitor__email'],
+        'exhibition_title': ['exhibition__title'],
+        'exhibition_status': ['exhibition__status'],
+    }
+    expandable_fields = {
+        'visitor': Expandable(VisitorSerializer),
+        'exhibition': Expandable(ExhibitionSerializer),
+    }
+    
     class Meta:
         model = Registration
         fields = [
@@ -164,6 +283,34 @@ class RegistrationSerializer(serializers.ModelSerializer):
         except:
             return 'Unknown'
             
+class ArchivedRegistrationSerializer(RegistrationSerializer):
+    """Read-only view of a registration moved to the archive tier"""
+    
+    class Meta(RegistrationSerializer.Meta):
+        model = ArchivedRegistration
+        fields = RegistrationSerializer.Meta.fields + ['archived_at']
+        read_only_fields = fields
+
+class VisitorRegistrationSerializer(RegistrationSerializer):
+    """A visitor's own registration with a summary of the exhibition"""
+    exhibition_start_date = serializers.SerializerMethodField()
+    exhibition_end_date = serializers.SerializerMethodField()
+    
+    field_dependencies = {
+        **RegistrationSerializer.field_dependencies,
+        'exhibition_start_date': ['exhibition__start_date'],
+        'exhibition_end_date': ['exhibition__end_date'],
+    }
+    
+    class Meta(RegistrationSerializer.Meta):
+        fields = RegistrationSerializer.Meta.fields + ['exhibition_start_date', 'exhibition_end_date']
+    
+    def get_exhibition_start_date(self, obj):
+        return obj.exhibition.start_date
+    
+    def get_exhibition_end_date(self, obj):
+        return obj.exhibition.end_date
+
 class RegistrationCreateSerializer(serializers.ModelSerializer):
     """Serializer specifically for creating registrations"""
     exhibition_id = serializers.IntegerField(write_only=True, required=False)
@@ -0,0 +1,17 @@
+from django.dispatch import Signal
+
+# Sent after a registration leaves the pending queue (approve, reject or
+# cancel) and the transaction has committed. Keyword arguments:
+# registration_id, visitor_id, exhibition_id, status, vacated_position
+# (the queue position it held, or None).
+registration_queue_changed = Signal()
+
+# Sent after a new registration joins the pending queue and the transaction
+# has committed. Keyword arguments: registration_id, visitor_id,
+# visitor_email, exhibition_id, exhibition_title, queue_position.
+registration_queued = Signal()
+
+# Sent by core.caching.bump once cache namespaces were invalidated, which
+# the catalog receivers do after the changing transaction commits. Keyword
+# arguments: namespaces.
+cache_namespaces_bumped = Signal()
@@ -0,0 +1,231 @@
+"""
+Prebuilt JSON snapshots of the public catalog.
+
+Anonymous visitors mostly read the same two things: the upcoming and ongoing
+exhibitions with their art pieces, and the artist list. ``build`` renders
+each of these once into ``SNAPSHOT_ROOT``, as ``<name>.json`` plus gzip (and
+brotli, when installed) variants. ``serve`` hands the file that matches the
+client's ``Accept-Encoding`` straight to the server. There's no
+authentication, no query and no serialization per request.
+
+Each snapshot records the versions of the ``core.caching`` namespaces it was
+built from in ``manifest.json``. Every catalog write already bumps those
+namespaces after commit, so ``rebuild_stale`` only has to compare versions.
+
+Requests never build. The bumps also mark the catalog as changed in the
+shared cache, and the ``build_snapshots --watch`` process calls
+``rebuild_due``, which rebuilds once the catalog has been quiet for
+``SNAPSHOT_REBUILD_DELAY`` seconds. A burst of changes thus leads to one
+rebuild, and under steady writes ``SNAPSHOT_REBUILD_MAX_DELAY`` bounds the
+wait. A snapshot that was never built is answered with a 503.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+from . import caching, fastpath
+from .middleware import accepted_encodings
+from .models import Artist, Exhibition
+from .renderers import FastJSONRenderer
+from .serializers import ArtistSerializer, ExhibitionSerializer
+
+MANIFEST = 'manifest.json'
+# Shared cache keys: the first and the latest catalog change not yet rebuilt
+CHANGED_SINCE = 'snapshots:changed-since'
+CHANGED_AT = 'snapshots:changed-at'
+PUBLIC_EXHIBITION_STATUSES = ('UPCOMING', 'ONGOING')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def root():
+    return str(_setting('SNAPSHOT_ROOT', settings.BASE_DIR / 'snapshots'))
+
+
+def _render_list(serializer_class, queryset):
+    reader = fastpath.reader_for(serializer_class)
+    if reader is None:
+        return serializer_class(queryset, many=True).data
+    return reader.render(reader.prepare(queryset))
+
+
+def exhibitions():
+    return _render_list(
+        ExhibitionSerializer,
+        Exhibition.objects.filter(status__in=PUBLIC_EXHIBITION_STATUSES).order_by('start_date', 'id'),
+    )
+
+
+def artists():
+    return _render_list(ArtistSerializer, Artist.objects.order_by('name', 'id'))
+
+
+# name -> (builder, namespaces the content depends on)
+SNAPSHOTS = {
+    'exhibitions': (exhibitions, [caching.EXHIBITIONS, caching.ART_PIECES]),
+    'artists': (artists, [caching.ARTISTS]),
+}
+
+
+# ---------------------------
+# Building
+# ---------------------------
+
+_build_lock = threading.Lock()
+
+
+def _path(name, coding=None):
+    return os.path.join(root(), f"{name}.json" + {None: '', 'gzip': '.gz', 'br': '.br'}[coding])
+
+
+def _write(path, content):
+    """Replace ``path`` atomically, so readers see the old file or the new one"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(content)
+    os.replace(temporary, path)
+
+
+def read_manifest():
+    try:
+        with open(os.path.join(root(), MANIFEST), 'rb') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def build(name):
+    """Render snapshot ``name`` and its compressed variants; returns its manifest entry"""
+    builder, namespaces = SNAPSHOTS[name]
+    with _build_lock:
+        # Versions first: a change that lands mid-build leaves the snapshot stale, not wrong
+        versions = caching.get_versions(*namespaces)
+        results = builder()
+        content = FastJSONRenderer().render({'count': len(results), 'results': results})
+        etag = hashlib.sha256(content).hexdigest()[:32]
+
+        os.makedirs(root(), exist_ok=True)
+        manifest = read_manifest()
+        previous = manifest.get(name, {})
+        if previous.get('etag') != etag or not os.path.exists(_path(name)):
+            codings = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                codings['br'] = brotli.compress(content, quality=11)
+            _write(_path(name), content)
+            for coding, compressed in codings.items():
+                _write(_path(name, coding), compressed)
+            previous = {'etag': etag, 'codings': sorted(codings), 'built_at': timezone.now().isoformat()}
+
+        manifest[name] = {**previous, 'versions': versions}
+        _write(os.path.join(root(), MANIFEST), json.dumps(manifest, indent=2).encode())
+        return manifest[name]
+
+
+def is_stale(name, manifest=None):
+    entry = (read_manifest() if manifest is None else manifest).get(name)
+    return entry is None or entry['versions'] != caching.get_versions(*SNAPSHOTS[name][1])
+
+
+def rebuild_stale():
+    """Rebuild every snapshot whose catalog data changed; returns their names"""
+    manifest = read_manifest()
+    stale = [name for name in SNAPSHOTS if is_stale(name, manifest)]
+    for name in stale:
+        build(name)
+    return stale
+
+
+def catalog_changed(sender, namespaces, **kwargs):
+    """``cache_namespaces_bumped`` receiver: tell the builder a snapshot's data changed"""
+    if any(set(namespaces) & set(depends_on) for _, depends_on in SNAPSHOTS.values()):
+        now = time.time()
+        cache.add(CHANGED_SINCE, now, None)
+        cache.set(CHANGED_AT, now, None)
+
+
+def rebuild_due(now=None):
+    """``rebuild_stale`` once the catalog changes have settled; returns the names rebuilt"""
+    now = time.time() if now is None else now
+    marks = cache.get_many([CHANGED_SINCE, CHANGED_AT])
+    if CHANGED_AT not in marks:
+        return []
+    quiet = now - marks[CHANGED_AT] >= _setting('SNAPSHOT_REBUILD_DELAY', 2)
+    overdue = now - marks.get(CHANGED_SINCE, now) >= _setting('SNAPSHOT_REBUILD_MAX_DELAY', 30)
+    if not (quiet or overdue):
+        return []
+    # Cleared first: a change that lands during the build marks again
+    cache.delete_many([CHANGED_SINCE, CHANGED_AT])
+    return rebuild_stale()
+
+
+# ---------------------------
+# Serving
+# ---------------------------
+
+_manifest_cache = (None, {})
+
+
+def _cached_manifest():
+    """The manifest, re-read only when the file changes (one ``stat`` per request)"""
+    global _manifest_cache
+    path = os.path.join(root(), MANIFEST)
+    try:
+        key = (path, os.stat(path).st_mtime_ns)
+    except FileNotFoundError:
+        return {}
+    if _manifest_cache[0] != key:
+        _manifest_cache = (key, read_manifest())
+    return _manifest_cache[1]
+
+
+def _choose(codings, header):
+    accepted = accepted_encodings(header or '')
+    best, best_q = None, 0.0
+    for coding in codings:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def serve(request, name):
+    """Response for snapshot ``name``, from disk only"""
+    if name not in SNAPSHOTS:
+        return JsonResponse({'error': f"Unknown snapshot: {name}"}, status=404)
+    entry = _cached_manifest().get(name)
+    if entry is None:
+        response = JsonResponse({'error': f"Snapshot {name} has not been built yet"}, status=503)
+        response.headers['Retry-After'] = str(_setting('SNAPSHOT_REBUILD_DELAY', 2))
+        return response
+
+    coding = _choose(entry['codings'], request.META.get('HTTP_ACCEPT_ENCODING'))
+    etag = f'"{entry["etag"]}-{coding}"' if coding else f'"{entry["etag"]}"'
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    else:
+        # Passed to the server as a file, so it can use sendfile()
+        response = FileResponse(open(_path(name, coding), 'rb'), content_type='application/json')
+        del response['Content-Disposition']  # Would name the .gz/.br file
+        if coding:
+            response.headers['Content-Encoding'] = coding
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = f"public, max-age={_setting('SNAPSHOT_MAX_AGE', 30)}"
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,179 @@
+"""
+Delta sync for offline-capable catalog clients.
+
+``GET /api/sync/?since=<token>`` returns the artists, art pieces, exhibitions
+and exhibition/art piece links created or changed since the token, plus the
+ids deleted since then (from ``CatalogTombstone``). Each stream is read with
+a keyset query on its ``(updated_at, id)`` index. A page is capped at
+``limit`` rows per stream, and ``has_more`` tells the client to call again
+with the returned token.
+
+The token is opaque to clients: base64 JSON holding the last
+``(timestamp, id)`` seen for every stream.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Artist, ArtPiece, CatalogTombstone, Exhibition, ExhibitionArtPiece
+
+TOKEN_VERSION = 1
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Stream name -> (model, fields sent to clients)
+STREAMS = {
+    'artists': (Artist, ['id', 'name', 'email', 'phone', 'nationality', 'bio', 'updated_at']),
+    'art_pieces': (ArtPiece, ['id', 'title', 'description', 'artist_id', 'estimated_value', 'status', 'updated_at']),
+    'exhibitions': (Exhibition, ['id', 'title', 'start_date', 'end_date', 'status', 'updated_at']),
+    'exhibition_art_pieces': (ExhibitionArtPiece, ['id', 'exhibition_id', 'art_piece_id', 'confirmed', 'updated_at']),
+}
+
+# CatalogTombstone.model value -> stream name
+TOMBSTONE_STREAMS = {
+    'artist': 'artists',
+    'artpiece': 'art_pieces',
+    'exhibition': 'exhibitions',
+    'exhibitionartpiece': 'exhibition_art_pieces',
+}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(Exception):
+    pass
+
+
+def _settle_window():
+    """Rows newer than this may belong to transactions that haven't committed yet"""
+    return getattr(settings, 'SYNC_SETTLE_WINDOW', timedelta(seconds=2))
+
+
+def _tombstone_retention():
+    return getattr(settings, 'SYNC_TOMBSTONE_RETENTION', timedelta(days=90))
+
+
+def encode_token(cursors, issued_at):
+    payload = {'v': TOKEN_VERSION, 'at': issued_at.isoformat(), 'c': cursors}
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_token(token):
+    """Return ``(cursors, issued_at)``; an empty token means a full sync"""
+    if not token:
+        return {}, None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        if payload.get('v') != TOKEN_VERSION:
+            raise InvalidToken('Unsupported sync token version')
+        issued_at = datetime.fromisoformat(payload['at'])
+        cursors = {
+            name: (datetime.fromisoformat(ts), int(pk))
+            for name, (ts, pk) in payload['c'].items()
+        }
+    except (ValueError, KeyError, TypeError, binascii.Error) as e:
+        raise InvalidToken('Malformed sync token') from e
+
+    if issued_at < timezone.now() - _tombstone_retention():
+        raise ExpiredToken('Sync token is older than the deletion history; run a full sync')
+    return cursors, issued_at
+
+
+def _after(cursor, field):
+    """Keyset predicate: strictly after ``cursor`` in (field, id) order"""
+    if cursor is None:
+        return Q()
+    ts, pk = cursor
+    return Q(**{f'{field}__gt': ts}) | Q(**{field: ts, 'id__gt': pk})
+
+
+# Foreign key columns are sent under the same names the REST API uses
+RENAMES = {'artist_id': 'artist', 'exhibition_id': 'exhibition', 'art_piece_id': 'art_piece'}
+
+
+def _serialize(row):
+    for column, name in RENAMES.items():
+        if column in row:
+            row[name] = row.pop(column)
+    if row.get('estimated_value') is not None:
+        row['estimated_value'] = str(row['estimated_value'])
+    return row
+
+
+def changes_since(token, limit=DEFAULT_LIMIT):
+    """Build the sync payload for ``token``"""
+    cursors, _ = decode_token(token)
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    now = timezone.now()
+    horizon = now - _settle_window()
+    has_more = False
+    new_cursors = {}
+    payload = {}
+
+    for name, (model, fields) in STREAMS.items():
+        cursor = cursors.get(name)
+        rows = list(
+            model.objects.filter(_after(cursor, 'updated_at'), updated_at__lte=horizon)
+            .order_by('updated_at', 'id')
+            .values(*fields)[:limit + 1]
+        )
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+        if rows:
+            cursor = (rows[-1]['updated_at'], rows[-1]['id'])
+        if cursor:
+            new_cursors[name] = [cursor[0].isoformat(), cursor[1]]
+        payload[name] = [_serialize(row) for row in rows]
+
+    # Deletions; a full sync has nothing to delete, it only moves the cursor
+    deleted = {name: [] for name in STREAMS}
+    tombstone_cursor = cursors.get('deleted')
+    tombstones = CatalogTombstone.objects.filter(
+        _after(tombstone_cursor, 'deleted_at'), deleted_at__lte=horizon
+    ).order_by('deleted_at', 'id')
+    if not cursors:
+        last = tombstones.values_list('deleted_at', 'id').last()
+        tombstone_cursor = tuple(last) if last else None
+    else:
+        rows = list(tombstones.values_list('id', 'model', 'object_id', 'deleted_at')[:limit + 1])
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+        for _, model_name, object_id, _ in rows:
+            deleted[TOMBSTONE_STREAMS[model_name]].append(object_id)
+        if rows:
+            tombstone_cursor = (rows[-1][3], rows[-1][0])
+    if tombstone_cursor:
+        new_cursors['deleted'] = [tombstone_cursor[0].isoformat(), tombstone_cursor[1]]
+
+    payload['deleted'] = deleted
+    payload['has_more'] = has_more
+    payload['token'] = encode_token(new_cursors, now)
+    return payload
+
+
+def record_tombstone(sender, instance, **kwargs):
+    """``post_delete`` receiver for the synced catalog models"""
+    CatalogTombstone.objects.create(model=sender._meta.model_name, object_id=instance.pk)
+
+
+def record_tombstones(model, ids):
+    """Tombstones for rows removed without ``post_delete`` (set-based deletes)"""
+    CatalogTombstone.objects.bulk_create(
+        CatalogTombstone(model=model._meta.model_name, object_id=pk) for pk in ids
+    )
+
+
+def prune_tombstones():
+    """Drop deletion history older than the retention window"""
+    cutoff = timezone.now() - _tombstone_retention()
+    deleted, _ = CatalogTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -1,3 +1,1460 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import OperationalError, connections, router, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import admin as core_admin, archive, backfill, caching, conflicts, fastpath, idempotency, images, intake, lifecycle, logs, middleware, notifications, profiling, queue, realtime, responsecache, snapshots, sync, valuation
+from .renderers import FastJSONRenderer
+from .models import (
+    ArchivedRegistration, Artist, ArtPiece, BackfillCheckpoint, CatalogTombstone, Exhibition, ExhibitionArtPiece, IdempotencyKey, NotificationOutbox, Registration, RegistrationIntake,
+    ValuationRollup, Visitor
+)
+from .serializers import (
+    ArtistSerializer, ArtPieceSerializer, ExhibitionSerializer, RegistrationSerializer
+)
+
+User = get_user_model()
+
+# For tests that clear the cache: never wipe the configured file cache
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'core-tests'}}
+
+
+def _json(data):
+    return json.loads(json.dumps(data))
+
+
+class QueuePositionTests(TransactionTestCase):
+    """Every save commits on its own, as with separate requests"""
+
+    def setUp(self):
+        self.clerk = User.objects.create_user(username='desk', password='x', role='clerk')
+        self.exhibitions = [
+            Exhibition.objects.create(title=title, start_date=date(2026, 3, 1), end_date=date(2026, 3, 31))
+            for title in ('North', 'South')
+        ]
+
+    def register(self, i):
+        return Registration.objects.create(
+            visitor=Visitor.objects.create(name=f"Visitor {i}", email=f"queue{i}@example.com"),
+            exhibition=self.exhibitions[i % 2],
+        )
+
+    def positions(self, exhibition):
+        return list(
+            Registration.objects.filter(exhibition=exhibition, status='PENDING')
+            .order_by('queue_position').values_list('queue_position', flat=True)
+        )
+
+    def test_positions_stay_contiguous_and_unique(self):
+        registrations = [self.register(i) for i in range(8)]
+        self.assertEqual([r.queue_position for r in registrations], [1, 1, 2, 2, 3, 3, 4, 4])
+
+        # Fresh rows, as each request would load them
+        Registration.objects.get(pk=registrations[2].pk).approve(self.clerk)
+        Registration.objects.get(pk=registrations[4].pk).cancel()
+        Registration.objects.get(pk=registrations[3].pk).reject(self.clerk)
+        registrations += [self.register(i) for i in range(8, 11)]
+        with transaction.atomic():
+            # Several in one transaction read the tail each time too
+            registrations += [self.register(i) for i in range(11, 13)]
+
+        for exhibition in self.exhibitions:
+            positions = self.positions(exhibition)
+            self.assertEqual(positions, list(range(1, len(positions) + 1)))
+        self.assertEqual(len(self.positions(self.exhibitions[0])), 5)
+        self.assertEqual(len(self.positions(self.exhibitions[1])), 5)
+
+    @skipIf(connections['default'].vendor != 'sqlite', 'SQLite locking only')
+    def test_sqlite_writers_take_the_lock_up_front(self):
+        # BEGIN IMMEDIATE: a second writer waits instead of failing its
+        # read-then-insert transaction with "database is locked"
+        self.assertEqual(connections['default'].settings_dict['OPTIONS'].get('transaction_mode'), 'IMMEDIATE')
+
+
+class SparseFieldsetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='sparse', password='x', role='admin')
+        piece = ArtPiece.objects.create(title='Stadia', artist=Artist.objects.create(name='Mehretu'),
+                                        estimated_value=1000)
+        for title in ('Layers', 'Maps'):
+            exhibition = Exhibition.objects.create(title=title, start_date=date(2026, 3, 1),
+                                                   end_date=date(2026, 4, 1))
+            ExhibitionArtPiece.objects.create(exhibition=exhibition, art_piece=piece)
+            visitor = Visitor.objects.create(name=title, email=f"{title.lower()}@example.com")
+            Registration.objects.create(visitor=visitor, exhibition=exhibition)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fields_and_exclude_trim_each_row(self):
+        row = self.client.get('/api/registrations/?fields=id,status,visitor_name').data['results'][0]
+        self.assertEqual(set(row), {'id', 'status', 'visitor_name'})
+        row = self.client.get('/api/exhibitions/?exclude=art_pieces,status').data['results'][0]
+        self.assertEqual(set(row), {'id', 'title', 'start_date', 'end_date'})
+        row = self.client.get('/api/exhibitions/?fields=id,title&exclude=title').data['results'][0]
+        self.assertEqual(set(row), {'id'})
+
+    def test_only_the_kept_columns_and_joins_are_queried(self):
+        with self.assertNumQueries(2) as queries:  # count, page
+            self.client.get('/api/registrations/?fields=id,status,visitor_name')
+        page = queries.captured_queries[-1]['sql']
+        self.assertIn('core_visitor', page)
+        self.assertNotIn('core_exhibition', page)
+        with self.assertNumQueries(2):  # no art piece query per exhibition
+            self.client.get('/api/exhibitions/?exclude=art_pieces')
+
+
+class RelationExpansionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artists = [Artist.objects.create(name=name) for name in ('Amaral', 'Tarsila')]
+        cls.add_exhibitions(3)
+
+    @classmethod
+    def add_exhibitions(cls, count):
+        for i in range(count):
+            exhibition = Exhibition.objects.create(title=f"Room {i}", start_date=date(2026, 3, 1),
+                                                   end_date=date(2026, 4, 1))
+            for artist in cls.artists:
+                piece = ArtPiece.objects.create(title=f"{artist.name} {i}", artist=artist, estimated_value=500)
+                ExhibitionArtPiece.objects.create(exhibition=exhibition, art_piece=piece)
+
+    def test_included_relations_are_embedded(self):
+        piece = APIClient().get('/api/artpieces/?include=artist').data['results'][0]
+        self.assertEqual(piece['artist']['name'], 'Amaral')
+        exhibition = APIClient().get('/api/exhibitions/?include=art_pieces.artist').data['results'][0]
+        self.assertEqual(sorted(p['artist']['name'] for p in exhibition['art_pieces']), ['Amaral', 'Tarsila'])
+        self.assertIsInstance(APIClient().get('/api/artpieces/').data['results'][0]['artist'], int)
+
+    def test_unknown_relation_is_rejected(self):
+        response = APIClient().get('/api/exhibitions/?include=art_pieces.visitors')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('art_pieces.visitors', str(response.data['include']))
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        url = '/api/exhibitions/?include=art_pieces.artist'
+        with self.assertNumQueries(3):  # count, exhibitions, art pieces with their artists
+            self.assertEqual(len(APIClient().get(url).data['results']), 3)
+        self.add_exhibitions(5)
+        with self.assertNumQueries(3):
+            self.assertEqual(len(APIClient().get(url).data['results']), 8)
+
+
+class FastListParityTests(TestCase):
+    """The values() list path must render exactly what the serializers render"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        artist = Artist.objects.create(name='Thandi', nationality='ZA', bio='')
+        Artist.objects.create(name='Anon')
+        pieces = [
+            ArtPiece.objects.create(title='Dusk', artist=artist, estimated_value=Decimal('1250.5')),
+            ArtPiece.objects.create(title='Dawn', artist=artist, estimated_value=Decimal('0.00'),
+                                    description=None, status='DISPLAYED'),
+        ]
+        exhibition = Exhibition.objects.create(
+            title='Light', start_date=date(2025, 5, 1), end_date=date(2025, 6, 1)
+        )
+        Exhibition.objects.create(title='Empty', start_date=date(2025, 7, 1), end_date=date(2025, 7, 2))
+        for piece in pieces:
+            ExhibitionArtPiece.objects.create(exhibition=exhibition, art_piece=piece)
+        for name in ('Lerato', 'Sipho'):
+            visitor = Visitor.objects.create(name=name, email=f"{name.lower()}@example.com")
+            Registration.objects.create(visitor=visitor, exhibition=exhibition, attendees_count=2)
+        Registration.objects.first().reject(cls.admin, reason='Full')
+
+    def assertParity(self, serializer_class, queryset, keep=None):
+        reader = fastpath.reader_for(serializer_class, keep)
+        self.assertIsNotNone(reader)
+        expected = serializer_class(queryset, many=True).data
+        if keep is not None:
+            expected = [{k: v for k, v in row.items() if k in keep} for row in expected]
+        self.assertEqual(_json(reader.render(reader.prepare(queryset))), _json(expected))
+
+    def test_artists(self):
+        self.assertParity(ArtistSerializer, Artist.objects.order_by('name'))
+
+    def test_art_pieces(self):
+        self.assertParity(ArtPieceSerializer, ArtPiece.objects.order_by('title'))
+
+    def test_exhibitions_with_nested_art_pieces(self):
+        self.assertParity(ExhibitionSerializer, Exhibition.objects.order_by('-start_date'))
+
+    def test_registrations(self):
+        self.assertParity(RegistrationSerializer, Registration.objects.order_by('-timestamp'))
+
+    def test_sparse_fields(self):
+        self.assertParity(RegistrationSerializer, Registration.objects.order_by('id'),
+                          keep={'id', 'visitor_name', 'reviewed_at', 'status'})
+
+    def test_list_endpoint_matches_serializer(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        response = client.get('/api/registrations/')
+        expected = RegistrationSerializer(Registration.objects.order_by('-timestamp'), many=True).data
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(_json(response.data['results']), _json(expected))
+
+    def test_include_uses_serializer(self):
+        response = APIClient().get('/api/artpieces/?include=artist')
+        self.assertEqual(response.data['results'][0]['artist']['name'], 'Thandi')
+
+
+class RenderingTests(TestCase):
+
+    def test_fast_renderer_matches_stock_renderer(self):
+        data = {
+            'value': Decimal('12.50'),
+            'at': datetime(2025, 5, 1, 9, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            'day': date(2025, 5, 1),
+            'text': 'Ngiyabonga \u2028 caf\u00e9',
+            'nested': [{'id': 1, 'ids': (1, 2)}, None, True],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_choose_encoding(self):
+        self.assertEqual(middleware.choose_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(middleware.choose_encoding('gzip;q=0, identity'), None)
+        self.assertEqual(middleware.choose_encoding(''), None)
+        self.assertEqual(middleware.choose_encoding('*'), 'br' if middleware.brotli else 'gzip')
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_BYTES=200)
+    def test_compression_threshold(self):
+        client = APIClient()
+        small = client.get('/api/health/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', small['Vary'])
+
+        Artist.objects.bulk_create(Artist(name=f"Artist {i}", bio='x' * 40) for i in range(10))
+        large = client.get('/api/artists/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(large['Content-Encoding'], 'gzip')
+        self.assertEqual(int(large['Content-Length']), len(large.content))
+
+    @override_settings(RESPONSE_COMPRESSION_MIN_BYTES=0)
+    def test_token_responses_are_never_compressed(self):
+        User.objects.create_user(username='keeper', password='secret-pass')
+        for path in ('/api/token/', '/api/auth/login/'):
+            response = APIClient().post(path, {'username': 'keeper', 'password': 'secret-pass'},
+                                        format='json', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('access', response.data)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VisitorRegistrationsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clerk = User.objects.create_user(username='clerk', password='x', role='clerk')
+        cls.user = User.objects.create_user(username='naledi', password='x', email='naledi@example.com')
+        cls.exhibition = Exhibition.objects.create(
+            title='Roots', start_date=date(2025, 9, 1), end_date=date(2025, 9, 30)
+        )
+        cls.ahead = Registration.objects.create(
+            visitor=Visitor.objects.create(name='First', email='first@example.com'),
+            exhibition=cls.exhibition,
+        )
+        cls.mine = Registration.objects.create(
+            visitor=Visitor.objects.create(name='Naledi', email='naledi@example.com'),
+            exhibition=cls.exhibition,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_routes_share_one_listing(self):
+        response = self.client.get('/api/visitor/registrations/')
+        self.assertEqual(response.data['count'], 1)
+        row = response.data['results'][0]
+        self.assertEqual((row['id'], row['queue_position']), (self.mine.id, 2))
+        self.assertEqual(row['exhibition_start_date'], date(2025, 9, 1))
+        self.assertEqual(self.client.get('/api/registrations/my/').data['results'], response.data['results'])
+        self.assertEqual(self.client.get('/api/my/registrations/').data['results'], response.data['results'])
+
+    def test_cached_page_follows_queue_changes(self):
+        with self.assertNumQueries(2):
+            self.client.get('/api/registrations/queue_status/')
+        with self.assertNumQueries(0):
+            status = self.client.get('/api/registrations/queue_status/').data
+        self.assertEqual(status['pending_registrations'][0]['queue_position'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ahead.approve(self.clerk)
+        status = self.client.get('/api/registrations/queue_status/').data
+        self.assertEqual(status['pending_registrations'][0]['queue_position'], 1)
+        self.assertEqual(status['total_in_queue'], 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArtistPortfolioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = Artist.objects.create(name='Zanele')
+        for value, piece_status in (('100.00', 'AVAILABLE'), ('300.50', 'AVAILABLE'), ('50.25', 'DISPLAYED')):
+            ArtPiece.objects.create(title=f"Piece {value}", artist=cls.artist,
+                                    estimated_value=Decimal(value), status=piece_status)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_and_paginated_pieces(self):
+        data = APIClient().get(f'/api/artists/{self.artist.id}/detail/?page_size=2').data
+        self.assertEqual(data['stats']['by_status'], {'AVAILABLE': 2, 'DISPLAYED': 1, 'UNAVAILABLE': 0})
+        self.assertEqual(
+            [data['stats'][k] for k in ('total_value', 'min_value', 'max_value', 'avg_value')],
+            ['450.75', '50.25', '300.50', '150.25'],
+        )
+        self.assertEqual(data['art_pieces']['count'], 3)
+        self.assertEqual(len(data['art_pieces']['results']), 2)
+
+    def test_cache_dropped_when_a_piece_changes(self):
+        url = f'/api/artists/{self.artist.id}/detail/'
+        APIClient().get(url)
+        with self.assertNumQueries(0):
+            APIClient().get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            ArtPiece.objects.create(title='New', artist=self.artist, estimated_value=Decimal('1'))
+        self.assertEqual(APIClient().get(url).data['stats']['piece_count'], 4)
+
+
+class ValuationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='curator', password='x', role='admin')
+        cls.za = Artist.objects.create(name='Mandla', nationality='ZA')
+        cls.anon = Artist.objects.create(name='Anon')
+        cls.pieces = [
+            ArtPiece.objects.create(title=f"Piece {value}", artist=artist, estimated_value=Decimal(value))
+            for value, artist in (('100.00', cls.za), ('300.00', cls.za), ('50.00', cls.anon))
+        ]
+        cls.exhibition = Exhibition.objects.create(
+            title='Tide', start_date=date(2025, 3, 1), end_date=date(2025, 3, 31)
+        )
+        ExhibitionArtPiece.objects.create(exhibition=cls.exhibition, art_piece=cls.pieces[0])
+        valuation.refresh_all()
+
+    def rollup(self, dimension, key):
+        return ValuationRollup.objects.get(dimension=dimension, key=str(key))
+
+    def test_full_refresh(self):
+        self.assertEqual((self.rollup('artist', self.za.id).piece_count,
+                          self.rollup('artist', self.za.id).total_value), (2, Decimal('400.00')))
+        self.assertEqual(self.rollup('nationality', '').label, 'Unknown')
+        self.assertEqual(self.rollup('exhibition', self.exhibition.id).total_value, Decimal('100.00'))
+
+    def test_changes_refresh_old_and_new_groups(self):
+        piece = ArtPiece.objects.get(pk=self.pieces[1].pk)
+        piece.artist = self.anon
+        piece.status = 'DISPLAYED'
+        with self.captureOnCommitCallbacks(execute=True):
+            piece.save()
+            piece.save()
+        # Saves only mark their groups; the periodic refresh does the work
+        self.assertEqual(self.rollup('artist', self.za.id).total_value, Decimal('400.00'))
+        call_command('refresh_valuation_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollup('artist', self.za.id).total_value, Decimal('100.00'))
+        self.assertEqual(self.rollup('nationality', '').total_value, Decimal('350.00'))
+        self.assertEqual(self.rollup('status', 'AVAILABLE').piece_count, 2)
+
+        ExhibitionArtPiece.objects.filter(exhibition=self.exhibition).delete()
+        self.assertEqual(valuation.refresh_dirty(), 1)
+        self.assertFalse(ValuationRollup.objects.filter(dimension='exhibition').exists())
+
+    def test_python_distribution_matches_numpy_conventions(self):
+        values = [1.0, 2.0, 3.0, 4.0, 10.0]
+        original, valuation.numpy = valuation.numpy, None
+        try:
+            result = valuation.distribution(values, percentiles=[0, 50, 90, 100], bins=3)
+        finally:
+            valuation.numpy = original
+        self.assertEqual(result['percentiles'], {'p0': 1.0, 'p50': 3.0, 'p90': 7.6, 'p100': 10.0})
+        self.assertEqual(result['histogram'], {'edges': [1.0, 4.0, 7.0, 10.0], 'counts': [3, 1, 1]})
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        data = client.get('/api/analytics/valuation/?dimension=status&nationality=ZA&bins=2').data
+        self.assertEqual(list(data['rollups']), ['status'])
+        self.assertEqual(data['rollups']['status'][0]['avg_value'], '150.00')
+        self.assertEqual(data['distribution']['count'], 2)
+        self.assertEqual(data['distribution']['histogram']['counts'], [1, 1])
+        self.assertEqual(client.get('/api/analytics/valuation/?dimension=colour').status_code, 400)
+        self.assertEqual(APIClient().get('/api/analytics/valuation/').status_code, 401)
+
+    def test_reads_leave_refreshing_to_posts(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        ArtPiece.objects.filter(pk=self.pieces[2].pk).update(estimated_value=Decimal('70.00'))
+        ArtPiece.objects.get(pk=self.pieces[2].pk).save()
+
+        data = client.get('/api/analytics/valuation/?dimension=artist&refresh=full').data
+        self.assertEqual(data['pending_groups'], 3)
+        self.assertEqual(self.rollup('artist', self.anon.id).total_value, Decimal('50.00'))
+
+        self.assertEqual(client.post('/api/analytics/valuation/', {'full': 'false'}).data, {'refreshed': 3})
+        self.assertEqual(self.rollup('artist', self.anon.id).total_value, Decimal('70.00'))
+        rebuilt = client.post('/api/analytics/valuation/', {'full': True}, format='json').data['rebuilt']
+        self.assertEqual(rebuilt['artist'], 2)
+        self.assertEqual(client.get('/api/analytics/valuation/').data['pending_groups'], 0)
+
+
+class ExhibitionLifecycleTests(TestCase):
+
+    def test_statuses_follow_dates(self):
+        today = date(2025, 6, 15)
+        rows = {
+            'past': Exhibition.objects.create(title='Past', start_date=date(2025, 5, 1),
+                                              end_date=date(2025, 6, 14), status='ONGOING'),
+            'now': Exhibition.objects.create(title='Now', start_date=date(2025, 6, 15),
+                                             end_date=date(2025, 6, 15)),
+            'later': Exhibition.objects.create(title='Later', start_date=date(2025, 7, 1),
+                                               end_date=date(2025, 7, 9), status='COMPLETED'),
+        }
+        before = Exhibition.objects.get(title='Now').updated_at
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            moved = lifecycle.advance_exhibition_statuses(today)
+        self.assertEqual(moved, {'COMPLETED': 1, 'ONGOING': 1, 'UPCOMING': 1})
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            {key: Exhibition.objects.get(pk=row.pk).status for key, row in rows.items()},
+            {'past': 'COMPLETED', 'now': 'ONGOING', 'later': 'UPCOMING'},
+        )
+        self.assertGreater(Exhibition.objects.get(title='Now').updated_at, before)
+
+        with self.assertNumQueries(5):  # Three UPDATEs inside a savepoint
+            moved = lifecycle.advance_exhibition_statuses(today)
+        self.assertFalse(any(moved.values()))
+
+
+class BookingConflictTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='registrar', password='x', role='admin')
+        cls.artist = Artist.objects.create(name='Bongani')
+        cls.piece = ArtPiece.objects.create(title='Harbour', artist=cls.artist, estimated_value=Decimal('10'))
+        cls.other_piece = ArtPiece.objects.create(title='Quay', artist=cls.artist, estimated_value=Decimal('10'))
+        cls.may = Exhibition.objects.create(title='May', start_date=date(2025, 5, 1), end_date=date(2025, 5, 31))
+        cls.late_may = Exhibition.objects.create(title='Late May', start_date=date(2025, 5, 31),
+                                                 end_date=date(2025, 6, 10))
+        cls.july = Exhibition.objects.create(title='July', start_date=date(2025, 7, 1), end_date=date(2025, 7, 31))
+        ExhibitionArtPiece.objects.create(exhibition=cls.may, art_piece=cls.piece)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_overlapping_booking_is_rejected(self):
+        url = '/api/exhibition-artpieces/'
+        response = self.client.post(url, {'exhibition': self.late_may.id, 'art_piece': self.piece.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("'May'", response.data['art_piece'][0])
+        self.assertEqual(self.client.post(url, {'exhibition': self.july.id, 'art_piece': self.piece.id}).status_code, 201)
+
+    def test_moving_a_booking_ignores_the_row_being_moved(self):
+        booking = ExhibitionArtPiece.objects.get(exhibition=self.may)
+        response = self.client.patch(f'/api/exhibition-artpieces/{booking.id}/', {'exhibition': self.late_may.id})
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_checks_the_batch_against_itself(self):
+        response = self.client.post('/api/exhibition-artpieces/', [
+            {'exhibition': self.may.id, 'art_piece': self.other_piece.id},
+            {'exhibition': self.late_may.id, 'art_piece': self.other_piece.id},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExhibitionArtPiece.objects.filter(art_piece=self.other_piece).exists())
+
+    def test_report(self):
+        ExhibitionArtPiece.objects.create(exhibition=self.late_may, art_piece=self.piece)  # Bypasses the API
+        data = self.client.get('/api/exhibition-artpieces/conflicts/').data
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['conflicts'][0]['overlap_start'], date(2025, 5, 31))
+        self.assertEqual(len(conflicts.find_conflicts(ExhibitionArtPiece.objects.filter(
+            exhibition__end_date__gte=date(2025, 6, 1)))), 0)
+
+
+class AvailabilitySearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.artist = Artist.objects.create(name='Nomsa')
+        cls.other_artist = Artist.objects.create(name='Kabelo')
+        cls.booked, cls.free, cls.displayed, cls.elsewhere = [
+            ArtPiece.objects.create(title=title, artist=artist, estimated_value=Decimal('5'), status=piece_status)
+            for title, artist, piece_status in (
+                ('Booked', cls.artist, 'AVAILABLE'),
+                ('Free', cls.artist, 'AVAILABLE'),
+                ('Displayed', cls.artist, 'DISPLAYED'),
+                ('Elsewhere', cls.other_artist, 'AVAILABLE'),
+            )
+        ]
+        show = Exhibition.objects.create(title='Winter', start_date=date(2025, 6, 1), end_date=date(2025, 8, 31))
+        ExhibitionArtPiece.objects.create(exhibition=show, art_piece=cls.booked)
+
+    def titles(self, query):
+        response = APIClient().get(f'/api/artpieces/available/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.data['results']]
+
+    def test_free_between_dates(self):
+        self.assertEqual(self.titles(f'start=2025-08-31&end=2025-09-30&artists={self.artist.id}'), ['Free'])
+        self.assertEqual(self.titles(f'start=2025-09-01&end=2025-09-30&artists={self.artist.id}'),
+                         ['Booked', 'Free'])
+        self.assertEqual(self.titles('start=2025-09-01&end=2025-09-30&status=DISPLAYED'), ['Displayed'])
+        self.assertEqual(self.titles('start=2025-07-01&end=2025-07-01&fields=title'), ['Elsewhere', 'Free'])
+
+    def test_invalid_range(self):
+        response = APIClient().get('/api/artpieces/available/?start=2025-09-30&end=2025-09-01')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkBookingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clerk = User.objects.create_user(username='hanger', password='x', role='clerk')
+        artist = Artist.objects.create(name='Lindiwe')
+        cls.pieces = ArtPiece.objects.bulk_create(
+            ArtPiece(title=f"Study {i}", artist=artist, estimated_value=Decimal('20')) for i in range(5)
+        )
+        cls.show = Exhibition.objects.create(title='Studies', start_date=date(2025, 4, 1),
+                                             end_date=date(2025, 4, 30))
+        ExhibitionArtPiece.objects.create(exhibition=cls.show, art_piece=cls.pieces[0])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.clerk)
+
+    def post(self, action, data):
+        return self.client.post(f'/api/exhibitions/{self.show.id}/art-pieces/{action}/', data, format='json')
+
+    def test_add_confirm_remove(self):
+        ids = [piece.id for piece in self.pieces]
+        with self.captureOnCommitCallbacks(execute=True):
+            added = self.post('add', {'art_pieces': ids, 'display': True}).data
+        self.assertEqual(added, {'requested': 5, 'added': 4, 'already_booked': 1, 'displayed': 4})
+        valuation.refresh_dirty()
+        self.assertEqual(ValuationRollup.objects.get(dimension='exhibition', key=str(self.show.id)).piece_count, 5)
+
+        confirmed = self.post('confirm', {}).data
+        self.assertEqual((confirmed['confirmed'], confirmed['already_confirmed']), (5, 0))
+
+        removed = self.post('remove', {'art_pieces': ids[:2] + [ids[0]]}).data
+        self.assertEqual(removed, {'requested': 2, 'removed': 2, 'not_booked': 0})
+        self.assertEqual(ExhibitionArtPiece.objects.filter(exhibition=self.show).count(), 3)
+        self.assertEqual(CatalogTombstone.objects.filter(model='exhibitionartpiece').count(), 2)
+
+    def test_flags_parse_false_strings(self):
+        ids = [piece.id for piece in self.pieces[1:3]]
+        added = self.post('add', {'art_pieces': ids, 'confirmed': 'false', 'display': 'false'}).data
+        self.assertEqual(added['displayed'], 0)
+        self.assertFalse(ExhibitionArtPiece.objects.filter(art_piece_id__in=ids, confirmed=True).exists())
+        self.assertEqual(self.post('confirm', {'display': 'false'}).data['displayed'], 0)
+        self.assertFalse(ArtPiece.objects.filter(status='DISPLAYED').exists())
+        self.assertEqual(self.post('confirm', {'display': 'maybe'}).status_code, 400)
+
+    def test_counts_only_the_bookings_it_inserted(self):
+        savepoints = []
+
+        def book_first(execute, sql, params, many, context):
+            # Another request books a piece after the booked ids are read: just
+            # before the insert's savepoint, the second inside bookings.add
+            if sql.startswith('SAVEPOINT'):
+                savepoints.append(sql)
+                if len(savepoints) == 2:
+                    ExhibitionArtPiece.objects.create(exhibition=self.show, art_piece=self.pieces[1])
+            return execute(sql, params, many, context)
+
+        with connections['default'].execute_wrapper(book_first):
+            added = self.post('add', {'art_pieces': [piece.id for piece in self.pieces]}).data
+        self.assertEqual(added, {'requested': 5, 'added': 3, 'already_booked': 2, 'displayed': 0})
+        self.assertEqual(ExhibitionArtPiece.objects.filter(exhibition=self.show).count(), 5)
+
+    def test_rejects_unknown_pieces_and_conflicts(self):
+        self.assertEqual(self.post('add', {'art_pieces': [self.pieces[1].id, 0]}).data['details'], [0])
+        clash = Exhibition.objects.create(title='Clash', start_date=date(2025, 4, 30), end_date=date(2025, 5, 5))
+        response = self.client.post(f'/api/exhibitions/{clash.id}/art-pieces/add/',
+                                    {'art_pieces': [self.pieces[0].id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.post('add', {'art_pieces': 'all'}).status_code, 400)
+        self.assertEqual(ExhibitionArtPiece.objects.count(), 1)
+
+
+class RegistrationAdminTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_superuser(username='root', password='x', email='root@example.com')
+        cls.exhibition = Exhibition.objects.create(title='Queue', start_date=date(2025, 10, 1),
+                                                   end_date=date(2025, 10, 31))
+        cls.registrations = [
+            Registration.objects.create(
+                visitor=Visitor.objects.create(name=f"Visitor {i}", email=f"v{i}@example.com"),
+                exhibition=cls.exhibition,
+            )
+            for i in range(1, 6)
+        ]
+
+    def test_decide_shifts_the_queue_in_one_pass(self):
+        chosen = Registration.objects.filter(id__in=[self.registrations[1].id, self.registrations[3].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(queue.decide(chosen, 'APPROVED', reviewer=self.staff), 2)
+        positions = dict(Registration.objects.values_list('id', 'queue_position'))
+        self.assertEqual([positions[r.id] for r in self.registrations], [1, None, 2, None, 3])
+        self.assertEqual(NotificationOutbox.objects.filter(kind='APPROVED').count(), 2)
+        self.assertEqual(queue.decide(chosen, 'REJECTED'), 0)
+
+    def test_changelist_and_action(self):
+        self.client.force_login(self.staff)
+        url = '/admin/core/registration/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.post(url, {
+            'action': 'cancel_selected', '_selected_action': [self.registrations[0].id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Registration.objects.get(pk=self.registrations[4].id).queue_position, 4)
+
+    def test_paginator_stops_counting(self):
+        original, core_admin.ESTIMATE_THRESHOLD = core_admin.ESTIMATE_THRESHOLD, 3
+        try:
+            everything = core_admin.EstimatedCountPaginator(Registration.objects.all(), 2)
+            filtered = core_admin.EstimatedCountPaginator(Registration.objects.filter(status='PENDING'), 2)
+            self.assertEqual(everything.count, self.registrations[-1].id)
+            self.assertEqual(filtered.count, 3)
+        finally:
+            core_admin.ESTIMATE_THRESHOLD = original
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RegistrationArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='thabo', password='x', email='thabo@example.com')
+        visitor = Visitor.objects.create(name='Thabo', email='thabo@example.com')
+        old = Exhibition.objects.create(title='Old', start_date=date(2024, 1, 1), end_date=date(2024, 1, 31))
+        recent = Exhibition.objects.create(title='Recent', start_date=date(2025, 5, 1), end_date=date(2025, 5, 31))
+        cls.old = Registration.objects.create(visitor=visitor, exhibition=old)
+        cls.old.approve(cls.user)
+        NotificationOutbox.objects.update(status='SENT')
+        cls.recent = Registration.objects.create(visitor=visitor, exhibition=recent)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_archive_moves_old_rows_in_batches(self):
+        before = self.client.get('/api/visitor/registrations/').data['results']
+        self.assertEqual(archive.archive(days=30, batch_size=1, today=date(2025, 6, 15)), 1)
+        self.assertFalse(Registration.objects.filter(pk=self.old.pk).exists())
+        archived = ArchivedRegistration.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.status, archived.timestamp), ('APPROVED', self.old.timestamp))
+
+        # Reads fall through to the archive
+        cache.clear()
+        after = self.client.get('/api/visitor/registrations/').data['results']
+        self.assertEqual([row['id'] for row in after], [row['id'] for row in before])
+        self.assertEqual(after, before)
+        response = self.client.get(f'/api/registrations/{self.old.pk}/')
+        self.assertEqual((response.status_code, response.data['exhibition_title']), (200, 'Old'))
+
+    def test_pending_notifications_hold_a_registration_back(self):
+        NotificationOutbox.objects.update(status='PENDING')
+        self.assertEqual(archive.archive(days=30, today=date(2025, 6, 15)), 0)
+
+    def test_the_queue_is_never_archived(self):
+        waiting = Registration.objects.create(visitor=Visitor.objects.create(name='Zola', email='zola@example.com'),
+                                              exhibition=self.old.exhibition)
+        self.assertEqual(archive.archive(days=30, today=date(2025, 6, 15)), 1)
+        self.assertEqual(Registration.objects.get(pk=waiting.pk).status, 'PENDING')
+        self.assertFalse(ArchivedRegistration.objects.filter(pk=waiting.pk).exists())
+
+
+class BackfillTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exhibition = Exhibition.objects.create(title='Legacy', start_date=date(2025, 2, 1),
+                                                   end_date=date(2025, 2, 28))
+        cls.registrations = [
+            Registration.objects.create(
+                visitor=Visitor.objects.create(name=f"Legacy {i}", email=f"legacy{i}@example.com"),
+                exhibition=cls.exhibition,
+            )
+            for i in range(6)
+        ]
+        # Pre-0003 state: confirmed set directly, positions and submitted_at missing
+        Registration.objects.filter(pk=cls.registrations[0].pk).update(confirmed=True, submitted_at=None)
+        Registration.objects.filter(pk__in=[r.pk for r in cls.registrations[3:]]).update(queue_position=None)
+
+    def test_chunks_resume_from_the_checkpoint(self):
+        status = backfill.registry['registration-status']()
+        first = backfill.run(status, chunk_size=2, max_chunks=1)
+        self.assertEqual((first.done, first.checkpoint.last_pk), (2, self.registrations[1].pk))
+        self.assertIsNone(first.checkpoint.completed_at)
+
+        rest = backfill.run(status, chunk_size=2)
+        self.assertEqual(rest.done, 4)
+        self.assertIsNotNone(BackfillCheckpoint.objects.get(name='registration-status').completed_at)
+        legacy = Registration.objects.get(pk=self.registrations[0].pk)
+        self.assertEqual((legacy.status, legacy.queue_position), ('APPROVED', None))
+        self.assertEqual(legacy.submitted_at, legacy.timestamp)
+
+        backfill.run(backfill.registry['registration-queue-positions']())
+        self.assertEqual(
+            list(Registration.objects.filter(status='PENDING').order_by('id').values_list('queue_position', flat=True)),
+            [1, 2, 3, 4, 5],
+        )
+        self.assertEqual(backfill.run(status).done, 0)
+        self.assertEqual(backfill.run(status, restart=True).done, 6)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.exhibition = Exhibition.objects.create(title='Featured', start_date=date(2026, 5, 1),
+                                                   end_date=date(2026, 6, 1))
+        cls.url = f'/api/exhibitions/{cls.exhibition.id}/detail/'
+
+    def setUp(self):
+        cache.clear()
+        responsecache.local.clear()
+
+    def test_hit_until_a_registration_changes(self):
+        self.assertEqual(APIClient().get(self.url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(APIClient().get(self.url)['X-Cache'], 'HIT')
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.create(visitor=Visitor.objects.create(name='Ada', email='ada@example.com'),
+                                        exhibition=self.exhibition)
+        response = APIClient().get(self.url)
+        self.assertEqual((response['X-Cache'], response.data['pending_registrations_count']), ('MISS', 1))
+        self.assertEqual(APIClient().get('/api/exhibitions/0/detail/').status_code, 404)
+
+    def test_stale_entry_served_while_another_worker_recomputes(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return Response({'call': len(calls)})
+
+        responsecache.get_or_compute('response:test', ['test-ns'], 60, compute)
+        caching.bump('test-ns')
+        cache.add('response:test:lock', 'elsewhere')
+        entry, state = responsecache.get_or_compute('response:test', ['test-ns'], 60, compute)
+        self.assertEqual((entry['data'], state, len(calls)), ({'call': 1}, 'STALE', 1))
+
+        cache.delete('response:test:lock')
+        entry, state = responsecache.get_or_compute('response:test', ['test-ns'], 60, compute)
+        self.assertEqual((entry['data'], state), ({'call': 2}, 'MISS'))
+
+    def test_warm_fills_the_cache_for_anonymous_reads(self):
+        self.assertEqual(responsecache.warm([self.url], 'testserver'), {self.url: 200})
+        responsecache.local.clear()
+        self.assertEqual(APIClient().get(self.url)['X-Cache'], 'HIT')
+
+    def test_local_tier_evicts_least_recently_used(self):
+        lru = responsecache.LocalLRU(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CatalogSnapshotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        artist = Artist.objects.create(name='Hokusai')
+        cls.exhibition = Exhibition.objects.create(title='Waves', start_date=date(2026, 5, 1),
+                                                   end_date=date(2026, 6, 1), status='ONGOING')
+        Exhibition.objects.create(title='Past', start_date=date(2020, 1, 1), end_date=date(2020, 2, 1),
+                                  status='COMPLETED')
+        piece = ArtPiece.objects.create(title='The Great Wave', artist=artist, estimated_value=Decimal('10'))
+        ExhibitionArtPiece.objects.create(exhibition=cls.exhibition, art_piece=piece)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(SNAPSHOT_ROOT=directory.name))
+
+    def get(self, name, **headers):
+        return APIClient().get(f'/api/catalog/{name}/', headers=headers)
+
+    def test_served_without_queries_and_revalidated_by_etag(self):
+        snapshots.rebuild_stale()
+        expected = _json(ExhibitionSerializer([self.exhibition], many=True).data)
+        with self.assertNumQueries(0):
+            response = self.get('exhibitions')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(b''.join(response.streaming_content))['results'], expected)
+            self.assertEqual(self.get('exhibitions', if_none_match=response['ETag']).status_code, 304)
+
+            compressed = self.get('exhibitions', accept_encoding='gzip')
+            self.assertEqual(compressed['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(b''.join(compressed.streaming_content)),
+                             open(snapshots._path('exhibitions'), 'rb').read())
+            self.assertNotEqual(compressed['ETag'], response['ETag'])
+        self.assertEqual(self.get('registrations').status_code, 404)
+
+    def test_never_built_on_request(self):
+        with self.assertNumQueries(0):
+            response = self.get('artists')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '2'))
+        self.assertFalse(os.path.exists(snapshots._path('artists')))
+
+    def test_rebuilt_once_the_catalog_changes_settle(self):
+        self.assertEqual(snapshots.rebuild_stale(), ['exhibitions', 'artists'])
+        self.assertEqual(snapshots.rebuild_due(), [])
+        etag = self.get('artists')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Artist.objects.create(name='Hiroshige')
+        changed = time.time()
+        with self.captureOnCommitCallbacks(execute=True):
+            Artist.objects.create(name='Utamaro')
+        self.assertEqual(snapshots.rebuild_due(now=changed + 1), [])
+        self.assertEqual(snapshots.rebuild_due(now=changed + 3), ['artists'])
+        self.assertEqual(snapshots.rebuild_due(now=changed + 60), [])
+        response = self.get('artists', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(b''.join(response.streaming_content))['count'], 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ArtPieceImageTests(TestCase):
+    PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clerk = User.objects.create_user(username='curator', password='x', role='clerk')
+        cls.piece = ArtPiece.objects.create(title='Irises', artist=Artist.objects.create(name='Vincent'),
+                                            estimated_value=Decimal('10'))
+        cls.url = f'/api/artpieces/{cls.piece.id}/image/'
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=directory.name))
+        self.client = APIClient()
+        self.client.force_authenticate(self.clerk)
+
+    def upload(self, content, filename='irises.png'):
+        return self.client.post(self.url, {'image': SimpleUploadedFile(filename, content)}, format='multipart')
+
+    def test_upload_is_content_addressed_and_listed_as_thumbnails(self):
+        response = self.upload(self.PNG)
+        self.assertEqual(response.status_code, 200)
+        digest = hashlib.sha256(self.PNG).hexdigest()
+        self.assertEqual(ArtPiece.objects.get(pk=self.piece.pk).image, f"{digest}.png")
+        self.assertEqual(response.data['thumbnails']['200'], f"/api/images/{digest}/200.jpg")
+        self.assertNotIn('image', response.data)
+
+        listed = APIClient().get('/api/artpieces/').data['results'][0]
+        self.assertEqual(listed['thumbnails'], response.data['thumbnails'])
+        self.assertEqual(self.upload(b'MZ not an image').status_code, 400)
+
+    def test_range_and_etag_requests(self):
+        self.upload(self.PNG)
+        anonymous = APIClient()
+        full = anonymous.get(self.url)
+        self.assertEqual((full.status_code, full['Content-Type']), (200, 'image/png'))
+        self.assertEqual(b''.join(full.streaming_content), self.PNG)
+        self.assertEqual(anonymous.get(self.url, headers={'if-none-match': full['ETag']}).status_code, 304)
+
+        partial = anonymous.get(self.url, headers={'range': 'bytes=8-15'})
+        self.assertEqual((partial.status_code, partial['Content-Range']), (206, f"bytes 8-15/{len(self.PNG)}"))
+        self.assertEqual(b''.join(partial.streaming_content), self.PNG[8:16])
+        self.assertEqual(b''.join(anonymous.get(self.url, headers={'range': 'bytes=-4'}).streaming_content),
+                         self.PNG[-4:])
+        self.assertEqual(anonymous.get(self.url, headers={'range': f'bytes={len(self.PNG)}-'}).status_code, 416)
+        stale = anonymous.get(self.url, headers={'range': 'bytes=8-15', 'if-range': '"other"'})
+        self.assertEqual(stale.status_code, 200)
+
+    @skipIf(images.Image is not None, 'Pillow renders real thumbnails')
+    def test_thumbnail_falls_back_to_the_original_without_pillow(self):
+        thumbnails = self.upload(self.PNG).data['thumbnails']
+        response = APIClient().get(thumbnails['400'])
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'image/png'))
+        self.assertEqual(APIClient().get(thumbnails['400'].replace('400', '401')).status_code, 404)
+
+
+class StructuredLoggingTests(TestCase):
+
+    def test_records_are_written_as_json_off_the_request_thread(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = f"{directory.name}/app.log"
+        handler = logs.QueueingHandler(filename=path, sample_rates={'test.sampled': 0.0})
+        parent = logging.getLogger('test')
+        parent.addHandler(handler)
+        parent.propagate = False
+        self.addCleanup(setattr, parent, 'propagate', True)
+        self.addCleanup(parent.removeHandler, handler)
+        logger = logging.getLogger('test.structured')
+
+        token = logs.request_id.set('req-1')
+        try:
+            logger.warning('Seat %s taken', 7, extra={'exhibition_id': 3})
+            sampled = logging.getLogger('test.sampled')
+            sampled.setLevel(logging.INFO)
+            sampled.info('Dropped')
+            try:
+                raise ValueError('boom')
+            except ValueError:
+                logger.exception('Failed')
+        finally:
+            logs.request_id.reset(token)
+        handler.stop()
+
+        with open(path) as f:
+            entries = [json.loads(line) for line in f]
+        self.assertEqual(
+            [(e['message'], e['request_id'], e.get('exhibition_id')) for e in entries],
+            [('Seat 7 taken', 'req-1', 3), ('Failed', 'req-1', None)],
+        )
+        self.assertIn('ValueError: boom', entries[1]['exception'])
+
+    def test_sampling_keeps_whole_requests_and_all_warnings(self):
+        sampler = logs.SamplingFilter({'core.registrations': 0.5})
+
+        def kept(name, level, rid):
+            return sampler.filter(logging.makeLogRecord({'name': name, 'levelno': level, 'request_id': rid}))
+
+        rids = [f"r{i}" for i in range(200)]
+        decisions = [kept('core.registrations', logging.INFO, rid) for rid in rids]
+        self.assertTrue(40 < sum(decisions) < 160)
+        self.assertEqual(decisions, [kept('core.registrations.child', logging.DEBUG, rid) for rid in rids])
+        self.assertTrue(all(kept('core.registrations', logging.WARNING, rid) for rid in rids))
+        self.assertTrue(all(kept('core.views', logging.INFO, rid) for rid in rids))
+
+    def test_request_id_echoed_or_generated(self):
+        self.assertEqual(APIClient().get('/api/health/', headers={'x-request-id': 'edge-42'})['X-Request-ID'], 'edge-42')
+        self.assertEqual(len(APIClient().get('/api/health/', headers={'x-request-id': 'bad id!'})['X-Request-ID']), 32)
+
+
+class RequestProfilingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.admin = User.objects.create_user(username='profiler', password='x', role='admin')
+        cls.clerk = User.objects.create_user(username='counter', password='x', role='clerk')
+        Artist.objects.create(name='Kahlo')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.enterContext(override_settings(PROFILE_ROOT=directory.name, PROFILE_KEEP=2))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client
+
+    def test_only_admins_can_profile_and_read_profiles(self):
+        response = self.client_for(self.clerk).get('/api/artists/', headers={'x-profile': 'cprofile'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-ID', response)
+        self.assertEqual(self.client_for(self.clerk).get('/api/profiles/').status_code, 403)
+        self.assertNotIn('X-Profile-ID', APIClient().get('/api/artists/?_profile=cprofile'))
+        self.assertEqual(profiling.list_profiles(), [])
+
+    def test_profile_stored_with_sql_and_allocations(self):
+        client = self.client_for(self.admin)
+        profile_id = client.get('/api/artists/?_profile=cprofile,memory')['X-Profile-ID']
+
+        profile = client.get(f'/api/profiles/{profile_id}/').data
+        self.assertEqual((profile['path'], profile['status'], profile['mode']),
+                         ('/api/artists/?_profile=cprofile,memory', 200, 'cprofile'))
+        self.assertTrue(any('core_artist' in query['sql'] for query in profile['queries']))
+        self.assertEqual(profile['query_count'], len(profile['queries']))
+        self.assertGreater(profile['memory']['peak_bytes'], 0)
+        self.assertIn('function calls', profile['stats'])
+
+        download = client.get(f'/api/profiles/{profile_id}/download/')
+        self.assertIn(f'{profile_id}.prof', download['Content-Disposition'])
+        self.assertGreater(len(b''.join(download.streaming_content)), 0)
+        self.assertEqual(client.get('/api/profiles/0000000000000-00000000/').status_code, 404)
+
+    def test_only_the_newest_profiles_are_kept(self):
+        client = self.client_for(self.admin)
+        ids = [client.get('/api/artists/', headers={'x-profile': ''})['X-Profile-ID'] for _ in range(3)]
+        listed = client.get('/api/profiles/').data
+        self.assertEqual([p['id'] for p in listed['results']], sorted(ids)[:0:-1])
+        self.assertIsNone(profiling.load(min(ids)))
+
+
+class IdempotencyKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='retrier', password='x')
+
+    def post(self, handler, data, key='order-1'):
+        view = type('IdempotentView', (APIView,), {'post': idempotency.idempotent(handler)}).as_view()
+        request = APIRequestFactory().post('/api/orders/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+        force_authenticate(request, self.user)
+        return view(request)
+
+    def test_replay_and_key_reuse_for_another_body(self):
+        calls = []
+
+        def handler(view, request):
+            calls.append(request.data)
+            return Response({'order': len(calls)}, status=201)
+
+        first = self.post(handler, {'seats': 2})
+        replay = self.post(handler, {'seats': 2})
+        self.assertEqual((replay.status_code, replay.data, replay[idempotency.REPLAY_HEADER]), (201, {'order': 1}, 'true'))
+        self.assertNotIn(idempotency.REPLAY_HEADER, first)
+        self.assertEqual(self.post(handler, {'seats': 3}).status_code, 422)
+        self.assertEqual(len(calls), 1)
+
+    def test_in_flight_key_conflicts_until_its_lease_runs_out(self):
+        retries = []
+
+        def retry(view, request):
+            return Response({'by': 'retry'}, status=201)
+
+        def original(view, request):
+            retries.append(self.post(retry, request.data).status_code)
+            # The original worker stalls past its lease; the next retry takes over
+            IdempotencyKey.objects.update(claimed_at=timezone.now() - idempotency.get_lease())
+            retries.append(self.post(retry, request.data).status_code)
+            return Response({'by': 'original'}, status=201)
+
+        self.assertEqual(self.post(original, {'seats': 1}).status_code, 201)
+        self.assertEqual(retries, [409, 201])
+        # The stalled original lost the key and must not overwrite the retry's response
+        self.assertEqual(self.post(retry, {'seats': 1}).data, {'by': 'retry'})
+
+    def test_server_error_releases_the_key(self):
+        statuses = [503, 201]
+
+        def handler(view, request):
+            return Response({}, status=statuses.pop(0))
+
+        self.assertEqual(self.post(handler, {'seats': 2}).status_code, 503)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        response = self.post(handler, {'seats': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(idempotency.REPLAY_HEADER, response)
+
+
+@override_settings(REGISTRATION_INTAKE_MODE='buffered')
+class RegistrationIntakeTests(TestCase):
+    databases = {'default', 'intake'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.amara = User.objects.create_user(username='amara', password='x', email='amara@example.com')
+        cls.bongani = User.objects.create_user(username='bongani', password='x', email='bongani@example.com')
+        cls.exhibition = Exhibition.objects.create(title='Intake', start_date=date(2026, 5, 1),
+                                                   end_date=date(2026, 6, 1), status='UPCOMING')
+
+    def submit(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/registrations/', {'exhibition': self.exhibition.id}, format='json')
+        self.assertEqual(response.status_code, 202)
+        return response.data['tracking_id']
+
+    def poll(self, user, tracking_id):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(f'/api/registrations/intake/{tracking_id}/')
+
+    def test_router_keeps_the_journal_in_its_own_database(self):
+        self.assertEqual(router.db_for_write(RegistrationIntake), 'intake')
+        self.assertEqual(router.db_for_read(Registration), 'default')
+        self.assertTrue(router.allow_migrate('intake', 'core', model_name='registrationintake'))
+        self.assertFalse(router.allow_migrate('default', 'core', model_name='registrationintake'))
+        self.assertFalse(router.allow_migrate('intake', 'core', model_name='registration'))
+
+    def test_drain_applies_in_submission_order(self):
+        first = self.submit(self.amara)
+        second = self.submit(self.bongani)
+        duplicate = self.submit(self.amara)
+        self.assertEqual((self.poll(self.bongani, second).data['status'],
+                          self.poll(self.bongani, second).data['queued_ahead']), ('QUEUED', 1))
+        self.assertEqual(self.poll(self.bongani, first).status_code, 404)
+
+        result = intake.drain()
+        self.assertEqual((result.applied, result.rejected), (2, 1))
+        outcomes = [self.poll(user, tracking_id).data for user, tracking_id in
+                    [(self.amara, first), (self.bongani, second), (self.amara, duplicate)]]
+        self.assertEqual([(o['status'], o['queue_position']) for o in outcomes],
+                         [('APPLIED', 1), ('APPLIED', 2), ('REJECTED', None)])
+        self.assertIn('already registered', outcomes[2]['error'])
+        self.assertEqual(Registration.objects.get(pk=outcomes[1]['registration_id']).visitor.email,
+                         'bongani@example.com')
+
+    def test_batch_replayed_after_interrupted_journal_update_is_applied(self):
+        tracking_ids = [self.submit(self.amara), self.submit(self.bongani)]
+
+        def fail_journal_update(execute, sql, params, many, context):
+            if sql.startswith('UPDATE'):
+                raise OperationalError('disk I/O error')
+            return execute(sql, params, many, context)
+
+        # The registrations commit, then the process dies updating the journal
+        with connections['intake'].execute_wrapper(fail_journal_update):
+            with self.assertRaises(OperationalError):
+                intake.drain()
+        registrations = dict(Registration.objects.values_list('visitor__email', 'id'))
+        self.assertEqual(RegistrationIntake.objects.filter(status='QUEUED').count(), 2)
+
+        result = intake.drain()
+        self.assertEqual((result.applied, result.rejected), (2, 0))
+        self.assertEqual(dict(Registration.objects.values_list('visitor__email', 'id')), registrations)
+        for user, tracking_id in zip([self.amara, self.bongani], tracking_ids):
+            outcome = self.poll(user, tracking_id).data
+            self.assertEqual((outcome['status'], outcome['registration_id'], outcome['error']),
+                             ('APPLIED', registrations[user.email], ''))
+
+
+class UnreachableEmailBackend(BaseEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP server unreachable')
+
+
+@override_settings(NOTIFICATION_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+                   NOTIFICATION_RETRY_BASE_SECONDS=30)
+class NotificationOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        clerk = User.objects.create_user(username='desk', password='x', role='clerk')
+        exhibition = Exhibition.objects.create(title='Letters', start_date=date(2026, 5, 1),
+                                               end_date=date(2026, 6, 1))
+        cls.registration = Registration.objects.create(
+            visitor=Visitor.objects.create(name='Chidi', email='chidi@example.com'), exhibition=exhibition)
+        cls.registration.approve(clerk)
+
+    def test_claimed_rows_are_sent_once(self):
+        result = notifications.deliver_batch()
+        self.assertEqual((result.sent, result.processed), (1, 1))
+        self.assertEqual([m.to for m in mail.outbox], [['chidi@example.com']])
+        self.assertIn('Letters', mail.outbox[0].subject)
+        self.assertTrue(Registration.objects.get(pk=self.registration.pk).visitor_notified)
+        self.assertEqual(notifications.claim_batch(), [])
+
+    def test_expired_lease_is_reclaimed_and_the_stale_worker_loses_its_claim(self):
+        [stale] = notifications.claim_batch()
+        self.assertEqual(notifications.claim_batch(), [])
+        NotificationOutbox.objects.update(claimed_at=timezone.now() - timedelta(minutes=6))
+        [current] = notifications.claim_batch()
+        self.assertNotEqual(current.claim_token, stale.claim_token)
+
+        result = notifications._record(stale.claim_token, [stale], [], max_attempts=5)
+        self.assertEqual(result.processed, 0)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.claim_token, row.attempts), ('SENDING', current.claim_token, 0))
+
+    @override_settings(NOTIFICATION_EMAIL_BACKEND='core.tests.UnreachableEmailBackend')
+    def test_failed_sends_back_off_then_fail(self):
+        self.assertEqual([notifications.backoff(n).total_seconds() for n in (1, 2, 3)], [30, 60, 120])
+
+        self.assertEqual(notifications.deliver_batch(max_attempts=2).retrying, 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts), ('PENDING', 1))
+        self.assertIn('SMTP server unreachable', row.last_error)
+        self.assertGreater(row.next_attempt_at, timezone.now() + timedelta(seconds=25))
+        self.assertEqual(notifications.deliver_batch(max_attempts=2).processed, 0)  # Not due yet
+
+        NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(notifications.deliver_batch(max_attempts=2).failed, 1)
+        row = NotificationOutbox.objects.get()
+        self.assertEqual((row.status, row.attempts, row.claim_token), ('FAILED', 2, None))
+        self.assertFalse(Registration.objects.get(pk=self.registration.pk).visitor_notified)
+
+
+class QueueStreamTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.clerk = User.objects.create_user(username='door', password='x', role='clerk')
+        cls.user = User.objects.create_user(username='lindiwe', password='x', email='lindiwe@example.com')
+        cls.exhibition = Exhibition.objects.create(title='Queue', start_date=date(2026, 5, 1),
+                                                   end_date=date(2026, 6, 1))
+        cls.other = Exhibition.objects.create(title='Elsewhere', start_date=date(2026, 5, 1),
+                                              end_date=date(2026, 6, 1))
+        cls.first, cls.second = [
+            Registration.objects.create(visitor=Visitor.objects.create(name=name, email=f"{name}@example.com"),
+                                        exhibition=cls.exhibition)
+            for name in ('ayo', 'lindiwe')
+        ]
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+        self.hub = realtime.QueueHub(realtime.InProcessBroker())
+
+    def subscribe(self, email, registrations=()):
+        subscription = realtime.Subscription(email, [], [
+            {'registration_id': r.id, 'exhibition_id': r.exhibition_id, 'exhibition_title': r.exhibition.title,
+             'status': r.status, 'queue_position': r.queue_position}
+            for r in registrations
+        ], self.loop)
+        subscription.visitor_ids = {r.visitor_id for r in registrations}
+        self.hub.add(subscription)
+        return subscription
+
+    def pushed(self, subscription):
+        self.loop.run_until_complete(asyncio.sleep(0))
+        updates = []
+        while not subscription.queue.empty():
+            updates.append(subscription.queue.get_nowait())
+        return [(u['registration_id'], u['status'], u['queue_position']) for u in updates]
+
+    def change(self, registration, status, vacated):
+        return {'registration_id': registration.id, 'visitor_id': registration.visitor_id,
+                'exhibition_id': registration.exhibition_id, 'status': status, 'vacated_position': vacated}
+
+    def test_dispatch_moves_up_everyone_behind_the_vacated_slot(self):
+        leaving = self.subscribe('ayo@example.com', [self.first])
+        waiting = self.subscribe('lindiwe@example.com', [self.second])
+        elsewhere = self.subscribe('kofi@example.com', [Registration.objects.create(
+            visitor=Visitor.objects.create(name='kofi', email='kofi@example.com'), exhibition=self.other)])
+
+        self.hub.dispatch(self.change(self.first, 'APPROVED', 1))
+        self.assertEqual(self.pushed(leaving), [(self.first.id, 'APPROVED', None)])
+        self.assertEqual(self.pushed(waiting), [(self.second.id, 'PENDING', 1)])
+        self.assertEqual(self.pushed(elsewhere), [])
+
+        # The approved visitor no longer follows this queue
+        self.hub.dispatch(self.change(self.second, 'CANCELLED', 1))
+        self.assertEqual(self.pushed(leaving), [])
+
+    def test_registrations_made_while_streaming_are_tracked(self):
+        realtime.get_hub().add(subscription := self.subscribe('lindiwe@example.com', [self.second]))
+        self.addCleanup(realtime.get_hub().remove, subscription)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            joined = Registration.objects.create(visitor=self.second.visitor, exhibition=self.other)
+        self.assertEqual(self.pushed(subscription), [(joined.id, 'PENDING', 1)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.create(visitor=Visitor.objects.create(name='kofi', email='kofi@example.com'),
+                                        exhibition=self.other)
+            Registration.objects.get(pk=joined.pk).approve(self.clerk)
+        self.assertEqual(self.pushed(subscription), [(joined.id, 'APPROVED', None)])
+        with self.captureOnCommitCallbacks(execute=True):
+            Registration.objects.get(visitor__name='kofi').cancel()
+        self.assertEqual(self.pushed(subscription), [])
+
+    def stream(self, query, on_snapshot=None):
+        messages = []
+
+        async def run():
+            disconnected = asyncio.Event()
+
+            async def receive():
+                await disconnected.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                messages.append(message)
+                body = message.get('body', b'')
+                if body.startswith(b'event: snapshot') and on_snapshot:
+                    on_snapshot()
+                elif body.startswith(b'event: '):
+                    disconnected.set()
+
+            scope = {'type': 'http', 'method': 'GET', 'path': realtime.STREAM_PATH, 'headers': [],
+                     'query_string': query.encode()}
+            await realtime.queue_stream(scope, receive, send)
+
+        async_to_sync(run)()
+        return messages
+
+    def test_stream_opens_with_a_ticket_but_not_with_an_access_token(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ticket = client.post('/api/registrations/stream/ticket/').data
+        self.assertEqual(ticket['expires_in'], 60)
+
+        def approve_first():
+            realtime.get_broker().publish(self.change(self.first, 'APPROVED', 1))
+
+        messages = self.stream(ticket['stream_url'].partition('?')[2], on_snapshot=approve_first)
+        self.assertEqual(messages[0]['status'], 200)
+        snapshot = json.loads(messages[1]['body'].decode().split('data: ')[1])
+        self.assertEqual([r['registration_id'] for r in snapshot['pending_registrations']], [self.second.id])
+        update = json.loads(messages[2]['body'].decode().split('data: ')[1])
+        self.assertEqual((update['registration_id'], update['queue_position']), (self.second.id, 1))
+
+        self.assertEqual(self.stream(f"token={AccessToken.for_user(self.user)}")[0]['status'], 401)
+        with override_settings(QUEUE_STREAM_TICKET_MAX_AGE=-1):
+            self.assertEqual(self.stream(ticket['stream_url'].partition('?')[2])[0]['status'], 401)
+
+    def rows(self, *registrations):
+        return [{'id': r.id, 'visitor_id': r.visitor_id, 'exhibition_id': r.exhibition_id,
+                 'exhibition__title': r.exhibition.title, 'status': r.status, 'queue_position': r.queue_position}
+                for r in registrations]
+
+    def test_changes_buffered_around_the_snapshot_are_replayed_once(self):
+        before, after = self.rows(self.first, self.second), self.rows(self.first, self.second)
+        after[0].update(status='APPROVED', queue_position=None)
+        after[1].update(queue_position=1)
+        listening = [realtime.Subscription('lindiwe@example.com', [self.second.visitor_id], [], self.loop)
+                     for _ in range(2)]
+        for subscription in listening:
+            self.hub.listen(subscription)
+        self.hub.dispatch(self.change(self.first, 'APPROVED', 1))
+
+        # The change arrived while the snapshot was being read: read it again
+        self.assertIsNone(self.hub.start(listening[0], before, seen=0))
+        # Read before the change: it is replayed on top
+        snapshot = self.hub.start(listening[0], before, seen=1)
+        self.assertEqual([(e['registration_id'], e['queue_position']) for e in snapshot], [(self.second.id, 2)])
+        self.assertEqual(self.pushed(listening[0]), [(self.second.id, 'PENDING', 1)])
+        # Read after the change: the snapshot already has it
+        snapshot = self.hub.start(listening[1], after, seen=1)
+        self.assertEqual([(e['registration_id'], e['queue_position']) for e in snapshot], [(self.second.id, 1)])
+        self.assertEqual(self.pushed(listening[1]), [])
+
+    def test_change_committed_while_the_stream_opens_is_not_lost(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        query = client.post('/api/registrations/stream/ticket/').data['stream_url'].partition('?')[2]
+        approved = []
+
+        def approve_after_snapshot(execute, sql, params, many, context):
+            result = execute(sql, params, many, context)
+            if not approved and 'FROM "core_registration"' in sql:
+                approved.append(True)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Registration.objects.get(pk=self.first.pk).approve(self.clerk)
+            return result
+
+        with connections['default'].execute_wrapper(approve_after_snapshot):
+            messages = self.stream(query)
+        snapshot = json.loads(messages[1]['body'].decode().split('data: ')[1])
+        self.assertEqual([(r['registration_id'], r['queue_position']) for r in snapshot['pending_registrations']],
+                         [(self.second.id, 1)])
+        self.assertEqual(realtime.get_hub()._buffering, set())
+
+
+@override_settings(SYNC_SETTLE_WINDOW=timedelta(0))
+class CatalogSyncTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.moment = timezone.now() - timedelta(minutes=5)
+        self.artists = [Artist.objects.create(name=name) for name in ('Ama', 'Bisi', 'Chike', 'Dayo')]
+        # Three share a timestamp, so paging has to break the tie on id
+        Artist.objects.filter(pk__in=[a.pk for a in self.artists[:3]]).update(updated_at=self.moment)
+        Artist.objects.filter(pk=self.artists[3].pk).update(updated_at=self.moment + timedelta(seconds=1))
+
+    def sync(self, token=None, limit=None):
+        params = {key: value for key, value in (('since', token), ('limit', limit)) if value is not None}
+        response = self.client.get('/api/sync/', params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_token_round_trip(self):
+        issued_at = timezone.now()
+        token = sync.encode_token({'artists': [self.moment.isoformat(), 7]}, issued_at)
+        self.assertEqual(sync.decode_token(token), ({'artists': (self.moment, 7)}, issued_at))
+        self.assertEqual(sync.decode_token(''), ({}, None))
+
+        for bad in ('not a token', sync.encode_token({}, issued_at).replace('e', 'x', 1)):
+            with self.assertRaises(sync.InvalidToken):
+                sync.decode_token(bad)
+        with self.assertRaises(sync.ExpiredToken):
+            sync.decode_token(sync.encode_token({}, issued_at - timedelta(days=91)))
+
+        self.assertEqual(self.client.get('/api/sync/', {'since': 'garbage'}).status_code, 400)
+        stale = sync.encode_token({}, issued_at - timedelta(days=91))
+        self.assertEqual(self.client.get('/api/sync/', {'since': stale}).status_code, 410)
+
+    def test_pages_walk_every_row_once_in_keyset_order(self):
+        seen = []
+        page = self.sync(limit=2)
+        seen += [row['id'] for row in page['artists']]
+        self.assertTrue(page['has_more'])
+        page = self.sync(page['token'], limit=2)
+        seen += [row['id'] for row in page['artists']]
+        self.assertFalse(page['has_more'])
+        self.assertEqual(seen, [a.pk for a in self.artists])
+
+        # Nothing new, then only the row that changed
+        page = self.sync(page['token'])
+        self.assertEqual(page['artists'], [])
+        self.artists[1].save()
+        self.assertEqual([row['id'] for row in self.sync(page['token'])['artists']], [self.artists[1].pk])
+
+    def test_rows_inside_the_settle_window_wait_for_the_next_sync(self):
+        token = self.sync()['token']
+        late = Artist.objects.create(name='Ebere')
+        with override_settings(SYNC_SETTLE_WINDOW=timedelta(seconds=30)):
+            page = self.sync(token)
+            self.assertEqual(page['artists'], [])
+            Artist.objects.filter(pk=late.pk).update(updated_at=timezone.now() - timedelta(minutes=1))
+            self.assertEqual([row['id'] for row in self.sync(page['token'])['artists']], [late.pk])
+
+    def test_deletions_are_reported_from_tombstones(self):
+        piece = ArtPiece.objects.create(title='Kora', artist=self.artists[0], estimated_value=500)
+        exhibition = Exhibition.objects.create(title='Strings', start_date=date(2026, 5, 1),
+                                               end_date=date(2026, 6, 1))
+        booking = ExhibitionArtPiece.objects.create(exhibition=exhibition, art_piece=piece)
+        full = self.sync()
+        self.assertEqual(full['deleted'], {name: [] for name in sync.STREAMS})
+
+        artist_id = self.artists[3].pk
+        self.artists[3].delete()
+        # Set-based deletes bypass post_delete and record their own tombstones
+        sync.record_tombstones(ExhibitionArtPiece, [booking.pk])
+        self.assertEqual(
+            list(CatalogTombstone.objects.values_list('model', 'object_id')),
+            [('artist', artist_id), ('exhibitionartpiece', booking.pk)],
+        )
+
+        deleted = self.sync(full['token'])['deleted']
+        self.assertEqual(deleted['artists'], [artist_id])
+        self.assertEqual(deleted['exhibition_art_pieces'], [booking.pk])
+        # A full sync only moves past the deletion history
+        self.assertEqual(self.sync()['deleted'], {name: [] for name in sync.STREAMS})
@@ -0,0 +1,247 @@
+"""
+Collection valuation analytics.
+
+``ValuationRollup`` holds count, total, min and max ``estimated_value`` per
+artist, nationality, status and exhibition. Changes to art pieces, exhibition
+links, artists and exhibitions mark the affected groups in
+``ValuationDirtyKey`` inside the same transaction; saves don't refresh
+anything themselves. ``refresh_dirty`` recomputes just the marked groups,
+one grouped query per dimension, however many saves marked them. It runs
+periodically (``refresh_valuation_rollups --every <seconds>``), so rollups
+trail the catalog by up to that interval. ``refresh_all`` rebuilds
+everything (``refresh_valuation_rollups --full``).
+
+Percentiles and histograms can't be rolled up, so ``distribution`` computes
+them from a single ``values_list`` pass over the matching pieces. Values are
+cast to float in SQL, so no Decimal objects are built. NumPy is used when it
+is installed; the pure-Python fallback gives the same results (linear
+interpolation, NumPy-style bin edges).
+"""
+import bisect
+from collections import defaultdict
+
+from django.db import models, transaction
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import (
+    Artist, ArtPiece, ExhibitionArtPiece, ValuationDirtyKey, ValuationRollup
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional dependency
+    numpy = None
+
+ALL = '*'
+
+# Dimension -> (grouping lookup on ArtPiece, label lookup or None)
+DIMENSIONS = {
+    'artist': ('artist_id', 'artist__name'),
+    'nationality': ('artist__nationality', None),
+    'status': ('status', None),
+    'exhibition': ('exhibitionartpiece__exhibition_id', 'exhibitionartpiece__exhibition__title'),
+}
+
+STATUS_LABELS = dict(ArtPiece.STATUS_CHOICES)
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+
+# ---------------------------
+# Rollups
+# ---------------------------
+
+def _label(dimension, key, row_label):
+    if dimension == 'status':
+        return STATUS_LABELS.get(key, key)
+    if dimension == 'nationality':
+        return key or 'Unknown'
+    return row_label or ''
+
+
+def refresh(dimension, keys=None):
+    """Recompute ``dimension`` for ``keys`` (all groups when None); returns rows written"""
+    lookup, label_lookup = DIMENSIONS[dimension]
+    queryset = ArtPiece.objects.order_by()
+    if dimension == 'exhibition':
+        queryset = queryset.filter(exhibitionartpiece__isnull=False)
+    if keys is not None:
+        keys = set(keys)
+        match = Q(**{f"{lookup}__in": [key for key in keys if key != '']})
+        if '' in keys:
+            match |= Q(**{f"{lookup}__isnull": True}) | Q(**{lookup: ''})
+        queryset = queryset.filter(match)
+
+    group_by = [lookup, label_lookup] if label_lookup else [lookup]
+    rows = queryset.values(*group_by).annotate(
+        pieces=Count('id'), total=Sum('estimated_value'),
+        low=Min('estimated_value'), high=Max('estimated_value'),
+    )
+
+    now = timezone.now()
+    rollups = {}
+    for row in rows:
+        key = '' if row[lookup] is None else str(row[lookup])
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollups[key] = ValuationRollup(
+                dimension=dimension, key=key,
+                label=_label(dimension, key, row.get(label_lookup)),
+                piece_count=row['pieces'], total_value=row['total'],
+                min_value=row['low'], max_value=row['high'], refreshed_at=now,
+            )
+        else:
+            # NULL and '' nationalities both land in the '' group
+            rollup.piece_count += row['pieces']
+            rollup.total_value += row['total']
+            rollup.min_value = min(rollup.min_value, row['low'])
+            rollup.max_value = max(rollup.max_value, row['high'])
+
+    with transaction.atomic():
+        ValuationRollup.objects.bulk_create(
+            rollups.values(),
+            update_conflicts=True,
+            unique_fields=['dimension', 'key'],
+            update_fields=['label', 'piece_count', 'total_value', 'min_value', 'max_value', 'refreshed_at'],
+        )
+        stale = ValuationRollup.objects.filter(dimension=dimension).exclude(key__in=rollups)
+        if keys is not None:
+            stale = stale.filter(key__in=keys)
+        stale.delete()
+    return len(rollups)
+
+
+def refresh_all():
+    """Rebuild every dimension and clear the dirty queue"""
+    with transaction.atomic():
+        ValuationDirtyKey.objects.all().delete()
+        return {dimension: refresh(dimension) for dimension in DIMENSIONS}
+
+
+def refresh_dirty():
+    """Refresh the groups marked dirty so far; returns the number of keys processed"""
+    with transaction.atomic():
+        dirty = list(ValuationDirtyKey.objects.values_list('id', 'dimension', 'key'))
+        if not dirty:
+            return 0
+        keys = defaultdict(set)
+        for _, dimension, key in dirty:
+            keys[dimension].add(key)
+        for dimension, dimension_keys in keys.items():
+            refresh(dimension, None if ALL in dimension_keys else dimension_keys)
+        ValuationDirtyKey.objects.filter(id__in=[row[0] for row in dirty]).delete()
+    return len(dirty)
+
+
+def mark_dirty(groups):
+    """Queue ``(dimension, key)`` pairs for the next ``refresh_dirty``"""
+    groups = {(dimension, '' if key is None else str(key)) for dimension, key in groups}
+    if not groups:
+        return
+    ValuationDirtyKey.objects.bulk_create(
+        [ValuationDirtyKey(dimension=dimension, key=key) for dimension, key in groups],
+        ignore_conflicts=True,
+    )
+
+
+# ---------------------------
+# Change receivers
+# ---------------------------
+
+def _loaded(instance, attname):
+    value = getattr(instance, '_loaded_values', {}).get(attname)
+    return None if value is models.DEFERRED else value
+
+
+def art_piece_changed(sender, instance, **kwargs):
+    """``post_save``/``post_delete`` receiver for ``ArtPiece``"""
+    artist_ids = {instance.artist_id, _loaded(instance, 'artist_id')} - {None}
+    statuses = {instance.status, _loaded(instance, 'status')} - {None}
+    groups = {('artist', artist_id) for artist_id in artist_ids}
+    groups |= {('status', status) for status in statuses}
+    groups |= {
+        ('nationality', nationality)
+        for nationality in Artist.objects.filter(id__in=artist_ids).values_list('nationality', flat=True)
+    }
+    groups |= {
+        ('exhibition', exhibition_id)
+        for exhibition_id in ExhibitionArtPiece.objects.filter(art_piece_id=instance.pk)
+        .values_list('exhibition_id', flat=True)
+    }
+    mark_dirty(groups)
+
+
+def exhibition_link_changed(sender, instance, **kwargs):
+    """``post_save``/``post_delete`` receiver for ``ExhibitionArtPiece``"""
+    mark_dirty(
+        ('exhibition', exhibition_id)
+        for exhibition_id in {instance.exhibition_id, _loaded(instance, 'exhibition_id')} - {None}
+    )
+
+
+def artist_changed(sender, instance, created=False, **kwargs):
+    """``post_save`` receiver for ``Artist``: name and nationality are rolled up"""
+    if not created:
+        # The previous nationality isn't known, so that dimension is rebuilt
+        mark_dirty([('artist', instance.pk), ('nationality', ALL)])
+
+
+def exhibition_changed(sender, instance, created=False, **kwargs):
+    """``post_save`` receiver for ``Exhibition``: titles are rolled up"""
+    if not created:
+        mark_dirty([('exhibition', instance.pk)])
+
+
+# ---------------------------
+# Distributions
+# ---------------------------
+
+def value_column(queryset):
+    """``estimated_value`` of every piece in ``queryset`` as floats, in one pass"""
+    rows = queryset.order_by().values_list(Cast('estimated_value', models.FloatField()), flat=True)
+    if numpy is not None:
+        return numpy.fromiter(rows.iterator(chunk_size=10000), dtype=float)
+    return sorted(rows.iterator(chunk_size=10000))
+
+
+def _percentile(sorted_values, q):
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def _histogram(sorted_values, bins):
+    low, high = sorted_values[0], sorted_values[-1]
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    edges = [low + (high - low) * i / bins for i in range(bins)] + [high]
+    # Bins are half-open except the last, which includes its upper edge
+    counts = [
+        bisect.bisect_left(sorted_values, edges[i + 1]) - bisect.bisect_left(sorted_values, edges[i])
+        for i in range(bins - 1)
+    ]
+    counts.append(len(sorted_values) - bisect.bisect_left(sorted_values, edges[bins - 1]))
+    return edges, counts
+
+
+def distribution(values, percentiles=DEFAULT_PERCENTILES, bins=20):
+    """Percentiles and histogram for a column from ``value_column``"""
+    count = len(values)
+    result = {'count': count, 'engine': 'numpy' if numpy is not None else 'python'}
+    if not count:
+        result.update(percentiles={}, histogram={'edges': [], 'counts': []})
+        return result
+
+    if numpy is not None:
+        points = numpy.percentile(values, percentiles).tolist()
+        counts, edges = numpy.histogram(values, bins=bins)
+        counts, edges = counts.tolist(), edges.tolist()
+    else:
+        points = [_percentile(values, q) for q in percentiles]
+        edges, counts = _histogram(values, bins)
+
+    result['percentiles'] = {f"p{q:g}": round(value, 2) for q, value in zip(percentiles, points)}
+    result['histogram'] = {'edges': [round(edge, 2) for edge in edges], 'counts': counts}
+    return result
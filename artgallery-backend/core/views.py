@@ -1,9 +1,16 @@
 from django.contrib.auth import get_user_model, authenticate
+from django.core.cache import cache
 from django.utils import timezone
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.exceptions import ValidationError
+from django.http import FileResponse, Http404, JsonResponse
+from django.views.decorators.http import require_safe
 from django.db import models, transaction, IntegrityError
-from django.db.models import Max,F
-from rest_framework import viewsets, filters, generics, status
+from django.db.models import Max,F, Min, Sum, Count
+from datetime import date
+from decimal import Decimal
+from rest_framework import viewsets, filters, generics, serializers, status
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -11,28 +18,38 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import AllowAny
 
-import logging,traceback
+import logging
 import json
+import os
+from urllib.parse import urlencode
 
 # Set up logging
 logger = logging.getLogger(__name__)
+# Per-request registration events; busy enough to sample (LOG_SAMPLE_RATES)
+registration_logger = logging.getLogger('core.registrations')
 
 User = get_user_model()
 
 from .models import (
     Artist, ArtPiece, Exhibition, ExhibitionArtPiece,
-    Visitor, Registration, Clerk, SetupStatus
+    Visitor, Registration, Clerk, SetupStatus, RegistrationIntake, ValuationDirtyKey, ValuationRollup,
+    ArchivedRegistration
 )
 
 from .serializers import (
+    SparseFieldsetMixin,
     ArtistSerializer, ArtPieceSerializer, ExhibitionSerializer,
     ExhibitionArtPieceSerializer, VisitorSerializer,
     RegistrationSerializer, ClerkSerializer, SetupStatusSerializer,
     UserSerializer, UserRegistrationSerializer,
-    RegistrationCreateSerializer
+    RegistrationCreateSerializer, VisitorRegistrationSerializer, ArchivedRegistrationSerializer
 )
+from .idempotency import idempotent
+from . import archive, bookings, caching, conflicts, expansion, fastpath, images, intake, profiling, realtime, responsecache, snapshots, sync, valuation
 
 # ---------------------------
 # Custom Permission Classes
@@ -57,6 +74,13 @@ class IsClerkOrAdminOrReadOnly(IsAuthenticatedOrReadOnly):
         return (request.user and request.user.is_authenticated and 
                 getattr(request.user, 'role', None) in ['clerk', 'admin'])
 
+class IsAdminRole(IsAuthenticated):
+    """
+    Only users with the admin role, for reads as well as writes.
+    """
+    def has_permission(self, request, view):
+        return super().has_permission(request, view) and getattr(request.user, 'role', None) == 'admin'
+
 # ---------------------------
 # Authentication Views
 # ---------------------------
@@ -133,11 +157,75 @@ class LogoutView(APIView):
             logger.error(f"Logout error: {e}")
             return Response({"detail": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
 
+# ---------------------------
+# Query Planning (?fields=, ?exclude=, ?include=)
+# ---------------------------
+
+class QueryPlanningMixin:
+    """
+    Shapes list/detail querysets to what the response will actually render.
+    
+    Handles ``?fields=``/``?exclude=`` (only the needed columns and joins) and
+    ``?include=`` (embedded relations), turning both into the minimal
+    ``select_related``/``Prefetch`` set so every page costs a fixed number
+    of queries.
+    """
+    
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if not issubclass(serializer_class, SparseFieldsetMixin):
+            return queryset
+        
+        include = expansion.requested_include(self.request)
+        expansion.validate_include(serializer_class, include)
+        keep = serializer_class.sparse_field_names(self.request, serializer_class().fields.keys())
+        query_plan = expansion.plan(serializer_class, queryset.model, keep, include)
+        return query_plan.apply(queryset, narrow=keep is not None)
+
+# ---------------------------
+# Fast List Path
+# ---------------------------
+
+class ValuesListMixin:
+    """
+    Serves ``list`` from ``values_list()`` rows instead of model instances.
+    
+    The JSON is identical to the serializer's (see ``core.fastpath``). Requests
+    with ``?include=``, or serializers the reader can't reproduce, go through
+    the regular serializer.
+    """
+    
+    def get_values_reader(self):
+        if expansion.requested_include(self.request):
+            return None
+        serializer_class = self.get_serializer_class()
+        keep = serializer_class.sparse_field_names(self.request, serializer_class().fields.keys())
+        return fastpath.reader_for(serializer_class, keep)
+    
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+    
+    def list_response(self, queryset):
+        """Paginated list response for ``queryset``; also used by list-style actions"""
+        reader = self.get_values_reader()
+        if reader is None:
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            return Response(self.get_serializer(queryset, many=True).data)
+        
+        rows = reader.prepare(queryset)
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(rows))
+
 # ---------------------------
 # ViewSets for Main Models
 # ---------------------------
 
-class ArtistViewSet(viewsets.ModelViewSet):
+class ArtistViewSet(ValuesListMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = Artist.objects.all().order_by('name')
     serializer_class = ArtistSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -145,33 +233,185 @@ class ArtistViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'bio']
 
 
-class ArtPieceViewSet(viewsets.ModelViewSet):
+class ArtPieceViewSet(ValuesListMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = ArtPiece.objects.all().order_by('title')
     serializer_class = ArtPieceSerializer
     permission_classes = [IsClerkOrAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['status', 'artist']
     search_fields = ['title', 'description']
+    
+    @action(detail=False, methods=['get'])
+    def available(self, request):
+        """
+        Pieces not booked into any exhibition between ``?start=`` and ``?end=``
+        (YYYY-MM-DD, inclusive). Only AVAILABLE pieces unless ``?status=`` says
+        otherwise. ``?artists=1,2`` narrows to several artists. The usual list
+        filters, ``?search=``, ``?fields=`` and pagination all apply.
+        """
+        try:
+            start = date.fromisoformat(request.query_params.get('start', ''))
+            end = date.fromisoformat(request.query_params.get('end', ''))
+            artists = [int(a) for a in request.query_params.get('artists', '').split(',') if a]
+        except ValueError:
+            return Response({'error': 'start and end must be dates (YYYY-MM-DD) and artists a list of ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': 'start must not be after end'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        if not request.query_params.get('status'):
+            queryset = queryset.filter(status='AVAILABLE')
+        if artists:
+            queryset = queryset.filter(artist_id__in=artists)
+        # Anti-join: no booking of this piece in an exhibition overlapping the range
+        overlapping = ExhibitionArtPiece.objects.filter(
+            art_piece=models.OuterRef('pk'),
+            exhibition__start_date__lte=end,
+            exhibition__end_date__gte=start,
+        )
+        return self.list_response(queryset.filter(~models.Exists(overlapping)))
+    
+    @action(detail=True, methods=['get', 'post', 'delete'], parser_classes=[MultiPartParser])
+    def image(self, request, pk=None):
+        """
+        GET serves the original image (``Range`` and ``ETag`` aware). POST
+        uploads one as multipart field ``image``; DELETE detaches it. Stored
+        files are shared by content and left in place.
+        """
+        piece = self.get_object()
+        if request.method == 'GET':
+            if not piece.image:
+                return Response({'error': 'This art piece has no image'}, status=status.HTTP_404_NOT_FOUND)
+            digest, _, extension = piece.image.partition('.')
+            return images.serve_file(request, images.original_path(piece.image),
+                                     images.CONTENT_TYPES[extension], f'"{digest}"')
+        
+        if request.method == 'POST':
+            upload = request.FILES.get('image')
+            if upload is None:
+                return Response({'error': 'Upload the image as multipart field "image"'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            try:
+                piece.image = images.store(upload)
+            except images.ImageError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            piece.image = ''
+        
+        with transaction.atomic():
+            piece.save(update_fields=['image', 'updated_at'])
+            if piece.image:
+                name = piece.image
+                transaction.on_commit(lambda: images.schedule_thumbnails(name))
+        return Response(self.get_serializer(piece).data)
 
 
-class ExhibitionViewSet(viewsets.ModelViewSet):
+class ExhibitionViewSet(ValuesListMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = Exhibition.objects.all().order_by('-start_date')
     serializer_class = ExhibitionSerializer
     permission_classes = [IsClerkOrAdminOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['status']
     search_fields = ['title']
+    
+    # Bulk bookings: {"art_pieces": [ids], ...} -> a summary of what changed
+    
+    def _art_piece_ids(self, request, required=True):
+        ids = request.data.get('art_pieces')
+        if ids is None and not required:
+            return None
+        if (not isinstance(ids, list) or not ids
+                or not all(isinstance(pk, int) and not isinstance(pk, bool) for pk in ids)):
+            raise serializers.ValidationError({'art_pieces': 'Expected a non-empty list of art piece ids'})
+        if len(ids) > bookings.MAX_BATCH:
+            raise serializers.ValidationError(
+                {'art_pieces': f"At most {bookings.MAX_BATCH} art pieces per request"}
+            )
+        return ids
+    
+    def _flag(self, request, name):
+        # bool() would read the string "false" as True
+        try:
+            return serializers.BooleanField().to_internal_value(request.data.get(name, False))
+        except serializers.ValidationError:
+            raise serializers.ValidationError({name: 'Must be a boolean'})
+    
+    def _bulk_response(self, operation, *args, **kwargs):
+        try:
+            return Response(operation(self.get_object(), *args, **kwargs))
+        except bookings.BookingError as e:
+            return Response({'error': str(e), 'details': e.details}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=True, methods=['post'], url_path='art-pieces/add')
+    def add_art_pieces(self, request, pk=None):
+        """Book many art pieces; ``confirmed`` and ``display`` (mark them DISPLAYED) are optional"""
+        return self._bulk_response(
+            bookings.add, self._art_piece_ids(request),
+            confirmed=self._flag(request, 'confirmed'),
+            display=self._flag(request, 'display'),
+        )
+    
+    @action(detail=True, methods=['post'], url_path='art-pieces/remove')
+    def remove_art_pieces(self, request, pk=None):
+        return self._bulk_response(bookings.remove, self._art_piece_ids(request))
+    
+    @action(detail=True, methods=['post'], url_path='art-pieces/confirm')
+    def confirm_art_pieces(self, request, pk=None):
+        """Confirm many bookings (all of them when ``art_pieces`` is omitted)"""
+        return self._bulk_response(
+            bookings.confirm, self._art_piece_ids(request, required=False),
+            display=self._flag(request, 'display'),
+        )
 
 
-class ExhibitionArtPieceViewSet(viewsets.ModelViewSet):
+class ExhibitionArtPieceViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
+    """
+    Art piece bookings. A piece can't be booked into two exhibitions with
+    overlapping dates; POST accepts a list to book many at once.
+    """
     queryset = ExhibitionArtPiece.objects.all().order_by('exhibition', 'art_piece')
     serializer_class = ExhibitionArtPieceSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['exhibition', 'art_piece', 'confirmed']
+    
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+    
+    # The conflict check and the write share a transaction, so a concurrent
+    # booking can't slip in between them
+    @transaction.atomic
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+    
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
+    
+    @action(detail=False, methods=['get'])
+    def conflicts(self, request):
+        """
+        Every art piece booked into exhibitions with overlapping dates.
+        ``?art_piece=`` narrows the report, ``?ending_after=YYYY-MM-DD`` skips
+        exhibitions that closed before that day.
+        """
+        links = ExhibitionArtPiece.objects.all()
+        try:
+            if request.query_params.get('art_piece'):
+                links = links.filter(art_piece_id=request.query_params['art_piece'])
+            if request.query_params.get('ending_after'):
+                links = links.filter(exhibition__end_date__gte=request.query_params['ending_after'])
+            found = conflicts.find_conflicts(links)
+        except (ValueError, ValidationError):
+            return Response({'error': 'art_piece must be an id and ending_after a date (YYYY-MM-DD)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'count': len(found), 'conflicts': [conflicts.as_dict(c) for c in found]})
 
 
-class VisitorViewSet(viewsets.ModelViewSet):
+class VisitorViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = Visitor.objects.all().order_by('name')
     serializer_class = VisitorSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -179,7 +419,7 @@ class VisitorViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'email']
 
 
-class RegistrationViewSet(viewsets.ModelViewSet):
+class RegistrationViewSet(ValuesListMixin, QueryPlanningMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticatedOrReadOnly] 
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['visitor', 'exhibition', 'status', 'confirmed']
@@ -190,21 +430,38 @@ class RegistrationViewSet(viewsets.ModelViewSet):
         return RegistrationSerializer
     
     def get_queryset(self):
+        return self._visible(Registration)
+    
+    def _visible(self, model):
+        """The rows of ``model`` (live or archived registrations) this user may see"""
         user = self.request.user
         if not user.is_authenticated:
-            return Registration.objects.none()
+            return model.objects.none()
             
         user_role = getattr(user, 'role', 'visitor')
 
         if user_role in ['clerk', 'admin']:
-            return Registration.objects.select_related('visitor', 'exhibition').order_by('-timestamp')
+            return model.objects.select_related('visitor', 'exhibition').order_by('-timestamp')
         
         try:
             visitor = Visitor.objects.get(email=user.email)
-            return Registration.objects.filter(visitor=visitor).select_related('visitor', 'exhibition').order_by('-timestamp')
+            return model.objects.filter(visitor=visitor).select_related('visitor', 'exhibition').order_by('-timestamp')
         except Visitor.DoesNotExist:
-            return Registration.objects.none()
+            return model.objects.none()
     
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            pass
+        # Old registrations live in the archive tier
+        try:
+            archived = self._visible(ArchivedRegistration).get(pk=kwargs['pk'])
+        except (ArchivedRegistration.DoesNotExist, ValueError):
+            raise Http404
+        return Response(ArchivedRegistrationSerializer(archived, context=self.get_serializer_context()).data)
+    
+    @idempotent
     def create(self, request, *args, **kwargs):
         # Check if user is authenticated
         if not request.user.is_authenticated:
@@ -213,13 +470,9 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        # Safe way to log user info that handles anonymous users
-        user_identifier = request.user.email
-        logger.info(f"Registration create called - User: {user_identifier}")
-        
-        # Debug logging to understand request data structure
-        logger.info(f"Request data type: {type(request.data)}")
-        logger.info(f"Request data: {request.data}")
+        if intake.is_buffered():
+            data = request.data if hasattr(request.data, 'get') else {}
+            return enqueue_registration(request, data)
         
         try:
             # Start transaction
@@ -228,9 +481,8 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 if isinstance(request.data, str):
                     try:
                         data = json.loads(request.data)
-                        logger.info(f"Parsed JSON data: {data}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Failed to parse JSON data: {e}")
+                    except json.JSONDecodeError:
+                        registration_logger.info('Registration rejected', extra={'reason': 'invalid_json'})
                         return Response(
                             {'error': 'Invalid JSON data format'}, 
                             status=status.HTTP_400_BAD_REQUEST
@@ -238,7 +490,7 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 elif hasattr(request.data, 'get'):
                     data = request.data
                 else:
-                    logger.error(f"Unsupported data format: {type(request.data)}")
+                    registration_logger.info('Registration rejected', extra={'reason': 'unsupported_format'})
                     return Response(
                         {'error': 'Unsupported data format'}, 
                         status=status.HTTP_400_BAD_REQUEST
@@ -248,7 +500,7 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 exhibition_id = data.get('exhibition') or data.get('exhibition_id')
                 
                 if not exhibition_id:
-                    logger.error("No exhibition ID provided in request")
+                    registration_logger.info('Registration rejected', extra={'reason': 'missing_exhibition'})
                     return Response(
                         {'error': 'Exhibition ID is required', 'field': 'exhibition'}, 
                         status=status.HTTP_400_BAD_REQUEST
@@ -258,7 +510,7 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 try:
                     exhibition_id = int(exhibition_id)
                 except (ValueError, TypeError):
-                    logger.error(f"Invalid exhibition ID format: {exhibition_id}")
+                    registration_logger.info('Registration rejected', extra={'reason': 'invalid_exhibition'})
                     return Response(
                         {'error': 'Exhibition ID must be a valid number', 'field': 'exhibition'}, 
                         status=status.HTTP_400_BAD_REQUEST
@@ -267,7 +519,6 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 # Validate exhibition exists and is available
                 try:
                     exhibition = Exhibition.objects.get(id=exhibition_id)
-                    logger.info(f"Exhibition found: {exhibition.title} (Status: {exhibition.status})")
                     
                     # Check if exhibition is available for registration
                     if exhibition.status not in ['UPCOMING', 'ONGOING']:
@@ -277,7 +528,8 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                         )
                         
                 except Exhibition.DoesNotExist:
-                    logger.error(f"Exhibition with id {exhibition_id} not found")
+                    registration_logger.info('Registration rejected',
+                                             extra={'reason': 'exhibition_not_found', 'exhibition_id': exhibition_id})
                     return Response(
                         {'error': 'Exhibition not found', 'field': 'exhibition'}, 
                         status=status.HTTP_404_NOT_FOUND
@@ -308,10 +560,11 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                         visitor.name = visitor_name
                         visitor.save()
                         
-                    logger.info(f"Visitor {'created' if created else 'found'}: {visitor.name} ({visitor.email})")
+                    registration_logger.debug('Visitor %s', 'created' if created else 'found',
+                                              extra={'visitor_id': visitor.id})
                     
                 except Exception as e:
-                    logger.error(f"Error with visitor creation: {e}")
+                    registration_logger.exception('Visitor profile creation failed')
                     return Response(
                         {'error': f'Failed to create visitor profile: {str(e)}'}, 
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -324,7 +577,9 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 ).first()
                 
                 if existing_registration:
-                    logger.info(f"Duplicate registration attempt - existing: {existing_registration.id}")
+                    registration_logger.info('Registration rejected', extra={
+                        'reason': 'duplicate', 'registration_id': existing_registration.id,
+                    })
                     return Response(
                         {
                             'error': 'You have already registered for this exhibition',
@@ -355,8 +610,6 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                logger.info(f"Creating registration: Exhibition={exhibition_id}, Attendees={attendees_count}")
-                
                 # Create the registration
                 registration_data = {
                     'visitor': visitor,
@@ -373,7 +626,11 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 
                 registration = Registration.objects.create(**registration_data)
                 
-                logger.info(f"Registration created successfully: ID={registration.id}")
+                registration_logger.info('Registration created', extra={
+                    'registration_id': registration.id,
+                    'exhibition_id': exhibition.id,
+                    'attendees_count': attendees_count,
+                })
                 
                 # Prepare response data
                 response_data = {
@@ -400,7 +657,7 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 
         except IntegrityError as e:
             error_msg = str(e).lower()
-            logger.error(f"Registration integrity error: {e}")
+            registration_logger.warning('Registration integrity error: %s', e)
             
             if 'unique' in error_msg or 'duplicate' in error_msg:
                 return Response(
@@ -414,8 +671,7 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 )
                 
         except Exception as e:
-            logger.error(f"Registration creation error: {e}")
-            logger.error(f"Full traceback: {traceback.format_exc()}")
+            registration_logger.exception('Registration creation failed')
             
             return Response(
                 {
@@ -425,12 +681,10 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my(self, request):
-        """Get current user's registrations"""
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        """Get current user's registrations (see VisitorRegistrationsView)"""
+        return Response(visitor_registrations(request))
     
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def approve(self, request, pk=None):
@@ -520,43 +774,28 @@ class RegistrationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def queue_status(self, request):
-        """Get current user's queue status"""
-        try:
-            visitor = Visitor.objects.get(email=request.user.email)
-            pending_registrations = Registration.objects.filter(
-                visitor=visitor,
-                status='PENDING'
-            ).select_related('exhibition').order_by('queue_position')
-            
-            queue_info = []
-            for reg in pending_registrations:
-                queue_info.append({
-                    'registration_id': reg.id,
-                    'exhibition_title': reg.exhibition.title,
-                    'queue_position': getattr(reg, 'queue_position', None),
-                    'submitted_at': getattr(reg, 'submitted_at', None) or reg.timestamp,
-                    'estimated_wait': f"{max(1, getattr(reg, 'queue_position', 1) or 1)} day(s)",
-                    'attendees_count': reg.attendees_count
-                })
-            
-            return Response({
-                'pending_registrations': queue_info,
-                'total_in_queue': len(queue_info)
-            })
-            
-        except Visitor.DoesNotExist:
-            return Response({'pending_registrations': [], 'total_in_queue': 0})
-        except Exception as e:
-            logger.error(f"Queue status error: {e}")
-            return Response(
-                {'error': f'Failed to get queue status: {str(e)}'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        """Get current user's queue status (see VisitorRegistrationsView)"""
+        data = visitor_registrations(request, status_filter='PENDING', page_size=MAX_QUEUE_STATUS_ROWS)
+        queue_info = [
+            {
+                'registration_id': row['id'],
+                'exhibition_title': row['exhibition_title'],
+                'queue_position': row['queue_position'],
+                'submitted_at': row['submitted_at'] or row['timestamp'],
+                'estimated_wait': f"{max(1, row['queue_position'] or 1)} day(s)",
+                'attendees_count': row['attendees_count'],
+            }
+            for row in data['results']
+        ]
+        return Response({
+            'pending_registrations': queue_info,
+            'total_in_queue': data['count'],
+        })
 
 
-class ClerkViewSet(viewsets.ModelViewSet):
+class ClerkViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = Clerk.objects.all().order_by('name')
     serializer_class = ClerkSerializer
     permission_classes = [IsAdminOrReadOnly]
@@ -564,7 +803,7 @@ class ClerkViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'email']
 
 
-class SetupStatusViewSet(viewsets.ModelViewSet):
+class SetupStatusViewSet(QueryPlanningMixin, viewsets.ModelViewSet):
     queryset = SetupStatus.objects.all().order_by('-timestamp')
     serializer_class = SetupStatusSerializer
     permission_classes = [IsClerkOrAdminOrReadOnly]
@@ -638,6 +877,11 @@ class ExhibitionDetailView(generics.RetrieveAPIView):
     serializer_class = ExhibitionSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
+    @responsecache.cache_response(
+        'exhibition-detail',
+        lambda pk: [caching.EXHIBITIONS, caching.ART_PIECES, caching.exhibition_registrations(pk)],
+        ttl_setting='EXHIBITION_DETAIL_CACHE_TTL', default_ttl=120,
+    )
     def get(self, request, *args, **kwargs):
         exhibition = self.get_object()
         serializer = self.get_serializer(exhibition)
@@ -661,7 +905,11 @@ class ExhibitionDetailView(generics.RetrieveAPIView):
 class ExhibitionRegistrationView(APIView):
     permission_classes = [IsAuthenticated]
     
+    @idempotent
     def post(self, request, exhibition_id):
+        if intake.is_buffered():
+            return enqueue_registration(request, request.data, exhibition_id=exhibition_id)
+        
         try:
             exhibition = Exhibition.objects.get(id=exhibition_id)
         except Exhibition.DoesNotExist:
@@ -705,43 +953,382 @@ class ExhibitionRegistrationView(APIView):
             status=status.HTTP_201_CREATED
         )
 
+# ---------------------------
+# Buffered Registration Intake
+# ---------------------------
+
+def enqueue_registration(request, data, exhibition_id=None):
+    """Journal a registration request and answer 202 with a tracking id"""
+    try:
+        exhibition_id, attendees_count = intake.validate_submission(data, exhibition_id)
+    except intake.IntakeRejected as e:
+        return Response(e.as_response_data(), status=e.status_code)
+    
+    entry = intake.enqueue(request.user, exhibition_id, attendees_count)
+    status_url = reverse('registration_intake_status', kwargs={'tracking_id': entry.tracking_id})
+    return Response(
+        {
+            'tracking_id': str(entry.tracking_id),
+            'status': entry.status,
+            'exhibition': exhibition_id,
+            'attendees_count': attendees_count,
+            'status_url': status_url,
+        },
+        status=status.HTTP_202_ACCEPTED,
+        headers={'Location': status_url}
+    )
+
+class RegistrationIntakeStatusView(APIView):
+    """Poll the outcome of a buffered registration; only reads the intake journal"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, tracking_id):
+        entry = RegistrationIntake.objects.filter(
+            tracking_id=tracking_id, user_id=request.user.pk
+        ).first()
+        if entry is None:
+            return Response({'error': 'Unknown tracking id'}, status=status.HTTP_404_NOT_FOUND)
+        
+        return Response({
+            'tracking_id': str(entry.tracking_id),
+            'status': entry.status,
+            'exhibition': entry.exhibition_id,
+            'attendees_count': entry.attendees_count,
+            'registration_id': entry.registration_id,
+            'queue_position': entry.queue_position,
+            'queued_ahead': intake.queued_ahead(entry),
+            'error': entry.error,
+            'submitted_at': entry.submitted_at,
+            'processed_at': entry.processed_at,
+        })
+
+class QueueStreamTicketView(APIView):
+    """
+    Short-lived ticket for opening the queue stream with EventSource, which
+    can't send the access token as a header; see ``core.realtime``
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def post(self, request):
+        ticket = realtime.issue_ticket(request.user)
+        return Response({
+            'ticket': ticket,
+            'expires_in': realtime.ticket_max_age(),
+            'stream_url': f"{realtime.STREAM_PATH}?{urlencode({'ticket': ticket})}",
+        })
+
 # ---------------------------
 # Visitor Management Views
 # ---------------------------
 
-class MyRegistrationsView(generics.ListAPIView):
-    serializer_class = RegistrationSerializer
+MAX_QUEUE_STATUS_ROWS = 100
+
+
+class VisitorRegistrationsPagination(PageNumberPagination):
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def visitor_registrations(request, status_filter=None, page_size=None):
+    """
+    One page of the requesting user's registrations, newest first (pending
+    ones in queue order), with queue positions and exhibition summaries.
+    
+    Rows are rendered by the values() reader, so a page is one count and one
+    select. Pages are cached per visitor and dropped whenever one of their
+    registrations, their queue position or an exhibition changes.
+    """
+    status_filter = status_filter or request.query_params.get('status')
+    email = request.user.email
+    cache_key = caching.versioned_key(
+        'visitor-registrations',
+        [caching.visitor_registrations(email), caching.EXHIBITIONS],
+        email, status_filter, page_size, request.build_absolute_uri(),
+    )
+    data = cache.get(cache_key)
+    if data is not None:
+        return data
+    
+    queryset = Registration.objects.filter(visitor__email=email)
+    archived = ArchivedRegistration.objects.filter(visitor__email=email)
+    if status_filter:
+        queryset = queryset.filter(status=status_filter.upper())
+        archived = archived.filter(status=status_filter.upper())
+    
+    reader = fastpath.reader_for(VisitorRegistrationSerializer)
+    if status_filter and status_filter.upper() == 'PENDING':
+        # The queue is never archived
+        rows = reader.prepare(queryset.order_by('queue_position', 'id'))
+    else:
+        rows = archive.history(reader.prepare(queryset), reader.prepare(archived), ['-timestamp', '-id'])
+    paginator = VisitorRegistrationsPagination()
+    if page_size:
+        paginator.page_size = page_size
+    page = paginator.paginate_queryset(rows, request)
+    data = paginator.get_paginated_response(reader.render(page)).data
+    cache.set(cache_key, data, caching.ttl('VISITOR_REGISTRATIONS_CACHE_TTL', 300))
+    return data
+
+
+class VisitorRegistrationsView(APIView):
+    """Paginated registrations of the current user; ``?status=`` filters"""
     permission_classes = [IsAuthenticated]
     
-    def get_queryset(self):
-        try:
-            visitor = Visitor.objects.get(email=self.request.user.email)
-            return Registration.objects.filter(visitor=visitor).order_by('-timestamp')
-        except Visitor.DoesNotExist:
-            return Registration.objects.none()
+    def get(self, request):
+        return Response(visitor_registrations(request))
+
+
+class MyRegistrationsView(VisitorRegistrationsView):
+    """Older route for ``VisitorRegistrationsView``"""
 
 # ---------------------------
 # Artist Management Views (Admin only)
 # ---------------------------
 
+class ArtistPiecesPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+VALUE_FIELD = serializers.DecimalField(max_digits=None, decimal_places=2)
+
+
+def artist_portfolio_stats(artist):
+    """Piece counts per status and value totals from one grouped query"""
+    by_status = {code: 0 for code, _ in ArtPiece.STATUS_CHOICES}
+    total, low, high, count = Decimal('0'), None, None, 0
+    rows = (
+        ArtPiece.objects.filter(artist=artist)
+        .order_by()
+        .values('status')
+        .annotate(pieces=Count('id'), total=Sum('estimated_value'),
+                  low=Min('estimated_value'), high=Max('estimated_value'))
+    )
+    for row in rows:
+        by_status[row['status']] = row['pieces']
+        count += row['pieces']
+        total += row['total']
+        low = row['low'] if low is None else min(low, row['low'])
+        high = row['high'] if high is None else max(high, row['high'])
+    
+    def money(value):
+        return VALUE_FIELD.to_representation(value) if value is not None else None
+    
+    return {
+        'piece_count': count,
+        'by_status': by_status,
+        'total_value': money(total),
+        'min_value': money(low),
+        'max_value': money(high),
+        'avg_value': money(total / count) if count else None,
+    }
+
+
 class ArtistDetailView(generics.RetrieveAPIView):
+    """
+    Artist portfolio: the artist, aggregate stats, the exhibitions their work
+    appears in and a page of their pieces (``?page=``, ``?page_size=``).
+    
+    Responses are cached until the artist, any art piece or any exhibition
+    changes.
+    """
     queryset = Artist.objects.all().order_by('name')
     serializer_class = ArtistSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
+    @responsecache.cache_response(
+        'artist-portfolio',
+        lambda pk: [caching.artist_portfolio(pk), caching.ART_PIECES, caching.EXHIBITIONS],
+        ttl_setting='ARTIST_PORTFOLIO_CACHE_TTL', default_ttl=600,
+    )
     def get(self, request, *args, **kwargs):
         artist = self.get_object()
-        serializer = self.get_serializer(artist)
-        data = serializer.data
-        
-        # Add artist's art pieces
-        data['art_pieces'] = ArtPieceSerializer(
-            ArtPiece.objects.filter(artist=artist),
-            many=True
-        ).data
+        data = dict(self.get_serializer(artist).data)
+        stats = artist_portfolio_stats(artist)
+        exhibitions = list(
+            Exhibition.objects.filter(exhibitionartpiece__art_piece__artist=artist)
+            .distinct()
+            .values('id', 'title', 'start_date', 'end_date', 'status')
+        )
+        stats['exhibition_count'] = len(exhibitions)
+        data['stats'] = stats
+        data['exhibitions'] = exhibitions
         
+        # Add a page of the artist's art pieces
+        reader = fastpath.reader_for(ArtPieceSerializer)
+        paginator = ArtistPiecesPagination()
+        page = paginator.paginate_queryset(
+            reader.prepare(ArtPiece.objects.filter(artist=artist).order_by('title', 'id')), request
+        )
+        data['art_pieces'] = paginator.get_paginated_response(reader.render(page)).data
         return Response(data)
 
+# ---------------------------
+# Collection Valuation Analytics (Admin only)
+# ---------------------------
+
+MAX_HISTOGRAM_BINS = 200
+
+
+class ValuationAnalyticsView(APIView):
+    """
+    Collection value by artist, nationality, status and exhibition, read from
+    the precomputed rollups, plus percentiles and a histogram of
+    ``estimated_value``.
+    
+    ``?dimension=`` limits the rollups to some dimensions (comma separated),
+    ``?percentiles=`` and ``?bins=`` shape the distribution, and ``?artist=``,
+    ``?nationality=``, ``?status=``, ``?exhibition=`` filter it.
+    Rollups are refreshed periodically; ``pending_groups`` counts the groups
+    changed since. POST refreshes them now (``{"full": true}`` rebuilds all).
+    """
+    permission_classes = [IsAdminRole]
+    
+    def get(self, request):
+        params = request.query_params
+        dimensions = [d for d in params.get('dimension', '').split(',') if d] or list(valuation.DIMENSIONS)
+        unknown = set(dimensions) - set(valuation.DIMENSIONS)
+        if unknown:
+            return Response({'error': f"Unknown dimension: {', '.join(sorted(unknown))}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            percentiles = [float(q) for q in params.get('percentiles', '').split(',') if q] \
+                or list(valuation.DEFAULT_PERCENTILES)
+            bins = int(params.get('bins', 20))
+        except ValueError:
+            return Response({'error': 'percentiles and bins must be numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not all(0 <= q <= 100 for q in percentiles) or not 1 <= bins <= MAX_HISTOGRAM_BINS:
+            return Response({'error': f"percentiles must be within 0-100 and bins within 1-{MAX_HISTOGRAM_BINS}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        rollups = {dimension: [] for dimension in dimensions}
+        for row in ValuationRollup.objects.filter(dimension__in=dimensions).values():
+            row['avg_value'] = row['total_value'] / row['piece_count'] if row['piece_count'] else None
+            rollups[row['dimension']].append({
+                'key': row['key'],
+                'label': row['label'],
+                'piece_count': row['piece_count'],
+                **{field: VALUE_FIELD.to_representation(row[field]) if row[field] is not None else None
+                   for field in ('total_value', 'min_value', 'max_value', 'avg_value')},
+                'refreshed_at': row['refreshed_at'],
+            })
+        
+        distribution_filters = {
+            'artist': 'artist_id',
+            'nationality': 'artist__nationality',
+            'status': 'status',
+            'exhibition': 'exhibitionartpiece__exhibition_id',
+        }
+        try:
+            pieces = ArtPiece.objects.filter(**{
+                lookup: params[param] for param, lookup in distribution_filters.items() if params.get(param)
+            })
+            values = valuation.value_column(pieces)
+        except ValueError:
+            return Response({'error': 'artist and exhibition must be ids'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'rollups': rollups,
+            'pending_groups': ValuationDirtyKey.objects.count(),
+            'distribution': valuation.distribution(values, percentiles, bins),
+        })
+    
+    def post(self, request):
+        try:
+            full = serializers.BooleanField().to_internal_value(request.data.get('full', False))
+        except serializers.ValidationError:
+            return Response({'error': 'full must be a boolean'}, status=status.HTTP_400_BAD_REQUEST)
+        if full:
+            written = valuation.refresh_all()
+            return Response({'rebuilt': written})
+        return Response({'refreshed': valuation.refresh_dirty()})
+
+# ---------------------------
+# Mobile Catalog Sync
+# ---------------------------
+
+class CatalogSyncView(APIView):
+    """Catalog rows created, changed or deleted since a sync token"""
+    permission_classes = [IsAuthenticatedOrReadOnly]
+    
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', sync.DEFAULT_LIMIT))
+        except (TypeError, ValueError):
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            return Response(sync.changes_since(request.query_params.get('since'), limit))
+        except sync.ExpiredToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_410_GONE)
+        except sync.InvalidToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+# ---------------------------
+# Art Piece Thumbnails
+# ---------------------------
+
+@require_safe
+def art_image_thumbnail(request, digest, size):
+    """Thumbnail of a stored image, by content digest; URLs come from ``ArtPieceSerializer.thumbnails``"""
+    found = images.thumbnail_file(digest, size) if images.is_digest(digest) else None
+    if found is None:
+        return JsonResponse({'error': 'Thumbnail not found'}, status=404)
+    path, content_type, etag, cache_control = found
+    return images.serve_file(request, path, content_type, etag, cache_control)
+
+# ---------------------------
+# Public Catalog Snapshots
+# ---------------------------
+
+@require_safe
+def catalog_snapshot(request, name):
+    """
+    Prebuilt catalog JSON (``exhibitions``, ``artists``) served from disk
+    with no authentication or database work; see ``core.snapshots``
+    """
+    return snapshots.serve(request, name)
+
+# ---------------------------
+# Request Profiles
+# ---------------------------
+
+class ProfileListView(APIView):
+    """
+    Stored request profiles, newest first. An admin records one by sending
+    ``X-Profile: cprofile|sample[,memory]`` or ``?_profile=`` with a request;
+    see ``core.profiling``.
+    """
+    permission_classes = [IsAdminRole]
+    
+    def get(self, request):
+        results = profiling.list_profiles()
+        return Response({'count': len(results), 'results': results})
+
+class ProfileDetailView(APIView):
+    """A stored profile: call statistics, SQL log and allocations"""
+    permission_classes = [IsAdminRole]
+    
+    def get(self, request, profile_id):
+        profile = profiling.load(profile_id)
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(profile)
+
+class ProfileDownloadView(APIView):
+    """The raw profile: pstats data (``.prof``) or pyinstrument's HTML report"""
+    permission_classes = [IsAdminRole]
+    
+    def get(self, request, profile_id):
+        found = profiling.raw_file(profile_id)
+        if found is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        path, content_type = found
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path),
+                            content_type=content_type)
+
 # ---------------------------
 # Error Handlers
 # ---------------------------